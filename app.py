@@ -1,12 +1,29 @@
-from flask import Flask, request, jsonify, render_template
-import joblib
-import requests
+from flask import Flask, Response, request, jsonify, stream_with_context, redirect, url_for, send_file, g
+from flask import render_template as flask_render_template
+from flask.json.provider import DefaultJSONProvider
 import os
-from flasgger import Swagger
-from uuid import uuid4
-
-print("Current working directory:", os.getcwd())
-print("Files in current directory:", os.listdir())
+import hmac
+import logging
+import tempfile
+import json
+import time
+import numpy as np
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from microbatch import MicroBatcher, QueueFullError
+from openweather import OpenWeatherClient, OpenWeatherError, DEFAULT_BASE_URL
+from upstream import UpstreamClient, RetryPolicy, CircuitBreaker
+from record_store import create_record_store, FILTER_OPS, VersionConflictError
+from schema import validate_record
+from model_registry import ModelRegistry, ModelVersion, ModelNotFoundError, read_metadata
+from prediction_cache import PredictionCache
+from aqi import classify, compute_aqi, determine_air_quality
+from dataset import ColumnarDataset, DatasetNotFoundError, MEASURES
+from scoring import Scorer, ScoringError, ScoringJobs, open_scoring_stream
+from metrics import CallbackCounter, Counter, Gauge, Histogram, registry as metrics_registry, begin_request, end_request, server_timing, stage
+from charts import CHART_COLUMNS, LABELS, ChartData, ChartRenderError, ChartRenderer, content_hash, render_heatmap, render_scatter
+from timeseries import RESOLUTIONS, TimeSeriesStore
+from poller import CityPoller
+from datetime import datetime, timezone
 
 app = Flask(__name__)
 
@@ -26,17 +43,258 @@ swagger_config = {
     "specs_route": "/apidocs/"
 }
 
-swagger = Swagger(app, config=swagger_config)
+# Swagger registers its routes up front, so it cannot be deferred to first use;
+# worker pools that never serve /apidocs/ can skip the flasgger import entirely
+swagger = None
+if os.environ.get('AQI_ENABLE_SWAGGER', '1') == '1':
+    from flasgger import Swagger
+    swagger = Swagger(app, config=swagger_config)
+
+# Trained model artifacts: the sklearn pickle and its memory-mappable compiled export
+MODEL_PATH = os.environ.get('AQI_MODEL_PATH', 'airquality.joblib')
+COMPILED_MODEL_PATH = os.environ.get('AQI_COMPILED_MODEL_PATH', os.path.splitext(MODEL_PATH)[0] + '.forest')
+
+# Optional flattened-forest inference engine (AQI_INFERENCE_ENGINE=compiled). It beats
+# sklearn for small batches; batches above COMPILED_MAX_ROWS still go to sklearn.
+app.config['INFERENCE_ENGINE'] = os.environ.get('AQI_INFERENCE_ENGINE', 'sklearn')
+app.config['COMPILED_MAX_ROWS'] = int(os.environ.get('AQI_COMPILED_MAX_ROWS', 512))
+
+# Versioned artifacts written by train_model.py; the models/ACTIVE pointer selects
+# one, otherwise the legacy MODEL_PATH pair is served as version "default".
+# Each version loads lazily on first prediction so workers start fast.
+app.config['MODEL_DIR'] = os.environ.get('AQI_MODEL_DIR', 'models')
+app.config['MODEL_WATCH_INTERVAL'] = float(os.environ.get('AQI_MODEL_WATCH_INTERVAL', 0))
+app.config['ADMIN_TOKEN'] = os.environ.get('AQI_ADMIN_TOKEN')
 
-# Load your trained model
-model = joblib.load('airquality.joblib')
-print("Loaded model type:", type(model))
+model_registry = ModelRegistry(
+    app.config['MODEL_DIR'],
+    default=ModelVersion('default', MODEL_PATH, COMPILED_MODEL_PATH,
+                         metadata=read_metadata(os.path.splitext(MODEL_PATH)[0] + '.json'),
+                         engine=app.config['INFERENCE_ENGINE'],
+                         compiled_max_rows=app.config['COMPILED_MAX_ROWS']),
+    engine=app.config['INFERENCE_ENGINE'],
+    compiled_max_rows=app.config['COMPILED_MAX_ROWS'],
+)
+if os.environ.get('AQI_PRELOAD_MODEL', '0') == '1':
+    # e.g. for gunicorn --preload, so forked workers share the loaded pages
+    model_registry.active.preload()
 
 # OpenWeather API Key
-API_KEY = 'Enter Your API Key'
+API_KEY = os.environ.get('OPENWEATHER_API_KEY', 'Enter Your API Key')
+
+# Pooled keep-alive client for OpenWeather calls with timeouts, retries and a circuit breaker
+upstream = UpstreamClient(
+    pool_size=int(os.environ.get('AQI_UPSTREAM_POOL_SIZE', 20)),
+    connect_timeout=float(os.environ.get('AQI_UPSTREAM_CONNECT_TIMEOUT', 2.0)),
+    read_timeout=float(os.environ.get('AQI_UPSTREAM_READ_TIMEOUT', 5.0)),
+    retry=RetryPolicy(max_retries=int(os.environ.get('AQI_UPSTREAM_MAX_RETRIES', 2))),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.environ.get('AQI_UPSTREAM_BREAKER_THRESHOLD', 5)),
+        reset_timeout=float(os.environ.get('AQI_UPSTREAM_BREAKER_RESET', 30.0)),
+    ),
+)
+
+# Cached OpenWeather lookups: coordinates rarely change, readings update about hourly
+weather = OpenWeatherClient(
+    API_KEY,
+    base_url=os.environ.get('OPENWEATHER_BASE_URL', DEFAULT_BASE_URL),
+    geocode_ttl=float(os.environ.get('AQI_GEOCODE_TTL', 7 * 24 * 3600)),
+    pollution_ttl=float(os.environ.get('AQI_POLLUTION_TTL', 900)),
+    maxsize=int(os.environ.get('AQI_UPSTREAM_CACHE_SIZE', 1024)),
+    upstream=upstream,
+)
+
+# Feature order expected by the model
+FEATURES = ['pm25', 'pm10', 'o3', 'no2', 'co', 'so2']
+
+# Upper bound on rows accepted by a single batch prediction request
+app.config['MAX_BATCH_SIZE'] = int(os.environ.get('AQI_MAX_BATCH_SIZE', 10000))
+
+# Multi-city fan-out limits
+app.config['MAX_CITIES'] = int(os.environ.get('AQI_MAX_CITIES', 500))
+app.config['CITY_CONCURRENCY'] = int(os.environ.get('AQI_CITY_CONCURRENCY', 20))
+
+# Opt-in micro-batching of single-row predictions
+app.config['MICROBATCH_ENABLED'] = os.environ.get('AQI_MICROBATCH', '0') == '1'
+app.config['MICROBATCH_WINDOW_MS'] = float(os.environ.get('AQI_MICROBATCH_WINDOW_MS', 2.0))
+app.config['MICROBATCH_MAX_BATCH'] = int(os.environ.get('AQI_MICROBATCH_MAX_BATCH', 64))
+app.config['MICROBATCH_MAX_QUEUE'] = int(os.environ.get('AQI_MICROBATCH_MAX_QUEUE', 1024))
+# How long a single-row prediction waits on the batcher before predicting inline
+app.config['MICROBATCH_TIMEOUT_MS'] = float(os.environ.get('AQI_MICROBATCH_TIMEOUT_MS', 1000.0))
+
+# Optional memo of model outputs for repeated inputs (0 disables it). Features are
+# rounded to PREDICTION_CACHE_QUANTUM before lookup; 0 means exact matches only.
+app.config['PREDICTION_CACHE_SIZE'] = int(os.environ.get('AQI_PREDICTION_CACHE_SIZE', 0))
+app.config['PREDICTION_CACHE_QUANTUM'] = float(os.environ.get('AQI_PREDICTION_CACHE_QUANTUM', 0.0))
+
+# Storage for AQI records (for API CRUD): in-memory dict by default,
+# or e.g. AQI_RECORD_STORE=sqlite:///records.db to persist and share across workers
+record_store = create_record_store(os.environ.get('AQI_RECORD_STORE', 'memory'))
+
+# Background polling of OpenWeather for a fixed list of cities (comma-separated;
+# empty disables it). The city form answers from a reading younger than
+# POLL_MAX_AGE seconds, and /api/history serves the stored trends.
+app.config['POLL_CITIES'] = [c for c in os.environ.get('AQI_POLL_CITIES', '').split(',') if c.strip()]
+app.config['POLL_INTERVAL'] = float(os.environ.get('AQI_POLL_INTERVAL', 900))
+app.config['POLL_RATE'] = float(os.environ.get('AQI_POLL_RATE', 1.0))
+app.config['POLL_MAX_AGE'] = float(os.environ.get('AQI_POLL_MAX_AGE', 2 * app.config['POLL_INTERVAL']))
+history_store = TimeSeriesStore(
+    raw_retention=float(os.environ.get('AQI_HISTORY_RAW_RETENTION', 2 * 86400)),
+    retention=float(os.environ.get('AQI_HISTORY_RETENTION', 30 * 86400)),
+    resolution=float(os.environ.get('AQI_HISTORY_RESOLUTION', 3600)),
+)
+
+# Historical city_day.csv data, ingested with `python dataset.py city_day.csv city_day.columns`
+# and memory-mapped on first query
+app.config['DATASET_PATH'] = os.environ.get('AQI_DATASET_PATH', 'city_day.columns')
+dataset = None
+
+def get_dataset():
+    global dataset
+    if dataset is None:
+        dataset = ColumnarDataset(app.config['DATASET_PATH'])
+    return dataset
+
+# Charts are rendered on a background thread and cached by content hash. A request
+# waits up to CHART_WAIT_SECONDS for a cold chart before answering 202 (clients
+# retry after Retry-After), so slow renders do not tie up request threads.
+app.config['CHART_WAIT_SECONDS'] = float(os.environ.get('AQI_CHART_WAIT_SECONDS', 0.25))
+app.config['CHART_RECORDS_REFRESH'] = float(os.environ.get('AQI_CHART_RECORDS_REFRESH', 60.0))
+chart_renderer = ChartRenderer(maxsize=int(os.environ.get('AQI_CHART_CACHE_SIZE', 64)))
+chart_data = ChartData(get_dataset, lambda: record_store, records_refresh=app.config['CHART_RECORDS_REFRESH'])
 
-# In-memory storage for AQI records (for API CRUD)
-aqi_records = {}
+# Offline scoring of uploaded CSV/NDJSON files, chunk by chunk; background jobs spool
+# uploads and results under SCORE_JOB_DIR
+app.config['SCORE_CHUNK_ROWS'] = int(os.environ.get('AQI_SCORE_CHUNK_ROWS', 10000))
+app.config['SCORE_JOB_DIR'] = os.environ.get('AQI_SCORE_JOB_DIR', os.path.join(tempfile.gettempdir(), 'aqi-score-jobs'))
+scoring_jobs = ScoringJobs(app.config['SCORE_JOB_DIR'], workers=int(os.environ.get('AQI_SCORE_JOB_WORKERS', 2)))
+
+# Upper bound on the number of items in one bulk request
+app.config['MAX_BULK_SIZE'] = int(os.environ.get('AQI_MAX_BULK_SIZE', 10000))
+
+# Upper bound on the page size of GET /api/records
+app.config['MAX_PAGE_SIZE'] = int(os.environ.get('AQI_MAX_PAGE_SIZE', 1000))
+
+# Per-request stage timings are returned in a Server-Timing header and, with
+# AQI_TIMING_LOG=1, logged one line per request; /metrics aggregates them
+app.config['SERVER_TIMING'] = os.environ.get('AQI_SERVER_TIMING', '1') == '1'
+app.config['TIMING_LOG'] = os.environ.get('AQI_TIMING_LOG', '0') == '1'
+if app.config['TIMING_LOG']:
+    app.logger.setLevel(logging.INFO)
+
+# ========== Metrics and Request Timing ==========
+
+http_requests = metrics_registry.register(Counter(
+    'aqi_http_requests_total', 'HTTP requests by route and status', ('method', 'route', 'status')))
+http_latency = metrics_registry.register(Histogram(
+    'aqi_http_request_duration_seconds', 'Time to produce a response, excluding streamed bodies',
+    ('method', 'route')))
+
+def cache_stats():
+    caches = {**weather.cache_stats(), 'charts': chart_renderer.stats()}
+    if prediction_cache is not None:
+        caches['prediction'] = prediction_cache.stats()
+    return caches
+
+def cache_samples(field):
+    return [((name,), stats[field]) for name, stats in cache_stats().items()]
+
+metrics_registry.register(CallbackCounter(
+    'aqi_cache_hits_total', 'Lookups answered from cache', lambda: cache_samples('hits'), ('cache',)))
+metrics_registry.register(CallbackCounter(
+    'aqi_cache_misses_total', 'Lookups that missed the cache', lambda: cache_samples('misses'), ('cache',)))
+metrics_registry.register(Gauge(
+    'aqi_cache_hit_ratio', 'Hits over lookups since start', lambda: cache_samples('hit_ratio'), ('cache',)))
+metrics_registry.register(Gauge(
+    'aqi_cache_entries', 'Entries currently cached', lambda: cache_samples('size'), ('cache',)))
+metrics_registry.register(Gauge('aqi_records', 'Records in the record store', lambda: len(record_store)))
+metrics_registry.register(Gauge(
+    'aqi_model_info', 'Active model version', lambda: [((model_registry.active.version,), 1)], ('version',)))
+metrics_registry.register(CallbackCounter(
+    'aqi_model_swaps_total', 'Model activations since start', lambda: model_registry.swaps))
+metrics_registry.register(CallbackCounter(
+    'aqi_upstream_calls_total', 'OpenWeather calls made; a retried call counts once',
+    lambda: weather.upstream_stats()['calls']))
+metrics_registry.register(CallbackCounter(
+    'aqi_upstream_failures_total', 'OpenWeather calls that failed after retries',
+    lambda: weather.upstream_stats()['failures']))
+metrics_registry.register(CallbackCounter(
+    'aqi_poll_rounds_total', 'Background polling rounds completed', lambda: city_poller.rounds))
+metrics_registry.register(CallbackCounter(
+    'aqi_poll_failures_total', 'Background city polls that failed', lambda: city_poller.failures))
+metrics_registry.register(CallbackCounter(
+    'aqi_poll_round_errors_total', 'Background polling rounds that raised', lambda: city_poller.round_errors))
+
+class TimedJSONProvider(DefaultJSONProvider):
+    # Times jsonify() bodies as the serialization stage
+    def dumps(self, obj, **kwargs):
+        with stage('serialization'):
+            return super().dumps(obj, **kwargs)
+
+app.json = TimedJSONProvider(app)
+
+def render_template(template_name, **context):
+    with stage('template'):
+        return flask_render_template(template_name, **context)
+
+@app.before_request
+def start_request_timing():
+    g.request_start = time.perf_counter()
+    begin_request()
+    # Started here rather than at import, so each (forked) worker polls
+    city_poller.start()
+    if app.config['MODEL_WATCH_INTERVAL'] > 0:
+        # Follow activations made through another worker's admin endpoint
+        model_registry.watch(app.config['MODEL_WATCH_INTERVAL'])
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop('request_start', None)
+    stages = end_request()
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    # The rule pattern, not the path, keeps label cardinality bounded
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    http_requests.inc(request.method, route, str(response.status_code))
+    http_latency.observe(elapsed, request.method, route)
+    if app.config['SERVER_TIMING']:
+        response.headers['Server-Timing'] = server_timing(stages, elapsed)
+    if app.config['TIMING_LOG']:
+        app.logger.info('%s %s %s %.2fms %s', request.method, route, response.status_code,
+                        elapsed * 1000, server_timing(stages, elapsed))
+    return response
+
+@app.teardown_request
+def record_failed_request_metrics(exc):
+    # after_request is skipped when an exception propagates out of the app
+    # (PROPAGATE_EXCEPTIONS, debug, testing) or an earlier hook raises;
+    # count those requests as 500s so failures never go missing
+    start = g.pop('request_start', None)
+    if start is None:
+        return
+    end_request()
+    elapsed = time.perf_counter() - start
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    http_requests.inc(request.method, route, '500')
+    http_latency.observe(elapsed, request.method, route)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus metrics
+    ---
+    responses:
+      200:
+        description: Request counts and latency histograms per route, per-stage latency
+                     histograms, cache hit ratios, record store size and model info,
+                     in the Prometheus text exposition format
+        content:
+          text/plain:
+            schema:
+              type: string
+    """
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
 
 # ========== Original Web UI Routes ==========
 
@@ -46,7 +304,8 @@ def home():
 
 @app.route('/heatmap')
 def heatmap():
-    return render_template('heatmap.html')
+    filters = {k: v for k, v in request.args.items() if k in ('city', 'start', 'end') and v}
+    return render_template('heatmap.html', filters=filters)
 
 @app.route('/predict_manually', methods=['POST','GET'])
 def predict_manually():
@@ -60,8 +319,8 @@ def predict_manually():
         so2 = float(request.form['SO2'])
 
         # Prepare data for prediction
-        sample = [[pm25, pm10, o3, no2, co, so2]]
-        prediction = model.predict(sample)[0]
+        sample = [pm25, pm10, o3, no2, co, so2]
+        prediction = predict_one(sample)
 
         # Determine Air Quality Index based on prediction
         result, conclusion = determine_air_quality(prediction)
@@ -80,38 +339,19 @@ def predict_automatically():
             error_code = 400
             return render_template('error.html', error=error_message ,error_code=error_code), 400
 
-        # Geocoding API to get lat and lon from city name
-        geocode_url = f"http://api.openweathermap.org/geo/1.0/direct?q={city_name}&limit=1&appid={API_KEY}"
-        geocode_response = requests.get(geocode_url)
-        if geocode_response.status_code != 200:
-            error_message = "Failed to fetch location data"
-            error_code = 500
-            return render_template('error.html', error=error_message ,error_code=error_code), 500
-        
-        geocode_data = geocode_response.json()
-        if not geocode_data:
-            error_message = "City not found"
-            error_code = 404
-            return render_template('error.html', error=error_message ,error_code=error_code), 404
-
-        # Assuming the first result is the most relevant
-        lat = geocode_data[0]['lat']
-        lon = geocode_data[0]['lon']
-
-        # Now use lat and lon to get air pollution data
-        air_quality_url = f"http://api.openweathermap.org/data/2.5/air_pollution?lat={lat}&lon={lon}&appid={API_KEY}"
-        air_quality_response = requests.get(air_quality_url)
-        if air_quality_response.status_code != 200:
-            error_message = "Failed to fetch Air Quality Index data"
-            error_code = 500
-            return render_template('error.html', error=error_message ,error_code=error_code), 500
-
-        air_quality_data = air_quality_response.json()['list'][0]['components']
-        sample = [
-            [air_quality_data['pm2_5'], air_quality_data['pm10'], air_quality_data['o3'],
-             air_quality_data['no2'], air_quality_data['co'], air_quality_data['so2']]
-        ]
-        prediction = round(model.predict(sample)[0],2)
+        # A fresh reading from the background poller needs no upstream call or prediction
+        reading = fresh_reading(city_name)
+        if reading is not None:
+            prediction = round(reading['aqi'], 2)
+        else:
+            # Geocode and air pollution lookups are cached and coalesced per city
+            try:
+                air_quality_data = lookup_city(city_name)
+            except OpenWeatherError as e:
+                return render_template('error.html', error=e.message ,error_code=e.status_code), e.status_code
+
+            sample = components_to_sample(air_quality_data)
+            prediction = round(predict_one(sample),2)
 
         result, conclusion = determine_air_quality(prediction)
 
@@ -120,44 +360,500 @@ def predict_automatically():
     else:
         return render_template('city.html')
 
-def determine_air_quality(prediction):
-    if prediction < 50:
-        return 'Air Quality Index is Good', 'The Air Quality Index is excellent. It poses little or no risk to human health.'
-    elif 51 <= prediction < 100:
-        return 'Air Quality Index is Satisfactory', 'The Air Quality Index is satisfactory, but there may be a risk for sensitive individuals.'
-    elif 101 <= prediction < 200:
-        return 'Air Quality Index is Moderately Polluted', 'Moderate health risk for sensitive individuals.'
-    elif 201 <= prediction < 300:
-        return 'Air Quality Index is Poor', 'Health warnings of emergency conditions.'
-    elif 301 <= prediction < 400:
-        return 'Air Quality Index is Very Poor', 'Health alert: everyone may experience more serious health effects.'
-    else:
-        return 'Air Quality Index is Severe', 'Health warnings of emergency conditions. The entire population is more likely to be affected.'
+def lookup_cities(city_names):
+    # Components, or the OpenWeatherError, per city. Under asgi.py the lookups
+    # were already awaited on the event loop and arrive in the WSGI environ.
+    prefetched = request.environ.get('aqi.city_components')
+    if prefetched is not None and all(name in prefetched for name in city_names):
+        return [prefetched[name] for name in city_names]
+    return weather.many_city_components(city_names, concurrency=app.config['CITY_CONCURRENCY'])
+
+def lookup_city(city_name):
+    prefetched = request.environ.get('aqi.city_components')
+    if prefetched is not None and city_name in prefetched:
+        components = prefetched[city_name]
+        if isinstance(components, OpenWeatherError):
+            raise components
+        return components
+    return weather.city_components(city_name)
+
+def fresh_reading(city_name):
+    # The latest polled reading of a city, if it is recent enough to serve
+    reading = history_store.latest(city_name)
+    if reading is None or time.time() - reading['timestamp'] > app.config['POLL_MAX_AGE']:
+        return None
+    return reading
+
+def components_to_sample(components):
+    # OpenWeather component names in model feature order
+    return [components['pm2_5'], components['pm10'], components['o3'],
+            components['no2'], components['co'], components['so2']]
+
+prediction_cache = None
+if app.config['PREDICTION_CACHE_SIZE'] > 0:
+    prediction_cache = PredictionCache(app.config['PREDICTION_CACHE_SIZE'],
+                                       app.config['PREDICTION_CACHE_QUANTUM'])
+
+def use_prediction_cache():
+    # Candidate traffic bypasses the memo so shadow/canary comparisons see every call
+    return prediction_cache is not None and model_registry.candidate is None
+
+def predict_batch(samples):
+    # One vectorized model call for any number of feature rows
+    X = np.asarray(samples, dtype=np.float64).reshape(-1, len(FEATURES))
+    if len(X) == 0:
+        return np.empty(0)
+    if use_prediction_cache():
+        active = model_registry.active
+        with stage('inference'):
+            return prediction_cache.predict(X, active.version, active.predict)
+    with stage('inference'):
+        return model_registry.predict(X)
+
+def predict_and_cache(samples):
+    # For rows predict_one has already looked up: predict them and write the
+    # results back, without a second (and double-counted) cache lookup
+    X = np.asarray(samples, dtype=np.float64).reshape(-1, len(FEATURES))
+    if not use_prediction_cache():
+        return predict_batch(X)
+    active = model_registry.active
+    with stage('inference'):
+        predictions = active.predict(X)
+    prediction_cache.store(X, active.version, predictions)
+    return predictions
+
+microbatcher = None
+if app.config['MICROBATCH_ENABLED']:
+    microbatcher = MicroBatcher(
+        predict_and_cache,
+        max_batch_size=app.config['MICROBATCH_MAX_BATCH'],
+        flush_window_ms=app.config['MICROBATCH_WINDOW_MS'],
+        max_queue_depth=app.config['MICROBATCH_MAX_QUEUE'],
+    )
+
+def predict_one(sample):
+    # Route single rows through the micro-batcher when it is enabled; a full
+    # queue or a batch that takes too long falls back to an inline prediction.
+    # Cache hits skip both.
+    if microbatcher is None:
+        return float(predict_batch([sample])[0])
+    if use_prediction_cache():
+        cached = prediction_cache.get(np.asarray([sample], dtype=np.float64), model_registry.active.version)
+        if cached is not None:
+            return cached
+    try:
+        return float(microbatcher.predict(sample, timeout=app.config['MICROBATCH_TIMEOUT_MS'] / 1000.0))
+    except (QueueFullError, FutureTimeoutError):
+        return float(predict_and_cache([sample])[0])
 
 # ========== Helper Validation Function ==========
 
 def validate_aqi_data(data):
-    required_fields = ['pm25', 'pm10', 'o3', 'no2', 'co', 'so2']
-    for field in required_fields:
-        if field not in data:
-            return False
-        try:
-            float(data[field])
-        except (ValueError, TypeError):
-            return False
-    return True
+    # Compiled six-pollutant schema: coerces to floats once, rejects unknown
+    # fields, oversized strings and out-of-range values
+    values, _ = validate_record(data)
+    return values is not None
+
+def invalid_input(message):
+    return jsonify({'error': 'Invalid input data', 'details': message}), 400
+
+class InvalidLine:
+    # Stands in for an NDJSON line that is not valid JSON, so the other lines
+    # keep their indexes and are still processed
+    __slots__ = ('details',)
+
+    def __init__(self, details):
+        self.details = details
+
+    def error(self, index):
+        return {'index': index, 'error': 'Invalid input data', 'details': self.details}
+
+def parse_json_rows(limit):
+    # Accept either a JSON array or newline-delimited JSON objects. NDJSON is
+    # read line by line and stops one row past limit, so an oversized upload
+    # is rejected without being loaded whole
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        rows = []
+        for line in request.stream:
+            try:
+                line = line.decode('utf-8')
+                if not line.strip():
+                    continue
+                rows.append(json.loads(line))
+            except ValueError as e:
+                rows.append(InvalidLine(f'Invalid JSON: {getattr(e, "msg", "not UTF-8")}'))
+            if len(rows) > limit:
+                break
+        return rows
+    return request.get_json(silent=True)
+
+# ========== Prediction API Endpoints ==========
+
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_batch_api():
+    """
+    Predict AQI for a batch of pollutant readings
+    ---
+    parameters:
+      - in: query
+        name: sub_index
+        schema:
+          type: boolean
+        required: false
+        description: Also return the CPCB breakpoint AQI computed from the pollutants
+    requestBody:
+      required: true
+      content:
+        application/json:
+          schema:
+            type: array
+            items:
+              type: object
+              required: [pm25, pm10, o3, no2, co, so2]
+              properties:
+                pm25:
+                  type: number
+                  example: 12.5
+                pm10:
+                  type: number
+                  example: 20.1
+                o3:
+                  type: number
+                  example: 0.03
+                no2:
+                  type: number
+                  example: 0.01
+                co:
+                  type: number
+                  example: 0.4
+                so2:
+                  type: number
+                  example: 0.005
+        application/x-ndjson:
+          schema:
+            type: string
+            description: One JSON reading per line
+    responses:
+      200:
+        description: Predictions in request order
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                count:
+                  type: integer
+                  example: 1
+                elapsed_ms:
+                  type: number
+                  example: 8.4
+                rows_per_second:
+                  type: number
+                  example: 119.0
+                predictions:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      prediction:
+                        type: number
+                        example: 42.7
+                      result:
+                        type: string
+                        example: "Air Quality Index is Good"
+                      conclusion:
+                        type: string
+                      sub_index_aqi:
+                        type: number
+                        description: Only with sub_index=true
+      400:
+        description: Invalid input data
+      413:
+        description: Batch exceeds the configured maximum size
+    """
+    max_batch_size = app.config['MAX_BATCH_SIZE']
+    rows = parse_json_rows(max_batch_size)
+    if not isinstance(rows, list) or not rows:
+        return jsonify({'error': 'Invalid input data'}), 400
+    if len(rows) > max_batch_size:
+        return jsonify({'error': f'Batch size exceeds maximum of {max_batch_size}'}), 413
+    samples = []
+    for index, row in enumerate(rows):
+        if isinstance(row, InvalidLine):
+            return jsonify(row.error(index)), 400
+        values, message = validate_record(row)
+        if values is None:
+            return jsonify({'error': 'Invalid input data', 'details': message, 'index': index}), 400
+        samples.append(values)
+
+    start = time.perf_counter()
+    predictions = predict_batch(samples)
+    elapsed = time.perf_counter() - start
+
+    _, labels, conclusions = classify(predictions)
+    results = [{'prediction': prediction, 'result': result, 'conclusion': conclusion}
+               for prediction, result, conclusion in zip(predictions.tolist(), labels, conclusions)]
+    if request.args.get('sub_index', '').lower() in ('1', 'true'):
+        # Breakpoint-based AQI from the same pollutants, to check the model against
+        for item, value in zip(results, compute_aqi(samples).tolist()):
+            item['sub_index_aqi'] = round(value, 2)
+    return jsonify({
+        'count': len(results),
+        'elapsed_ms': round(elapsed * 1000, 3),
+        'rows_per_second': round(len(results) / elapsed, 1) if elapsed > 0 else None,
+        'predictions': results,
+    })
+
+@app.route('/api/predict/cities', methods=['POST'])
+def predict_cities_api():
+    """
+    Predict AQI for many cities at once
+    ---
+    requestBody:
+      required: true
+      content:
+        application/json:
+          schema:
+            type: object
+            required: [cities]
+            properties:
+              cities:
+                type: array
+                items:
+                  type: string
+                example: ["Delhi", "Mumbai", "Chennai"]
+    responses:
+      200:
+        description: Per-city predictions in request order; failed cities carry an error instead
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                count:
+                  type: integer
+                  example: 3
+                failed:
+                  type: integer
+                  example: 0
+                elapsed_ms:
+                  type: number
+                  example: 154.2
+                results:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      city:
+                        type: string
+                        example: "Delhi"
+                      prediction:
+                        type: number
+                        example: 87.35
+                      result:
+                        type: string
+                        example: "Air Quality Index is Satisfactory"
+                      conclusion:
+                        type: string
+                      error:
+                        type: string
+                        example: "City not found"
+                      error_code:
+                        type: integer
+                        example: 404
+      400:
+        description: Invalid input data
+      413:
+        description: Too many cities in one request
+    """
+    data = request.get_json(silent=True)
+    cities = data.get('cities') if isinstance(data, dict) else None
+    if not isinstance(cities, list) or not cities or not all(isinstance(c, str) and c.strip() for c in cities):
+        return jsonify({'error': 'Invalid input data'}), 400
+    max_cities = app.config['MAX_CITIES']
+    if len(cities) > max_cities:
+        return jsonify({'error': f'Number of cities exceeds maximum of {max_cities}'}), 413
+
+    start = time.perf_counter()
+    fetched = lookup_cities(cities)
+
+    results = []
+    samples = []
+    for city_name, components in zip(cities, fetched):
+        if isinstance(components, OpenWeatherError):
+            results.append({'city': city_name, 'error': components.message, 'error_code': components.status_code})
+        else:
+            results.append({'city': city_name})
+            samples.append(components_to_sample(components))
+
+    predictions = np.round(predict_batch(samples), 2)
+    _, labels, conclusions = classify(predictions)
+    rows = zip(predictions.tolist(), labels, conclusions)
+    for item in results:
+        if 'error' not in item:
+            prediction, result, conclusion = next(rows)
+            item.update(prediction=prediction, result=result, conclusion=conclusion)
+
+    return jsonify({
+        'count': len(results),
+        'failed': len(results) - len(samples),
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 3),
+        'results': results,
+    })
+
+@app.route('/api/predict/microbatch/stats', methods=['GET'])
+def microbatch_stats():
+    """
+    Get micro-batching scheduler statistics
+    ---
+    responses:
+      200:
+        description: Throughput and latency counters for the micro-batcher
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                enabled:
+                  type: boolean
+                  example: true
+                rows:
+                  type: integer
+                  example: 1200
+                batches:
+                  type: integer
+                  example: 75
+                latency_p50_ms:
+                  type: number
+                  example: 2.4
+                latency_p99_ms:
+                  type: number
+                  example: 6.1
+                rows_per_second:
+                  type: number
+                  example: 310.5
+    """
+    if microbatcher is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **microbatcher.stats()})
+
+@app.route('/api/predict/cache/stats', methods=['GET'])
+def prediction_cache_stats():
+    """
+    Get prediction memo cache statistics
+    ---
+    responses:
+      200:
+        description: Hit/miss counters for cached model outputs
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                enabled:
+                  type: boolean
+                  example: true
+                size:
+                  type: integer
+                  example: 812
+                hits:
+                  type: integer
+                  example: 4210
+                misses:
+                  type: integer
+                  example: 930
+                hit_ratio:
+                  type: number
+                  example: 0.8191
+                quantum:
+                  type: number
+                  example: 0.1
+                version:
+                  type: string
+                  description: Model version the cached entries belong to
+                invalidations:
+                  type: integer
+                  description: Times the cache was emptied because the model version changed
+    """
+    if prediction_cache is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **prediction_cache.stats()})
+
+@app.route('/api/upstream/cache/stats', methods=['GET'])
+def upstream_cache_stats():
+    """
+    Get OpenWeather lookup cache statistics
+    ---
+    responses:
+      200:
+        description: Hit/miss counters for the geocode and air pollution caches
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                geocode:
+                  type: object
+                air_pollution:
+                  type: object
+                upstream:
+                  type: object
+                  description: Connection pool, retry and circuit breaker counters
+    """
+    return jsonify({**weather.cache_stats(), 'upstream': weather.upstream_stats()})
 
 # ========== REST API CRUD Endpoints with Swagger Specs ==========
 
 @app.route('/api/records', methods=['GET'])
 def get_records():
     """
-    Get all AQI records
+    Get AQI records, optionally paginated, filtered, projected or streamed
     ---
+    parameters:
+      - in: query
+        name: limit
+        schema:
+          type: integer
+        required: false
+        description: Page size; the cursor for the next page is returned in the X-Next-Cursor header
+      - in: query
+        name: after
+        schema:
+          type: string
+        required: false
+        description: Cursor from a previous page's X-Next-Cursor header
+      - in: query
+        name: fields
+        schema:
+          type: string
+          example: "pm25,pm10"
+        required: false
+        description: Comma-separated fields to return (id is always included)
+      - in: query
+        name: format
+        schema:
+          type: string
+          enum: [json, ndjson]
+        required: false
+        description: ndjson streams one record per line
+      - in: query
+        name: pm25_gt
+        schema:
+          type: number
+        required: false
+        description: Range filters <pollutant>_gt, _gte, _lt and _lte are accepted for every pollutant
+      - in: query
+        name: pm10_lte
+        schema:
+          type: number
+        required: false
     responses:
       200:
-        description: A list of all AQI records
+        description: A list of AQI records
         content:
+          application/x-ndjson:
+            schema:
+              type: string
           application/json:
             schema:
               type: array
@@ -167,6 +863,10 @@ def get_records():
                   id:
                     type: string
                     example: "123e4567-e89b-12d3-a456-426614174000"
+                  version:
+                    type: integer
+                    description: Incremented on every write; also sent as the ETag
+                    example: 1
                   pm25:
                     type: number
                     example: 12.5
@@ -185,8 +885,107 @@ def get_records():
                   so2:
                     type: number
                     example: 0.005
+      400:
+        description: Invalid query parameters
     """
-    return jsonify(list(aqi_records.values()))
+    try:
+        after, limit, filters, fields = parse_record_query(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    ndjson = request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson'
+    if limit is None:
+        records = (project_record(record, fields) for _, record in record_store.scan(after, filters))
+        if ndjson:
+            return Response(stream_with_context(buffered(json.dumps(r) + '\n' for r in records)),
+                            mimetype='application/x-ndjson')
+        return Response(stream_with_context(buffered(stream_json_array(records))), mimetype='application/json')
+
+    # Read one extra row to learn whether another page follows
+    page = list(record_store.scan(after, filters, limit + 1))
+    headers = {}
+    if len(page) > limit:
+        page = page[:limit]
+        headers['X-Next-Cursor'] = str(page[-1][0])
+    records = [project_record(record, fields) for _, record in page]
+    if ndjson:
+        return Response(''.join(json.dumps(r) + '\n' for r in records),
+                        mimetype='application/x-ndjson', headers=headers)
+    return jsonify(records), 200, headers
+
+def parse_record_query(args):
+    after = args.get('after')
+    if after is not None:
+        if not after.isdigit():
+            raise ValueError('Invalid cursor')
+        after = int(after)
+    limit = args.get('limit')
+    if limit is not None:
+        if not limit.isdigit() or int(limit) < 1:
+            raise ValueError('Invalid limit')
+        limit = min(int(limit), app.config['MAX_PAGE_SIZE'])
+    filters = []
+    for key, value in args.items():
+        field, _, op = key.rpartition('_')
+        if field in FEATURES and op in FILTER_OPS:
+            try:
+                filters.append((field, op, float(value)))
+            except ValueError:
+                raise ValueError(f'Invalid value for {key}')
+    fields = None
+    if args.get('fields'):
+        fields = [f for f in args['fields'].split(',') if f]
+        unknown = set(fields) - set(FEATURES) - {'id', 'version'}
+        if unknown:
+            raise ValueError(f'Unknown fields: {", ".join(sorted(unknown))}')
+    return after, limit, filters, fields
+
+def record_response(record, status=200):
+    # A record as JSON with its version as the ETag
+    response = jsonify(record)
+    response.status_code = status
+    response.set_etag(str(record['version']))
+    return response
+
+def if_match_versions():
+    # Versions accepted by If-Match, or None when the header is absent or '*'.
+    # Tags that are not versions of this store can never match.
+    if_match = request.if_match
+    if not if_match or if_match.star_tag:
+        return None
+    return {int(tag) for tag in if_match if tag.isdigit()}
+
+def version_conflict(e):
+    response = jsonify({'error': 'Record has been modified', 'version': e.current_version})
+    response.status_code = 412
+    response.set_etag(str(e.current_version))
+    return response
+
+def project_record(record, fields):
+    if fields is None:
+        return record
+    return {'id': record['id'], **{f: record[f] for f in fields if f in record}}
+
+def buffered(pieces, size=65536):
+    # Coalesce small string pieces into larger chunks for the WSGI server
+    buffer, length = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+def stream_json_array(items):
+    # Yield a JSON array piece by piece instead of serializing it in one go
+    yield '['
+    first = True
+    for item in items:
+        yield json.dumps(item) if first else ',' + json.dumps(item)
+        first = False
+    yield ']'
 
 @app.route('/api/records', methods=['POST'])
 def create_record():
@@ -230,6 +1029,10 @@ def create_record():
                 id:
                   type: string
                   example: "123e4567-e89b-12d3-a456-426614174000"
+                version:
+                  type: integer
+                  description: Incremented on every write; also sent as the ETag
+                  example: 1
                 pm25:
                   type: number
                   example: 12.5
@@ -251,12 +1054,10 @@ def create_record():
       400:
         description: Invalid input data
     """
-    data = request.json
-    if not data or not validate_aqi_data(data):
-        return jsonify({'error': 'Invalid input data'}), 400
-    record_id = str(uuid4())
-    aqi_records[record_id] = {"id": record_id, **data}
-    return jsonify(aqi_records[record_id]), 201
+    values, message = validate_record(request.get_json(silent=True))
+    if values is None:
+        return invalid_input(message)
+    return record_response(record_store.create(values), 201)
 
 @app.route('/api/records/<record_id>', methods=['GET'])
 def get_record(record_id):
@@ -270,9 +1071,15 @@ def get_record(record_id):
           type: string
         required: true
         description: The ID of the AQI record
+      - in: header
+        name: If-None-Match
+        schema:
+          type: string
+        required: false
+        description: ETag from an earlier response; answers 304 if the record is unchanged
     responses:
       200:
-        description: AQI record found
+        description: AQI record found, with its version as the ETag
         content:
           application/json:
             schema:
@@ -281,6 +1088,10 @@ def get_record(record_id):
                 id:
                   type: string
                   example: "123e4567-e89b-12d3-a456-426614174000"
+                version:
+                  type: integer
+                  description: Incremented on every write; also sent as the ETag
+                  example: 1
                 pm25:
                   type: number
                   example: 12.5
@@ -299,12 +1110,15 @@ def get_record(record_id):
                 so2:
                   type: number
                   example: 0.005
+      304:
+        description: Record unchanged since the ETag in If-None-Match
       404:
         description: Record not found
     """
-    if record_id not in aqi_records:
+    record = record_store.get(record_id)
+    if record is None:
         return jsonify({'error': 'Record not found'}), 404
-    return jsonify(aqi_records[record_id])
+    return record_response(record).make_conditional(request)
 
 @app.route('/api/records/<record_id>', methods=['PUT'])
 def update_record(record_id):
@@ -318,6 +1132,12 @@ def update_record(record_id):
           type: string
         required: true
         description: The ID of the AQI record
+      - in: header
+        name: If-Match
+        schema:
+          type: string
+        required: false
+        description: ETag of the version being replaced; the write is refused with 412 if the record has changed since
     requestBody:
       required: true
       content:
@@ -355,6 +1175,10 @@ def update_record(record_id):
                 id:
                   type: string
                   example: "123e4567-e89b-12d3-a456-426614174000"
+                version:
+                  type: integer
+                  description: Incremented on every write; also sent as the ETag
+                  example: 1
                 pm25:
                   type: number
                   example: 12.5
@@ -377,14 +1201,21 @@ def update_record(record_id):
         description: Invalid input data
       404:
         description: Record not found
+      412:
+        description: If-Match does not name the record's current version
     """
-    if record_id not in aqi_records:
+    if record_store.get(record_id) is None:
         return jsonify({'error': 'Record not found'}), 404
-    data = request.json
-    if not data or not validate_aqi_data(data):
-        return jsonify({'error': 'Invalid input data'}), 400
-    aqi_records[record_id].update(data)
-    return jsonify(aqi_records[record_id])
+    values, message = validate_record(request.get_json(silent=True))
+    if values is None:
+        return invalid_input(message)
+    try:
+        record = record_store.update(record_id, values, if_match=if_match_versions())
+    except VersionConflictError as e:
+        return version_conflict(e)
+    if record is None:
+        return jsonify({'error': 'Record not found'}), 404
+    return record_response(record)
 
 @app.route('/api/records/<record_id>', methods=['DELETE'])
 def delete_record(record_id):
@@ -398,15 +1229,26 @@ def delete_record(record_id):
           type: string
         required: true
         description: The ID of the AQI record to delete
+      - in: header
+        name: If-Match
+        schema:
+          type: string
+        required: false
+        description: ETag of the version being deleted; the write is refused with 412 if the record has changed since
     responses:
       204:
         description: Record deleted successfully
       404:
         description: Record not found
+      412:
+        description: If-Match does not name the record's current version
     """
-    if record_id not in aqi_records:
+    try:
+        removed = record_store.delete(record_id, if_match=if_match_versions())
+    except VersionConflictError as e:
+        return version_conflict(e)
+    if not removed:
         return jsonify({'error': 'Record not found'}), 404
-    del aqi_records[record_id]
     return '', 204
 
 @app.route('/api/records/reset', methods=['POST'])
@@ -418,8 +1260,1147 @@ def reset_records():
       204:
         description: All records cleared successfully
     """
-    aqi_records.clear()
+    record_store.clear()
     return '', 204
 
+# ========== Bulk Record Endpoints ==========
+
+def parse_bulk_items():
+    # Undecodable NDJSON lines come back as InvalidLine items, reported per
+    # item by the caller
+    max_bulk_size = app.config['MAX_BULK_SIZE']
+    items = parse_json_rows(max_bulk_size)
+    if isinstance(items, dict) and 'ids' in items:
+        items = items['ids']
+    if not isinstance(items, list) or not items:
+        return None, (jsonify({'error': 'Invalid input data'}), 400)
+    if len(items) > max_bulk_size:
+        return None, (jsonify({'error': f'Bulk size exceeds maximum of {max_bulk_size}'}), 413)
+    return items, None
+
+def annotate_predictions(records):
+    # One vectorized predict call for the whole batch
+    if not records:
+        return records
+    predictions = predict_batch([[r[f] for f in FEATURES] for r in records])
+    _, labels, _ = classify(predictions)
+    return [{**record, 'predicted_aqi': prediction, 'result': result}
+            for record, prediction, result in zip(records, predictions.tolist(), labels)]
+
+@app.route('/api/records/bulk', methods=['POST'])
+def bulk_create_records():
+    """
+    Create many AQI records in one request
+    ---
+    parameters:
+      - in: query
+        name: predict
+        schema:
+          type: boolean
+        required: false
+        description: Annotate each created record with its predicted AQI
+    requestBody:
+      required: true
+      content:
+        application/json:
+          schema:
+            type: array
+            items:
+              type: object
+              required: [pm25, pm10, o3, no2, co, so2]
+              properties:
+                pm25:
+                  type: number
+                  example: 12.5
+                pm10:
+                  type: number
+                  example: 20.1
+                o3:
+                  type: number
+                  example: 0.03
+                no2:
+                  type: number
+                  example: 0.01
+                co:
+                  type: number
+                  example: 0.4
+                so2:
+                  type: number
+                  example: 0.005
+        application/x-ndjson:
+          schema:
+            type: string
+            description: One record per line
+    responses:
+      201:
+        description: Valid items were created together; invalid items are listed in errors
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                created:
+                  type: array
+                  items:
+                    type: object
+                errors:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      index:
+                        type: integer
+                        example: 3
+                      error:
+                        type: string
+                        example: "Invalid input data"
+      400:
+        description: No valid items in the request
+      413:
+        description: Too many items in one request
+    """
+    items, error = parse_bulk_items()
+    if error:
+        return error
+    valid, errors = [], []
+    for index, data in enumerate(items):
+        if isinstance(data, InvalidLine):
+            errors.append(data.error(index))
+            continue
+        values, message = validate_record(data)
+        if values is None:
+            errors.append({'index': index, 'error': 'Invalid input data', 'details': message})
+        else:
+            valid.append(values)
+    if not valid:
+        return jsonify({'created': [], 'errors': errors}), 400
+    created = record_store.bulk_create(valid)
+    if request.args.get('predict', '').lower() in ('1', 'true', 'yes'):
+        created = annotate_predictions(created)
+    return jsonify({'created': created, 'errors': errors}), 201
+
+@app.route('/api/records/bulk', methods=['PUT'])
+def bulk_update_records():
+    """
+    Update many AQI records in one request
+    ---
+    requestBody:
+      required: true
+      content:
+        application/json:
+          schema:
+            type: array
+            items:
+              type: object
+              required: [id, pm25, pm10, o3, no2, co, so2]
+              properties:
+                id:
+                  type: string
+                  example: "123e4567-e89b-12d3-a456-426614174000"
+                pm25:
+                  type: number
+                  example: 12.5
+                pm10:
+                  type: number
+                  example: 20.1
+                o3:
+                  type: number
+                  example: 0.03
+                no2:
+                  type: number
+                  example: 0.01
+                co:
+                  type: number
+                  example: 0.4
+                so2:
+                  type: number
+                  example: 0.005
+        application/x-ndjson:
+          schema:
+            type: string
+            description: One record per line
+    responses:
+      200:
+        description: Valid items were updated together; invalid or unknown items are listed in errors
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                updated:
+                  type: array
+                  items:
+                    type: object
+                errors:
+                  type: array
+                  items:
+                    type: object
+      400:
+        description: Invalid input data
+      413:
+        description: Too many items in one request
+    """
+    items, error = parse_bulk_items()
+    if error:
+        return error
+    changes, indexes, errors = [], [], []
+    for index, data in enumerate(items):
+        if isinstance(data, InvalidLine):
+            errors.append(data.error(index))
+            continue
+        if not isinstance(data, dict) or not isinstance(data.get('id'), str):
+            errors.append({'index': index, 'error': 'Invalid input data', 'details': 'Missing field: id'})
+            continue
+        values, message = validate_record({k: v for k, v in data.items() if k != 'id'})
+        if values is None:
+            errors.append({'index': index, 'error': 'Invalid input data', 'details': message})
+            continue
+        changes.append((data['id'], values))
+        indexes.append(index)
+    updated = []
+    for index, record in zip(indexes, record_store.bulk_update(changes)):
+        if record is None:
+            errors.append({'index': index, 'error': 'Record not found'})
+        else:
+            updated.append(record)
+    errors.sort(key=lambda e: e['index'])
+    return jsonify({'updated': updated, 'errors': errors})
+
+@app.route('/api/records/bulk', methods=['DELETE'])
+def bulk_delete_records():
+    """
+    Delete many AQI records in one request
+    ---
+    requestBody:
+      required: true
+      content:
+        application/json:
+          schema:
+            type: object
+            properties:
+              ids:
+                type: array
+                items:
+                  type: string
+                example: ["123e4567-e89b-12d3-a456-426614174000"]
+    responses:
+      200:
+        description: Deleted ids; unknown ids are listed in errors
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                deleted:
+                  type: array
+                  items:
+                    type: string
+                errors:
+                  type: array
+                  items:
+                    type: object
+      400:
+        description: Invalid input data
+      413:
+        description: Too many items in one request
+    """
+    items, error = parse_bulk_items()
+    if error:
+        return error
+    ids, indexes, errors = [], [], []
+    for index, record_id in enumerate(items):
+        if isinstance(record_id, str):
+            ids.append(record_id)
+            indexes.append(index)
+        elif isinstance(record_id, InvalidLine):
+            errors.append(record_id.error(index))
+        else:
+            errors.append({'index': index, 'error': 'Invalid input data'})
+    deleted = []
+    for index, record_id, removed in zip(indexes, ids, record_store.bulk_delete(ids)):
+        if removed:
+            deleted.append(record_id)
+        else:
+            errors.append({'index': index, 'error': 'Record not found'})
+    errors.sort(key=lambda e: e['index'])
+    return jsonify({'deleted': deleted, 'errors': errors})
+
+# ========== Offline Scoring Endpoints ==========
+
+SCORING_FORMATS = {'text/csv': 'csv', 'application/x-ndjson': 'ndjson', 'application/jsonl': 'ndjson'}
+
+def scoring_request():
+    # The upload as a binary stream (raw body or multipart "file" field), its
+    # format and a Scorer configured from the query string
+    upload = request.files.get('file')
+    if upload is not None:
+        stream = upload.stream
+        guessed = 'ndjson' if upload.filename.lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+    else:
+        stream = request.stream
+        guessed = SCORING_FORMATS.get(request.mimetype, 'csv')
+    fmt = request.args.get('format', guessed)
+    if fmt not in ('csv', 'ndjson'):
+        raise ScoringError('format must be csv or ndjson')
+    imputation = model_registry.active.metadata.get('imputation', {}).get('values')
+    scorer = Scorer(predict_batch, imputation, request.args.get('missing', 'impute'),
+                    chunk_rows=app.config['SCORE_CHUNK_ROWS'])
+    return stream, fmt, scorer
+
+@app.route('/api/score', methods=['POST'])
+def score_upload():
+    """
+    Score an uploaded CSV or NDJSON file, streaming the results back
+    ---
+    description: >
+      Columns PM2.5 (or pm25), PM10, O3, NO2, CO and SO2 are matched case-insensitively;
+      other columns are passed through. Rows are read and predicted in chunks, and each
+      scored chunk is written out as soon as it is ready, so memory stays bounded.
+    parameters:
+      - in: query
+        name: format
+        schema:
+          type: string
+          enum: [csv, ndjson]
+        required: false
+        description: Defaults from the Content-Type or file name, else csv
+      - in: query
+        name: missing
+        schema:
+          type: string
+          enum: [impute, skip]
+          default: impute
+        required: false
+        description: Fill missing values with the training means, or leave those rows unscored
+    requestBody:
+      required: true
+      content:
+        text/csv:
+          schema:
+            type: string
+        application/x-ndjson:
+          schema:
+            type: string
+        multipart/form-data:
+          schema:
+            type: object
+            properties:
+              file:
+                type: string
+                format: binary
+    responses:
+      200:
+        description: The input rows with predicted_aqi and result appended, in the input format
+      400:
+        description: Missing columns or invalid options
+    """
+    try:
+        stream, fmt, scorer = scoring_request()
+        output = open_scoring_stream(stream, fmt, scorer)
+    except ScoringError as e:
+        return jsonify({'error': str(e)}), 400
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(output), mimetype=mimetype)
+
+@app.route('/api/score/jobs', methods=['POST'])
+def create_scoring_job():
+    """
+    Score an uploaded file as a background job
+    ---
+    description: Accepts the same body and options as POST /api/score.
+    responses:
+      202:
+        description: Job accepted; poll its status URL
+      400:
+        description: Invalid options
+    """
+    try:
+        stream, fmt, scorer = scoring_request()
+    except ScoringError as e:
+        return jsonify({'error': str(e)}), 400
+    job = scoring_jobs.submit(stream, fmt, scorer)
+    response = jsonify(job)
+    response.status_code = 202
+    response.headers['Location'] = url_for('get_scoring_job', job_id=job['id'])
+    return response
+
+@app.route('/api/score/jobs/<job_id>', methods=['GET'])
+def get_scoring_job(job_id):
+    """
+    Poll a scoring job
+    ---
+    parameters:
+      - in: path
+        name: job_id
+        schema:
+          type: string
+        required: true
+    responses:
+      200:
+        description: Status (queued, running, done, failed, cancelled) and progress
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                status:
+                  type: string
+                  example: "running"
+                progress:
+                  type: number
+                  example: 0.42
+                rows:
+                  type: integer
+                scored:
+                  type: integer
+                imputed:
+                  type: integer
+                skipped:
+                  type: integer
+                errors:
+                  type: integer
+      404:
+        description: Job not found
+    """
+    job = scoring_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/score/jobs/<job_id>/result', methods=['GET'])
+def get_scoring_job_result(job_id):
+    """
+    Download a finished scoring job's output
+    ---
+    parameters:
+      - in: path
+        name: job_id
+        schema:
+          type: string
+        required: true
+    responses:
+      200:
+        description: Scored rows in the input format
+      404:
+        description: Job not found
+      409:
+        description: Job has not finished successfully
+    """
+    job = scoring_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    path = scoring_jobs.result_path(job_id)
+    if path is None:
+        return jsonify({'error': f"Job is {job['status']}"}), 409
+    return send_file(path, mimetype='text/csv' if job['format'] == 'csv' else 'application/x-ndjson',
+                     as_attachment=True, download_name=f"scored-{job_id}.{job['format']}")
+
+@app.route('/api/score/jobs/<job_id>', methods=['DELETE'])
+def delete_scoring_job(job_id):
+    """
+    Cancel a scoring job and delete its files
+    ---
+    parameters:
+      - in: path
+        name: job_id
+        schema:
+          type: string
+        required: true
+    responses:
+      204:
+        description: Job cancelled or removed
+      404:
+        description: Job not found
+    """
+    if not scoring_jobs.delete(job_id):
+        return jsonify({'error': 'Job not found'}), 404
+    return '', 204
+
+# ========== Chart Endpoints ==========
+
+# Static images from the notebook, served when there is no data to render from
+STATIC_CHARTS = {'pm25': 'AQI_PM2.5.png', 'pm10': 'AQI_PM10.png', 'o3': 'AQI_O3.png',
+                 'no2': 'AQI_NO2.png', 'co': 'AQI_CO.png', 'so2': 'AQI_SO2.png'}
+
+def chart_response(key, render):
+    # 304 for a matching ETag, the cached PNG, 202 while a cold chart renders,
+    # or 500 while a failed render is remembered
+    if key in request.if_none_match:
+        response = Response(status=304)
+    else:
+        try:
+            png, _ = chart_renderer.get(key, render, wait=app.config['CHART_WAIT_SECONDS'])
+        except ChartRenderError:
+            return jsonify({'error': 'Failed to render chart'}), 500
+        if png is None:
+            response = jsonify({'status': 'rendering'})
+            response.status_code = 202
+            response.headers['Retry-After'] = '1'
+            return response
+        response = Response(png, mimetype='image/png')
+    response.set_etag(key)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def chart_filters():
+    start, end, _ = parse_dataset_query(request.args)
+    return request.args.get('city') or None, start, end
+
+@app.route('/charts/heatmap.png', methods=['GET'])
+def chart_heatmap():
+    """
+    Pollutant and AQI correlation heatmap
+    ---
+    parameters:
+      - in: query
+        name: city
+        schema:
+          type: string
+        required: false
+      - in: query
+        name: start
+        schema:
+          type: string
+          format: date
+        required: false
+      - in: query
+        name: end
+        schema:
+          type: string
+          format: date
+        required: false
+    responses:
+      200:
+        description: PNG image; ETag supports conditional GET
+        content:
+          image/png: {}
+      202:
+        description: The chart is still rendering; retry shortly
+      304:
+        description: Not modified
+      400:
+        description: Invalid query parameters
+      404:
+        description: Unknown city
+      500:
+        description: Rendering failed; not retried for a short while
+    """
+    try:
+        city, start, end = chart_filters()
+        try:
+            correlation = chart_data.dataset_correlation(city, start, end)
+            source = 'city_day.csv'
+        except DatasetNotFoundError:
+            correlation, source = None, None
+        if not (city or start or end):
+            # Stored records only add pollutant pairs, so they join unfiltered charts
+            records, count = chart_data.records_correlation()
+            if count:
+                correlation = records if correlation is None else correlation.merge(records)
+                source = f'{source} + {count} records' if source else f'{count} records'
+        if correlation is None:
+            return redirect(url_for('static', filename='heatmap.png'))
+    except (KeyError, ValueError) as e:
+        return dataset_error(e)
+
+    matrix = correlation.matrix()
+    labels = [LABELS[c] for c in CHART_COLUMNS]
+    title = f"Correlation ({', '.join(filter(None, [city, start, end])) or 'all data'}; {source})"
+    key = content_hash('heatmap', np.round(matrix, 4), title)
+    return chart_response(key, lambda: render_heatmap(matrix, labels, title))
+
+@app.route('/charts/pollutants/<pollutant>.png', methods=['GET'])
+def chart_pollutant(pollutant):
+    """
+    AQI against one pollutant as a scatter plot
+    ---
+    parameters:
+      - in: path
+        name: pollutant
+        schema:
+          type: string
+          enum: [pm25, pm10, o3, no2, co, so2]
+        required: true
+      - in: query
+        name: city
+        schema:
+          type: string
+        required: false
+      - in: query
+        name: start
+        schema:
+          type: string
+          format: date
+        required: false
+      - in: query
+        name: end
+        schema:
+          type: string
+          format: date
+        required: false
+    responses:
+      200:
+        description: PNG image; ETag supports conditional GET
+        content:
+          image/png: {}
+      202:
+        description: The chart is still rendering; retry shortly
+      304:
+        description: Not modified
+      400:
+        description: Invalid query parameters
+      404:
+        description: Unknown pollutant or city
+      500:
+        description: Rendering failed; not retried for a short while
+    """
+    if pollutant not in STATIC_CHARTS:
+        return jsonify({'error': f'Unknown pollutant: {pollutant}'}), 404
+    try:
+        city, start, end = chart_filters()
+        x, y = chart_data.scatter(pollutant, city, start, end)
+    except DatasetNotFoundError:
+        return redirect(url_for('static', filename=STATIC_CHARTS[pollutant]))
+    except (KeyError, ValueError) as e:
+        return dataset_error(e)
+
+    label = LABELS[pollutant]
+    title = f"AQI vs {label} ({', '.join(filter(None, [city, start, end])) or 'all cities'}; {len(x)} days)"
+    key = content_hash('scatter', x, y, title)
+    return chart_response(key, lambda: render_scatter(x, y, label, 'AQI', title))
+
+@app.route('/api/charts/stats', methods=['GET'])
+def chart_stats():
+    """
+    Get chart render cache statistics
+    ---
+    responses:
+      200:
+        description: Cached images, hits and misses, and completed renders
+    """
+    return jsonify(chart_renderer.stats())
+
+# ========== Historical Dataset Endpoints ==========
+
+def parse_dataset_query(args):
+    # Shared date range and measure parsing for the dataset endpoints
+    start, end = args.get('start'), args.get('end')
+    for name, value in (('start', start), ('end', end)):
+        if value is not None:
+            try:
+                np.datetime64(value, 'D')
+            except ValueError:
+                raise ValueError(f'Invalid {name} date, expected YYYY-MM-DD')
+    measure = args.get('measure', 'aqi')
+    if measure not in MEASURES:
+        raise ValueError(f'Unknown measure: {measure}')
+    return start, end, measure
+
+def dataset_error(e):
+    if isinstance(e, DatasetNotFoundError):
+        return jsonify({'error': 'Historical dataset has not been ingested'}), 503
+    if isinstance(e, KeyError):
+        return jsonify({'error': f'Unknown city: {e.args[0]}'}), 404
+    return jsonify({'error': str(e)}), 400
+
+@app.route('/api/dataset/cities', methods=['GET'])
+def dataset_cities():
+    """
+    List cities in the historical dataset
+    ---
+    responses:
+      200:
+        description: Row count and date range per city
+        content:
+          application/json:
+            schema:
+              type: array
+              items:
+                type: object
+                properties:
+                  city:
+                    type: string
+                    example: "Delhi"
+                  rows:
+                    type: integer
+                    example: 2009
+                  first_date:
+                    type: string
+                    example: "2015-01-01"
+                  last_date:
+                    type: string
+                    example: "2020-07-01"
+      503:
+        description: Dataset has not been ingested
+    """
+    try:
+        return jsonify(get_dataset().city_summaries())
+    except DatasetNotFoundError as e:
+        return dataset_error(e)
+
+@app.route('/api/dataset/cities/<city>', methods=['GET'])
+def dataset_city_range(city):
+    """
+    Daily readings for one city, optionally within a date range
+    ---
+    parameters:
+      - in: path
+        name: city
+        schema:
+          type: string
+        required: true
+      - in: query
+        name: start
+        schema:
+          type: string
+          format: date
+        required: false
+      - in: query
+        name: end
+        schema:
+          type: string
+          format: date
+        required: false
+        description: Inclusive
+      - in: query
+        name: measures
+        schema:
+          type: string
+        required: false
+        description: Comma-separated columns, e.g. pm25,pm10,aqi (default all)
+      - in: query
+        name: limit
+        schema:
+          type: integer
+        required: false
+    responses:
+      200:
+        description: Rows in date order
+      400:
+        description: Invalid query parameters
+      404:
+        description: Unknown city
+      503:
+        description: Dataset has not been ingested
+    """
+    try:
+        start, end, _ = parse_dataset_query(request.args)
+        measures = MEASURES
+        if request.args.get('measures'):
+            measures = [m for m in request.args['measures'].split(',') if m]
+            unknown = set(measures) - set(MEASURES)
+            if unknown:
+                raise ValueError(f'Unknown measures: {", ".join(sorted(unknown))}')
+        limit = request.args.get('limit', str(app.config['MAX_PAGE_SIZE']))
+        if not limit.isdigit() or int(limit) < 1:
+            raise ValueError('Invalid limit')
+        limit = min(int(limit), app.config['MAX_PAGE_SIZE'])
+        rows = get_dataset().city_range(city, start, end, measures, limit)
+    except (DatasetNotFoundError, KeyError, ValueError) as e:
+        return dataset_error(e)
+    return jsonify({'city': city, 'count': len(rows), 'rows': rows})
+
+@app.route('/api/dataset/aggregates', methods=['GET'])
+def dataset_aggregates():
+    """
+    Count, mean, min and max of one measure
+    ---
+    parameters:
+      - in: query
+        name: measure
+        schema:
+          type: string
+          default: aqi
+        required: false
+        description: pm25, pm10, no, no2, nox, nh3, co, so2, o3, benzene, toluene, xylene or aqi
+      - in: query
+        name: city
+        schema:
+          type: string
+        required: false
+      - in: query
+        name: start
+        schema:
+          type: string
+          format: date
+        required: false
+      - in: query
+        name: end
+        schema:
+          type: string
+          format: date
+        required: false
+      - in: query
+        name: by
+        schema:
+          type: string
+          enum: [city]
+        required: false
+        description: Return one aggregate per city
+    responses:
+      200:
+        description: Aggregate over non-missing values
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                measure:
+                  type: string
+                  example: "pm25"
+                count:
+                  type: integer
+                  example: 24933
+                mean:
+                  type: number
+                  example: 67.45
+                min:
+                  type: number
+                max:
+                  type: number
+      400:
+        description: Invalid query parameters
+      404:
+        description: Unknown city
+      503:
+        description: Dataset has not been ingested
+    """
+    try:
+        start, end, measure = parse_dataset_query(request.args)
+        data = get_dataset()
+        if request.args.get('by') == 'city':
+            return jsonify({'measure': measure, 'cities': data.aggregate(measure, start=start, end=end, by_city=True)})
+        result = data.aggregate(measure, request.args.get('city'), start, end)
+    except (DatasetNotFoundError, KeyError, ValueError) as e:
+        return dataset_error(e)
+    return jsonify({'measure': measure, **result})
+
+@app.route('/api/dataset/worst', methods=['GET'])
+def dataset_worst():
+    """
+    Days with the highest value of one measure
+    ---
+    parameters:
+      - in: query
+        name: measure
+        schema:
+          type: string
+          default: aqi
+        required: false
+      - in: query
+        name: n
+        schema:
+          type: integer
+          default: 10
+        required: false
+      - in: query
+        name: city
+        schema:
+          type: string
+        required: false
+      - in: query
+        name: start
+        schema:
+          type: string
+          format: date
+        required: false
+      - in: query
+        name: end
+        schema:
+          type: string
+          format: date
+        required: false
+    responses:
+      200:
+        description: Worst days, highest first
+      400:
+        description: Invalid query parameters
+      404:
+        description: Unknown city
+      503:
+        description: Dataset has not been ingested
+    """
+    try:
+        start, end, measure = parse_dataset_query(request.args)
+        n = request.args.get('n', '10')
+        if not n.isdigit() or int(n) < 1:
+            raise ValueError('Invalid n')
+        n = min(int(n), app.config['MAX_PAGE_SIZE'])
+        rows = get_dataset().worst(measure, n, request.args.get('city'), start, end)
+    except (DatasetNotFoundError, KeyError, ValueError) as e:
+        return dataset_error(e)
+    return jsonify({'measure': measure, 'count': len(rows), 'rows': rows})
+
+# ========== Air Quality History Endpoints ==========
+
+city_poller = CityPoller(
+    lambda: weather,
+    predict_batch,
+    history_store,
+    app.config['POLL_CITIES'],
+    interval=app.config['POLL_INTERVAL'],
+    rate=app.config['POLL_RATE'],
+)
+
+def parse_history_time(name, value):
+    # Epoch seconds or an ISO 8601 date/time, UTC unless an offset is given
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Invalid {name}, expected epoch seconds or ISO 8601')
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def history_point(row, label):
+    return {'time': datetime.fromtimestamp(row['timestamp'], timezone.utc).isoformat(),
+            **row, 'result': label}
+
+@app.route('/api/history', methods=['GET'])
+def history_cities():
+    """
+    Cities tracked by the background poller
+    ---
+    responses:
+      200:
+        description: Stored readings and the latest reading per city, and poller statistics
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                cities:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      city:
+                        type: string
+                        example: "Delhi"
+                      readings:
+                        type: integer
+                      rollups:
+                        type: integer
+                      latest:
+                        type: object
+                poller:
+                  type: object
+    """
+    return jsonify({'cities': history_store.cities(), 'poller': city_poller.stats()})
+
+@app.route('/api/history/<city>', methods=['GET'])
+def history_city(city):
+    """
+    Polled pollutant readings and predicted AQI for one city
+    ---
+    description: >
+      Served from the time-series store only; no OpenWeather calls are made.
+      Raw readings are kept for AQI_HISTORY_RAW_RETENTION seconds, then averaged
+      into AQI_HISTORY_RESOLUTION-second buckets kept for AQI_HISTORY_RETENTION.
+    parameters:
+      - in: path
+        name: city
+        schema:
+          type: string
+        required: true
+      - in: query
+        name: start
+        schema:
+          type: string
+        required: false
+        description: Epoch seconds or ISO 8601 date/time (UTC unless an offset is given)
+      - in: query
+        name: end
+        schema:
+          type: string
+        required: false
+        description: Inclusive
+      - in: query
+        name: resolution
+        schema:
+          type: string
+          enum: [auto, raw, rollup]
+          default: auto
+        required: false
+        description: auto returns raw readings when start lies within the raw retention
+    responses:
+      200:
+        description: Points in time order; rollup points carry the number of readings averaged
+      400:
+        description: Invalid query parameters
+      404:
+        description: City is not being polled
+    """
+    resolution = request.args.get('resolution', 'auto')
+    try:
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f'resolution must be one of: {", ".join(RESOLUTIONS)}')
+        start = parse_history_time('start', request.args.get('start'))
+        end = parse_history_time('end', request.args.get('end'))
+        resolution, rows = history_store.history(city, start, end, resolution)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except KeyError:
+        return jsonify({'error': f'City is not being polled: {city}'}), 404
+    _, labels, _ = classify([row['aqi'] for row in rows])
+    return jsonify({
+        'city': city,
+        'resolution': resolution,
+        'resolution_seconds': history_store.resolution if resolution == 'rollup' else None,
+        'count': len(rows),
+        'points': [history_point(row, label) for row, label in zip(rows, labels)],
+        'latest': history_store.latest(city),
+    })
+
+# ========== Model Admin Endpoints ==========
+
+def admin_denied():
+    # Admin endpoints require X-Admin-Token to match AQI_ADMIN_TOKEN and are
+    # disabled altogether while no token is configured
+    token = app.config['ADMIN_TOKEN']
+    if not token:
+        return jsonify({'error': 'Admin endpoints are disabled; set AQI_ADMIN_TOKEN'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), token.encode()):
+        return jsonify({'error': 'Admin token required'}), 403
+    return None
+
+@app.route('/api/admin/models', methods=['GET'])
+def list_models():
+    """
+    List available model versions and the one being served
+    ---
+    responses:
+      200:
+        description: Active model, versions found in the model directory and the current candidate
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                active:
+                  type: object
+                versions:
+                  type: array
+                  items:
+                    type: object
+                candidate:
+                  type: object
+                  nullable: true
+                swaps:
+                  type: integer
+      403:
+        description: Missing or wrong admin token, or AQI_ADMIN_TOKEN is not set
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+    return jsonify({
+        'active': model_registry.active.describe(),
+        'versions': model_registry.list_versions(),
+        'candidate': model_registry.candidate_stats(),
+        'swaps': model_registry.swaps,
+    })
+
+@app.route('/api/admin/models/activate', methods=['POST'])
+def activate_model():
+    """
+    Switch the served model without a restart
+    ---
+    requestBody:
+      required: true
+      content:
+        application/json:
+          schema:
+            type: object
+            required: [version]
+            properties:
+              version:
+                type: string
+                example: "20260101T000000Z"
+    responses:
+      200:
+        description: The new version is live; requests already running finish on the previous one
+      400:
+        description: Missing version
+      403:
+        description: Missing or wrong admin token, or AQI_ADMIN_TOKEN is not set
+      404:
+        description: Unknown version
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+    data = request.get_json(silent=True)
+    version = data.get('version') if isinstance(data, dict) else None
+    if not isinstance(version, str) or not version:
+        return jsonify({'error': 'version is required'}), 400
+    try:
+        previous = model_registry.activate(version)
+    except ModelNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    return jsonify({'active': model_registry.active.describe(), 'previous': previous.version})
+
+@app.route('/api/admin/models/candidate', methods=['GET', 'PUT', 'DELETE'])
+def model_candidate():
+    """
+    Manage shadow or canary traffic for a candidate model
+    ---
+    description: >
+      In shadow mode a fraction of predictions is also run on the candidate in the
+      background and only the live result is returned. In canary mode that fraction
+      is served by the candidate while the live model runs in the background.
+      Both modes record latency and output differences, returned by GET.
+    requestBody:
+      required: false
+      content:
+        application/json:
+          schema:
+            type: object
+            required: [version]
+            properties:
+              version:
+                type: string
+              mode:
+                type: string
+                enum: [shadow, canary]
+                default: shadow
+              fraction:
+                type: number
+                default: 0.1
+    responses:
+      200:
+        description: Candidate comparison statistics (null when no candidate is set)
+      400:
+        description: Invalid mode, fraction or version
+      403:
+        description: Missing or wrong admin token, or AQI_ADMIN_TOKEN is not set
+      404:
+        description: Unknown version
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+    if request.method == 'DELETE':
+        model_registry.clear_candidate()
+    elif request.method == 'PUT':
+        data = request.get_json(silent=True)
+        version = data.get('version') if isinstance(data, dict) else None
+        if not isinstance(version, str) or not version:
+            return jsonify({'error': 'version is required'}), 400
+        try:
+            fraction = float(data.get('fraction', 0.1))
+            model_registry.set_candidate(version, data.get('mode', 'shadow'), fraction)
+        except ModelNotFoundError as e:
+            return jsonify({'error': str(e)}), 404
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+    return jsonify({'candidate': model_registry.candidate_stats()})
+
 if __name__ == '__main__':
     app.run(debug=True)
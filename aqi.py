@@ -0,0 +1,87 @@
+from bisect import bisect_left
+from math import isfinite
+
+import numpy as np
+
+from schema import POLLUTANTS
+
+# Upper AQI bound of each category except Severe; a value belongs to the first
+# bucket whose edge it does not exceed, so 50 is Good and 50.5 Satisfactory
+BUCKET_EDGES = np.array([50.0, 100.0, 200.0, 300.0, 400.0])
+_EDGES = BUCKET_EDGES.tolist()
+
+CATEGORIES = ('Good', 'Satisfactory', 'Moderately Polluted', 'Poor', 'Very Poor', 'Severe')
+RESULTS = tuple(f'Air Quality Index is {category}' for category in CATEGORIES)
+CONCLUSIONS = (
+    'The Air Quality Index is excellent. It poses little or no risk to human health.',
+    'The Air Quality Index is satisfactory, but there may be a risk for sensitive individuals.',
+    'Moderate health risk for sensitive individuals.',
+    'Health warnings of emergency conditions.',
+    'Health alert: everyone may experience more serious health effects.',
+    'Health warnings of emergency conditions. The entire population is more likely to be affected.',
+)
+_RESULTS = np.array(RESULTS, dtype=object)
+_CONCLUSIONS = np.array(CONCLUSIONS, dtype=object)
+
+# CPCB breakpoints in city_day.csv units (ug/m3, CO in mg/m3). Each row maps the
+# concentration edges onto the AQI edges 0, 50, 100, 200, 300, 400, 500; above
+# the last edge the Severe slope is extended rather than capped.
+AQI_BREAKPOINTS = np.array([0.0, 50.0, 100.0, 200.0, 300.0, 400.0, 500.0])
+CONCENTRATION_BREAKPOINTS = {
+    'pm25': (0.0, 30.0, 60.0, 90.0, 120.0, 250.0, 380.0),
+    'pm10': (0.0, 50.0, 100.0, 250.0, 350.0, 430.0, 510.0),
+    'o3': (0.0, 50.0, 100.0, 168.0, 208.0, 748.0, 1000.0),
+    'no2': (0.0, 40.0, 80.0, 180.0, 280.0, 400.0, 520.0),
+    'co': (0.0, 1.0, 2.0, 10.0, 17.0, 34.0, 51.0),
+    'so2': (0.0, 40.0, 80.0, 380.0, 800.0, 1600.0, 2400.0),
+}
+
+
+def bucketize(values):
+    """Category codes (0 = Good ... 5 = Severe) for an array of AQI values.
+
+    Raises ValueError for NaN or infinite values, which have no category.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if not np.isfinite(values).all():
+        raise ValueError('AQI values must be finite')
+    return np.searchsorted(BUCKET_EDGES, values, side='left')
+
+
+def classify(values):
+    """Return ``(codes, results, conclusions)`` for an array of AQI values."""
+    codes = bucketize(values)
+    return codes, _RESULTS[codes], _CONCLUSIONS[codes]
+
+
+def determine_air_quality(value):
+    # Scalar form of classify(); bisect avoids numpy overhead for one value.
+    # NaN would fall through every comparison to Good, so reject it like bucketize
+    if not isfinite(value):
+        raise ValueError('AQI values must be finite')
+    code = bisect_left(_EDGES, value)
+    return RESULTS[code], CONCLUSIONS[code]
+
+
+def sub_index(pollutant, concentrations):
+    """Piecewise-linear CPCB sub-index of ``pollutant`` for an array of concentrations."""
+    edges = np.asarray(CONCENTRATION_BREAKPOINTS[pollutant])
+    c = np.asarray(concentrations, dtype=np.float64)
+    # Segment i spans edges[i]..edges[i + 1]; values past the end stay on the last segment
+    segment = np.clip(np.searchsorted(edges, c, side='left') - 1, 0, len(edges) - 2)
+    c_low, c_high = edges[segment], edges[segment + 1]
+    i_low, i_high = AQI_BREAKPOINTS[segment], AQI_BREAKPOINTS[segment + 1]
+    return i_low + (c - c_low) * (i_high - i_low) / (c_high - c_low)
+
+
+def compute_aqi(X, features=POLLUTANTS):
+    """Analytic AQI for an (n, len(features)) array: the largest sub-index per row.
+
+    NaN concentrations are ignored; a row with no values at all is NaN. Unlike
+    the official index this does not require a minimum number of pollutants.
+    """
+    X = np.asarray(X, dtype=np.float64).reshape(-1, len(features))
+    result = np.full(len(X), np.nan)
+    for column, pollutant in enumerate(features):
+        result = np.fmax(result, sub_index(pollutant, X[:, column]))
+    return result
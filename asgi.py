@@ -0,0 +1,232 @@
+"""ASGI entry point: OpenWeather lookups awaited on the event loop.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+    python asgi.py
+
+Every route is still served by the Flask app, so routes, templates, hooks
+and the Swagger spec are the ones ``app.py`` defines. For the city routes
+(``POST /predict_automatically`` and ``POST /api/predict/cities``) the
+upstream lookups are first awaited here, without holding a thread, and
+handed to the route through the WSGI environ. The route then only does
+the CPU-bound part: prediction and rendering. Flask runs on a bounded
+thread pool (AQI_ASGI_THREADS), so a burst of slow upstream calls queues
+as coroutines instead of exhausting worker threads. The WSGI bridge is the
+small one below (``build_environ`` and ``run_wsgi``), so this module only
+depends on the ASGI interface itself.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import app as app_module
+from app import app
+from upstream import AsyncUpstreamClient
+
+log = logging.getLogger(__name__)
+
+app.config['ASGI_THREADS'] = int(os.environ.get('AQI_ASGI_THREADS', 16))
+
+# Routes whose city names are read from the body and looked up before dispatch
+CITY_ROUTES = {('POST', '/predict_automatically'): 'form', ('POST', '/api/predict/cities'): 'json'}
+
+# Request bodies larger than this are spooled to a temporary file
+BODY_SPOOL_SIZE = 1024 * 1024
+
+
+def city_names(kind, body, content_type):
+    # The city names a request asks for, or None to leave parsing and
+    # validation (and their error responses) entirely to the Flask route
+    try:
+        if kind == 'form':
+            if not content_type.startswith('application/x-www-form-urlencoded'):
+                return None
+            names = parse_qs(body.decode('utf-8')).get('city_name', [])[:1]
+        else:
+            data = json.loads(body)
+            names = data.get('cities') if isinstance(data, dict) else None
+            if not isinstance(names, list) or len(names) > app.config['MAX_CITIES']:
+                return None
+    except (UnicodeDecodeError, ValueError):
+        return None
+    if not names or not all(isinstance(name, str) and name.strip() for name in names):
+        return None
+    return list(dict.fromkeys(names))
+
+
+def build_environ(scope, body):
+    """PEP 3333 environ for an ASGI HTTP ``scope`` and a file-like ``body``."""
+    script_name = scope.get('root_path', '').encode('utf8').decode('latin1')
+    path_info = scope['path'].encode('utf8').decode('latin1')
+    if path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': script_name,
+        'PATH_INFO': path_info,
+        'QUERY_STRING': scope.get('query_string', b'').decode('ascii'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1')
+        if name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        elif name == 'content-type':
+            key = 'CONTENT_TYPE'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin1')
+        environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+
+def run_wsgi(wsgi_application, environ, send):
+    # Runs on a worker thread; ``send`` blocks until the event loop has sent
+    # each message, so streamed bodies keep their backpressure
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        if exc_info is not None and response.get('started'):
+            raise exc_info[1].with_traceback(exc_info[2])
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(name.lower().encode('latin1'), value.encode('latin1'))
+                               for name, value in headers]
+
+    def start():
+        if not response.get('started'):
+            response['started'] = True
+            send({'type': 'http.response.start', 'status': response['status'],
+                  'headers': response['headers']})
+
+    result = wsgi_application(environ, start_response)
+    try:
+        for chunk in result:
+            if chunk:
+                start()
+                send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        start()
+        send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+        close = getattr(result, 'close', None)
+        if close is not None:
+            close()
+
+
+class AsyncCityLookups:
+    """ASGI application wrapping the Flask app with async upstream lookups."""
+
+    def __init__(self, wsgi_application, threads):
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='asgi-wsgi')
+        self.client = None
+        self._client_loop = None
+
+    def _client(self, weather):
+        # Shares the sync client's retry budget and circuit breaker; the
+        # connection pool belongs to the event loop it was created on
+        loop = asyncio.get_running_loop()
+        if self.client is None or self._client_loop is not loop:
+            upstream = weather.upstream
+            self._client_loop = loop
+            self.client = AsyncUpstreamClient(
+                pool_size=app.config['CITY_CONCURRENCY'] * 4,
+                connect_timeout=upstream.connect_timeout,
+                read_timeout=upstream.read_timeout,
+                retry=upstream.retry,
+                breaker=upstream.breaker,
+            )
+        return self.client
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+        body = await self._read_body(receive)
+        if body is None:
+            return
+        try:
+            environ = build_environ(scope, body)
+            kind = CITY_ROUTES.get((scope['method'], scope['path']))
+            if kind is not None:
+                prefetched = await self._prefetch(kind, body, environ.get('CONTENT_TYPE', ''))
+                if prefetched is not None:
+                    environ['aqi.city_components'] = prefetched
+            loop = asyncio.get_running_loop()
+
+            def send_sync(message):
+                asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+            await loop.run_in_executor(self.executor, run_wsgi, self.wsgi_application, environ, send_sync)
+        finally:
+            body.close()
+
+    @staticmethod
+    async def _read_body(receive):
+        # The whole request body, spooled to disk past BODY_SPOOL_SIZE, or
+        # None if the client disconnected first
+        body = tempfile.SpooledTemporaryFile(max_size=BODY_SPOOL_SIZE)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body'):
+                body.seek(0)
+                return body
+
+    async def _prefetch(self, kind, body, content_type):
+        # Components (or the OpenWeatherError) per city, or None to leave the
+        # lookups to the Flask route, e.g. after an unexpected failure here
+        names = city_names(kind, body.read(), content_type)
+        body.seek(0)
+        if kind == 'form' and names and app_module.fresh_reading(names[0]) is not None:
+            # Answered from the polled time series without an upstream call
+            return None
+        if names is None:
+            return None
+        weather = app_module.weather
+        try:
+            fetched = await weather.many_city_components_async(
+                names, self._client(weather), app.config['CITY_CONCURRENCY'])
+        except Exception:
+            log.exception('Async city lookups failed; falling back to the Flask route')
+            return None
+        return dict(zip(names, fetched))
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.client is not None:
+                    await self.client.aclose()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+application = AsyncCityLookups(app, app.config['ASGI_THREADS'])
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(application, host='127.0.0.1', port=int(os.environ.get('PORT', 5000)))
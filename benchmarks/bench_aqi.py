@@ -0,0 +1,81 @@
+"""Compare per-row and vectorized AQI bucketing, and check the model against CPCB sub-indices.
+
+    python -m benchmarks.bench_aqi --n 100000 --csv city_day.csv
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from aqi import bucketize, classify, compute_aqi
+
+
+def legacy_determine_air_quality(prediction):
+    # The if/elif chain as it shipped, gaps included
+    if prediction < 50:
+        return 'Air Quality Index is Good', 'The Air Quality Index is excellent. It poses little or no risk to human health.'
+    elif 51 <= prediction < 100:
+        return 'Air Quality Index is Satisfactory', 'The Air Quality Index is satisfactory, but there may be a risk for sensitive individuals.'
+    elif 101 <= prediction < 200:
+        return 'Air Quality Index is Moderately Polluted', 'Moderate health risk for sensitive individuals.'
+    elif 201 <= prediction < 300:
+        return 'Air Quality Index is Poor', 'Health warnings of emergency conditions.'
+    elif 301 <= prediction < 400:
+        return 'Air Quality Index is Very Poor', 'Health alert: everyone may experience more serious health effects.'
+    else:
+        return 'Air Quality Index is Severe', 'Health warnings of emergency conditions. The entire population is more likely to be affected.'
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def check_model(csv_path, model_path, rows):
+    import joblib
+    import pandas as pd
+
+    from train_model import CSV_FEATURES, TARGET
+
+    df = pd.read_csv(csv_path, usecols=CSV_FEATURES + [TARGET]).dropna()
+    df = df.sample(min(rows, len(df)), random_state=0)
+    X = df[CSV_FEATURES].to_numpy(dtype=np.float64)
+    analytic = compute_aqi(X)
+    predicted = joblib.load(model_path).predict(X)
+    actual = df[TARGET].to_numpy()
+    print(f'{len(X)} complete rows from {csv_path}')
+    for name, values in (('sub-index', analytic), ('model', predicted)):
+        mae = np.mean(np.abs(values - actual))
+        agree = np.mean(bucketize(values) == bucketize(actual))
+        print(f'{name + " vs dataset AQI":<28} MAE {mae:8.2f}   same category {agree:6.1%}')
+    agree = np.mean(bucketize(analytic) == bucketize(predicted))
+    print(f'{"model vs sub-index":<28} MAE {np.mean(np.abs(analytic - predicted)):8.2f}   same category {agree:6.1%}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n', type=int, default=100000)
+    parser.add_argument('--csv', default='city_day.csv')
+    parser.add_argument('--model', default='airquality.joblib')
+    parser.add_argument('--check-rows', type=int, default=5000)
+    args = parser.parse_args()
+
+    predictions = np.random.default_rng(0).uniform(0, 600, size=args.n)
+    values = predictions.tolist()
+    _, legacy = timed(lambda: [legacy_determine_air_quality(p) for p in values])
+    _, vectorized = timed(lambda: classify(predictions))
+    X = np.random.default_rng(1).uniform(0, 300, size=(args.n, 6))
+    _, sub_index = timed(lambda: compute_aqi(X))
+    print(f'{args.n} values')
+    print(f'{"bucketing: if/elif per row":<28} {args.n / legacy:>14,.0f} rows/s')
+    print(f'{"bucketing: searchsorted":<28} {args.n / vectorized:>14,.0f} rows/s')
+    print(f'{"CPCB sub-index AQI":<28} {args.n / sub_index:>14,.0f} rows/s')
+
+    if os.path.exists(args.csv) and os.path.exists(args.model):
+        check_model(args.csv, args.model, args.check_rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Compare city-route throughput of the sync WSGI servers and the ASGI mode.
+
+Every OpenWeather lookup goes to the fake server (caches off) with a fixed
+delay, so the city routes are dominated by upstream waiting, the case the
+ASGI mode is meant for. The pooled and uvicorn servers get the same number
+of worker threads.
+
+    python -m benchmarks.bench_asgi --concurrency 64 --latency-ms 200 --threads 8
+"""
+import argparse
+
+from benchmarks.load_test import SCENARIOS, SERVERS, free_port, run_scenario, start_server
+from benchmarks.report import write_report
+from fake_openweather import FakeOpenWeatherServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--server', nargs='+', choices=SERVERS, default=list(SERVERS))
+    parser.add_argument('--scenario', nargs='+', choices=['predict_form', 'predict_cities'],
+                        default=['predict_form', 'predict_cities'])
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--latency-ms', type=float, default=200.0)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    metrics = {}
+    print(f'{"server":<10} {"scenario":<16} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"errors":>7}')
+    with FakeOpenWeatherServer(latency=args.latency_ms / 1000.0) as fake:
+        env = {'OPENWEATHER_BASE_URL': fake.url, 'OPENWEATHER_API_KEY': 'bench',
+               'AQI_GEOCODE_TTL': '0', 'AQI_POLLUTION_TTL': '0'}
+        for kind in args.server:
+            port = free_port()
+            server = start_server(port, env, kind, args.threads)
+            try:
+                for name in args.scenario:
+                    r = run_scenario(f'http://127.0.0.1:{port}', SCENARIOS[name], args.concurrency,
+                                     args.duration, warmup=2)
+                    metrics.update({f'{kind}_{name}_{key}': value for key, value in r.items()})
+                    print(f'{kind:<10} {name:<16} {r["requests_per_s"]:>8.1f} {r["p50_ms"]:>8.1f} '
+                          f'{r["p95_ms"]:>8.1f} {r["p99_ms"]:>8.1f} {r["errors"]:>7}')
+            finally:
+                server.terminate()
+                server.wait()
+    if args.json:
+        write_report(args.json, 'asgi', metrics, vars(args))
+
+
+if __name__ == '__main__':
+    main()
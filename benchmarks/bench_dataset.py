@@ -0,0 +1,70 @@
+"""Time columnar dataset queries against a full pandas read_csv, at a chosen data scale.
+
+    python -m benchmarks.bench_dataset --scale 10
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from dataset import ColumnarDataset, ingest
+
+
+def scaled_csv(csv_path, scale, directory):
+    # Repeat the data under renamed cities so per-city sizes stay realistic
+    df = pd.read_csv(csv_path)
+    copies = [df.assign(City=df['City'] + (f' {k}' if k else '')) for k in range(scale)]
+    path = os.path.join(directory, 'city_day.csv')
+    pd.concat(copies).to_csv(path, index=False)
+    return path
+
+
+def timed_ms(fn, repeat=20):
+    fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--csv', default='city_day.csv')
+    parser.add_argument('--scale', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        csv_path = scaled_csv(args.csv, args.scale, tmpdir) if args.scale > 1 else args.csv
+        start = time.perf_counter()
+        meta = ingest(csv_path, os.path.join(tmpdir, 'columns'))
+        print(f"{meta['rows']} rows, {len(meta['cities'])} cities, ingest {time.perf_counter() - start:.2f} s")
+
+        start = time.perf_counter()
+        df = pd.read_csv(csv_path)
+        read_csv_ms = (time.perf_counter() - start) * 1000
+        print(f'{"pandas read_csv (baseline)":<36} {read_csv_ms:>10.2f} ms')
+        del df
+
+        start = time.perf_counter()
+        dataset = ColumnarDataset(os.path.join(tmpdir, 'columns'))
+        print(f'{"open columnar dataset":<36} {(time.perf_counter() - start) * 1000:>10.2f} ms')
+        queries = {
+            'Delhi, one quarter': lambda: dataset.city_range('Delhi', '2019-01-01', '2019-03-31'),
+            'Delhi, all rows': lambda: dataset.city_range('Delhi'),
+            'pm25 aggregate, all rows': lambda: dataset.aggregate('pm25'),
+            'pm25 aggregate, by city': lambda: dataset.aggregate('pm25', by_city=True),
+            'aqi aggregate, Delhi 2018': lambda: dataset.aggregate('aqi', 'Delhi', '2018-01-01', '2018-12-31'),
+            'worst 10 aqi days, all rows': lambda: dataset.worst('aqi', 10),
+            'worst 10 aqi days, 2019': lambda: dataset.worst('aqi', 10, start='2019-01-01', end='2019-12-31'),
+        }
+        for name, query in queries.items():
+            print(f'{name:<36} {timed_ms(query):>10.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
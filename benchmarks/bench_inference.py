@@ -0,0 +1,51 @@
+"""Compare sklearn RandomForest predict with the compiled forest engine.
+
+    python -m benchmarks.bench_inference --model airquality.joblib
+"""
+import argparse
+import time
+
+import joblib
+import numpy as np
+
+from forest_engine import CompiledForest
+
+
+def latency_ms(fn, X, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(X)
+        timings.append(time.perf_counter() - start)
+    return np.array(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default='airquality.joblib')
+    parser.add_argument('--repeats', type=int, default=50)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 10, 100, 1000, 10000])
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    start = time.perf_counter()
+    engine = CompiledForest.from_sklearn(model)
+    print(f'{engine.n_trees} trees, {len(engine.value):,} nodes, depth {engine.max_depth}, '
+          f'compiled in {(time.perf_counter() - start) * 1000:.1f} ms')
+
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 300, size=(max(args.batch_sizes), model.n_features_in_))
+    diff = np.abs(model.predict(X) - engine.predict(X)).max()
+    print(f'max |sklearn - compiled| over {len(X)} rows: {diff:.3e}')
+
+    print(f'{"rows":>7} {"sklearn p50 ms":>15} {"compiled p50 ms":>16} {"sklearn rows/s":>15} {"compiled rows/s":>16}')
+    for n in args.batch_sizes:
+        batch = X[:n]
+        repeats = max(3, args.repeats if n <= 100 else args.repeats // 10)
+        sk = np.median(latency_ms(model.predict, batch, repeats))
+        cf = np.median(latency_ms(engine.predict, batch, repeats))
+        print(f'{n:>7} {sk:>15.3f} {cf:>16.3f} {n / sk * 1000:>15,.0f} {n / cf * 1000:>16,.0f}')
+
+
+if __name__ == '__main__':
+    main()
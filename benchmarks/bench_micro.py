@@ -0,0 +1,79 @@
+"""Micro-benchmarks for request validation, AQI classification and model inference.
+
+    python -m benchmarks.bench_micro --json micro.json
+"""
+import argparse
+import time
+
+import joblib
+import numpy as np
+
+from aqi import classify, determine_air_quality
+from benchmarks.report import rss_mb, write_report
+from schema import validate_record
+
+PAYLOAD = {"pm25": 20.5, "pm10": 30.1, "o3": 15.2, "no2": 10.3, "co": 0.4, "so2": 5.0}
+
+
+def ops_per_s(fn, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return n / (time.perf_counter() - start)
+
+
+def predict_latency_us(predict, X, repeats):
+    predict(X)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict(X)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n', type=int, default=200000, help='Iterations for the pure-Python benchmarks')
+    parser.add_argument('--model', default='airquality.joblib')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--repeats', type=int, default=30)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    # validate_aqi_data in app.py is a thin wrapper over validate_record; timing
+    # it here avoids importing the whole app
+    metrics = {
+        'validate_aqi_data_ops': ops_per_s(lambda: validate_record(PAYLOAD), args.n),
+        'validate_aqi_data_invalid_ops': ops_per_s(lambda: validate_record({'pm25': 'x'}), args.n),
+    }
+    values = np.random.default_rng(0).uniform(0, 500, size=args.batch_size)
+    scalars = values.tolist()
+    metrics['determine_air_quality_ops'] = ops_per_s(
+        lambda: determine_air_quality(scalars[0]), args.n)
+    start = time.perf_counter()
+    for _ in range(args.repeats):
+        classify(values)
+    metrics['classify_batch_rows_per_s'] = args.batch_size * args.repeats / (time.perf_counter() - start)
+
+    model = joblib.load(args.model)
+    X = np.random.default_rng(1).uniform(0, 300, size=(args.batch_size, model.n_features_in_))
+    single_us = predict_latency_us(model.predict, X[:1], args.repeats)
+    batch_us = predict_latency_us(model.predict, X, max(3, args.repeats // 5))
+    metrics.update({
+        'predict_single_us': single_us,
+        'predict_single_rows_per_s': 1e6 / single_us,
+        f'predict_batch_{args.batch_size}_us': batch_us,
+        'predict_batch_rows_per_s': args.batch_size * 1e6 / batch_us,
+        'process_rss_mb': rss_mb(),
+    })
+    metrics = {name: round(value, 3) if value is not None else None for name, value in metrics.items()}
+
+    for name, value in metrics.items():
+        print(f'{name:<36} {value:>16,.3f}' if value is not None else f'{name:<36} {"n/a":>16}')
+    if args.json:
+        write_report(args.json, 'micro', metrics, vars(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Compare ops/sec of the dict and SQLite record stores at several sizes.
+
+    python -m benchmarks.bench_record_store --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from record_store import DictRecordStore, SQLiteRecordStore
+
+
+def sample(rng):
+    # Validated values as the stores take them: floats in POLLUTANTS order
+    return (rng.uniform(0, 300), rng.uniform(0, 500), rng.uniform(0, 200),
+            rng.uniform(0, 200), rng.uniform(0, 10), rng.uniform(0, 100))
+
+
+def timed(n, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    return n / elapsed if elapsed > 0 else float('inf')
+
+
+def bench_store(store, size, ops, rng):
+    results = {}
+    rows = [sample(rng) for _ in range(size)]
+    chunk = 10000
+    results['bulk_insert'] = timed(size, lambda: [store.bulk_create(rows[i:i + chunk])
+                                                  for i in range(0, size, chunk)])
+    ids = [r['id'] for r in store.all()]
+    probe = [rng.choice(ids) for _ in range(ops)]
+    results['create'] = timed(ops, lambda: [store.create(sample(rng)) for _ in range(ops)])
+    results['get'] = timed(ops, lambda: [store.get(record_id) for record_id in probe])
+    results['update'] = timed(ops, lambda: [store.update(record_id, sample(rng)) for record_id in probe])
+    results['delete'] = timed(ops, lambda: [store.delete(record_id) for record_id in set(probe)])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--ops', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f'{"backend":<8} {"records":>9} ' + ' '.join(f'{op:>12}' for op in
+                                                    ('bulk_insert', 'create', 'get', 'update', 'delete')))
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for name, store in [('dict', DictRecordStore()),
+                                ('sqlite', SQLiteRecordStore(os.path.join(tmpdir, 'bench.db')))]:
+                results = bench_store(store, size, args.ops, random.Random(args.seed))
+                print(f'{name:<8} {size:>9} ' + ' '.join(f'{v:>12,.0f}' for v in results.values()))
+                if hasattr(store, 'close'):
+                    store.close()
+    print('(values are operations per second)')
+
+
+if __name__ == '__main__':
+    main()
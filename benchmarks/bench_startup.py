@@ -0,0 +1,83 @@
+"""Measure worker cold start and per-worker memory for each model loading mode.
+
+Starts N worker processes per mode that import the app and make one
+prediction, keeps them alive together and reads RSS/PSS from /proc, so
+pages shared through the memory-mapped model show up in the PSS column.
+
+    python -m benchmarks.bench_startup --workers 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+WORKER = '''
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.predict_batch([[20.5, 30.1, 15.2, 10.3, 0.4, 5.0]])
+predicted = time.perf_counter()
+print(json.dumps({'import_s': imported - start, 'first_predict_s': predicted - imported}), flush=True)
+sys.stdin.readline()
+'''
+
+MODES = {
+    'sklearn eager': {'AQI_PRELOAD_MODEL': '1'},
+    'sklearn lazy': {},
+    'compiled mmap': {'AQI_INFERENCE_ENGINE': 'compiled'},
+    'compiled mmap, no swagger': {'AQI_INFERENCE_ENGINE': 'compiled', 'AQI_ENABLE_SWAGGER': '0'},
+}
+
+
+def memory_kb(pid):
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:'):
+                values[parts[0][:-1].lower()] = int(parts[1])
+    return values
+
+
+def run_mode(env_overrides, workers):
+    env = {**os.environ, **env_overrides}
+    procs = [subprocess.Popen([sys.executable, '-c', WORKER], env=env, text=True,
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+             for _ in range(workers)]
+    timings = [json.loads(p.stdout.readline()) for p in procs]
+    memory = [memory_kb(p.pid) for p in procs]
+    for p in procs:
+        p.stdin.write('\n')
+        p.stdin.flush()
+        p.wait()
+    mean = lambda key, rows: sum(r[key] for r in rows) / len(rows)
+    return {
+        'import_s': mean('import_s', timings),
+        'first_predict_s': mean('first_predict_s', timings),
+        'rss_mb': mean('rss', memory) / 1024,
+        'pss_mb': mean('pss', memory) / 1024,
+        'total_pss_mb': sum(m['pss'] for m in memory) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    results = {}
+    print(f'{"mode":<27} {"import s":>9} {"1st pred s":>11} {"RSS MB":>8} {"PSS MB":>8} {"total PSS":>10}')
+    for name, overrides in MODES.items():
+        r = results[name] = run_mode(overrides, args.workers)
+        print(f'{name:<27} {r["import_s"]:>9.3f} {r["first_predict_s"]:>11.3f} {r["rss_mb"]:>8.1f} '
+              f'{r["pss_mb"]:>8.1f} {r["total_pss_mb"]:>10.1f}')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'workers': args.workers, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Compare upstream call strategies against a local fake OpenWeather server.
+
+    python -m benchmarks.bench_upstream --cities 50 --latency-ms 20
+"""
+import argparse
+import asyncio
+import time
+
+import requests
+
+from fake_openweather import FakeOpenWeatherServer
+from openweather import OpenWeatherClient
+from upstream import AsyncUpstreamClient, UpstreamClient
+
+
+def bench_unpooled(base_url, cities):
+    # Original behaviour: module-level requests.get, new connection per call
+    for city in cities:
+        geo = requests.get(f'{base_url}/geo/1.0/direct', params={'q': city, 'limit': 1}).json()[0]
+        requests.get(f'{base_url}/data/2.5/air_pollution', params={'lat': geo['lat'], 'lon': geo['lon']})
+
+
+def bench_pooled(base_url, cities):
+    client = UpstreamClient()
+    weather = OpenWeatherClient('bench', base_url=base_url, geocode_ttl=0, pollution_ttl=0, upstream=client)
+    for city in cities:
+        weather.city_components(city)
+    client.close()
+
+
+def bench_async(base_url, cities, concurrency):
+    weather = OpenWeatherClient('bench', base_url=base_url, geocode_ttl=0, pollution_ttl=0)
+
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+        async with AsyncUpstreamClient(pool_size=concurrency) as client:
+            async def one(city):
+                async with semaphore:
+                    return await weather.city_components_async(city, client)
+            await asyncio.gather(*(one(city) for city in cities))
+
+    asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cities', type=int, default=50)
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    parser.add_argument('--concurrency', type=int, default=20)
+    args = parser.parse_args()
+
+    cities = [f'City{i}' for i in range(args.cities)]
+    with FakeOpenWeatherServer(latency=args.latency_ms / 1000.0) as server:
+        for name, fn in [
+            ('unpooled requests.get', lambda: bench_unpooled(server.url, cities)),
+            ('pooled UpstreamClient', lambda: bench_pooled(server.url, cities)),
+            (f'async x{args.concurrency}', lambda: bench_async(server.url, cities, args.concurrency)),
+        ]:
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+            print(f'{name:<24} {elapsed * 1000:9.1f} ms  {len(cities) / elapsed:8.1f} cities/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Compare the compiled record validator with the original validate_aqi_data.
+
+    python -m benchmarks.bench_validation --n 200000
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from uuid import uuid4
+
+from schema import AQIRecord, validate_record
+
+PAYLOAD = {"pm25": 20.5, "pm10": 30.1, "o3": 15.2, "no2": 10.3, "co": 0.4, "so2": 5.0}
+
+
+def legacy_validate_aqi_data(data):
+    # The validator as it shipped before the compiled schema
+    required_fields = ['pm25', 'pm10', 'o3', 'no2', 'co', 'so2']
+    for field in required_fields:
+        if field not in data:
+            return False
+        try:
+            float(data[field])
+        except (ValueError, TypeError):
+            return False
+    return True
+
+
+def legacy_create(data):
+    if not data or not legacy_validate_aqi_data(data):
+        return None
+    record_id = str(uuid4())
+    return {"id": record_id, **data}
+
+
+def compiled_create(data):
+    values, _ = validate_record(data)
+    if values is None:
+        return None
+    return AQIRecord(str(uuid4()), values)
+
+
+def rate(n, fn):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn(PAYLOAD)
+    return n / (time.perf_counter() - start)
+
+
+def bytes_per_record(factory, n=20000):
+    tracemalloc.start()
+    records = [factory(dict(PAYLOAD)) for _ in range(n)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del records
+    return size / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n', type=int, default=200000)
+    args = parser.parse_args()
+
+    print(f'python {sys.version.split()[0]}, {args.n} iterations')
+    print(f'{"validate: legacy":<28} {rate(args.n, legacy_validate_aqi_data):>12,.0f} ops/s')
+    print(f'{"validate: compiled":<28} {rate(args.n, validate_record):>12,.0f} ops/s')
+    print(f'{"create path: legacy dict":<28} {rate(args.n, legacy_create):>12,.0f} ops/s')
+    print(f'{"create path: AQIRecord":<28} {rate(args.n, compiled_create):>12,.0f} ops/s')
+    print(f'{"stored bytes: legacy dict":<28} {bytes_per_record(legacy_create):>12,.0f} B/record')
+    print(f'{"stored bytes: AQIRecord":<28} {bytes_per_record(compiled_create):>12,.0f} B/record')
+
+
+if __name__ == '__main__':
+    main()
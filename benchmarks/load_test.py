@@ -0,0 +1,241 @@
+"""Drive the API at a target concurrency against a local WSGI server.
+
+The app runs in a child process, with OpenWeather answered by the local
+fake server, so no API key or network is needed and the reported RSS
+belongs to the server alone. ``--server`` picks werkzeug's thread-per-request
+server (what ``app.run`` uses), the same server on a fixed pool of
+``--threads`` threads (like a threaded gunicorn worker), or uvicorn serving
+``asgi.py``. Each scenario runs for ``--duration`` seconds with
+``--concurrency`` client threads, each on its own keep-alive session.
+
+    python -m benchmarks.load_test --concurrency 16 --duration 10 --json load.json
+    python -m benchmarks.load_test --scenario records predict_batch
+    python -m benchmarks.load_test --server uvicorn --scenario predict_form
+
+The client threads share one interpreter, so at high concurrency the
+generator itself can become the bottleneck; compare reports taken with the
+same settings on the same machine.
+"""
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+from benchmarks.report import percentiles_ms, rss_mb, write_report
+from fake_openweather import FakeOpenWeatherServer
+
+CITIES = ['Delhi', 'Mumbai', 'Chennai', 'Kolkata', 'Bengaluru', 'Hyderabad', 'Lucknow', 'Patna']
+
+
+def sample(rng):
+    return {'pm25': round(rng.uniform(0, 300), 1), 'pm10': round(rng.uniform(0, 400), 1),
+            'o3': round(rng.uniform(0, 150), 1), 'no2': round(rng.uniform(0, 120), 1),
+            'co': round(rng.uniform(0, 5), 2), 'so2': round(rng.uniform(0, 80), 1)}
+
+
+class RecordsWorkload:
+    # CRUD mix: 40% create, 30% get, 15% list page, 15% update
+    def __init__(self):
+        self.ids = []
+
+    def __call__(self, session, base_url, rng):
+        roll = rng.random()
+        if roll < 0.4 or not self.ids:
+            response = session.post(f'{base_url}/api/records', json=sample(rng))
+            if response.status_code == 201:
+                self.ids.append(response.json()['id'])
+            return response
+        if roll < 0.7:
+            return session.get(f'{base_url}/api/records/{rng.choice(self.ids)}')
+        if roll < 0.85:
+            return session.get(f'{base_url}/api/records', params={'limit': 50})
+        return session.put(f'{base_url}/api/records/{rng.choice(self.ids)}', json=sample(rng))
+
+
+def predict_batch(session, base_url, rng):
+    return session.post(f'{base_url}/api/predict/batch', json=[sample(rng) for _ in range(10)])
+
+
+def predict_single(session, base_url, rng):
+    return session.post(f'{base_url}/api/predict/batch', json=[sample(rng)])
+
+
+def predict_cities(session, base_url, rng):
+    return session.post(f'{base_url}/api/predict/cities', json={'cities': rng.sample(CITIES, 4)})
+
+
+def predict_form(session, base_url, rng):
+    return session.post(f'{base_url}/predict_automatically', data={'city_name': rng.choice(CITIES)})
+
+
+SCENARIOS = {
+    'records': RecordsWorkload,
+    'predict_single': lambda: predict_single,
+    'predict_batch': lambda: predict_batch,
+    'predict_cities': lambda: predict_cities,
+    'predict_form': lambda: predict_form,
+}
+
+
+SERVERS = ('werkzeug', 'pooled', 'uvicorn')
+
+
+def serve(port, kind, threads):
+    # Child process entry point
+    if kind == 'uvicorn':
+        import uvicorn
+
+        return uvicorn.run('asgi:application', host='127.0.0.1', port=port, log_level='warning',
+                           access_log=False)
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler, make_server
+
+    from app import app
+
+    class QuietHandler(WSGIRequestHandler):
+        # Per-request access logging would dominate the timings
+        def log_request(self, *args, **kwargs):
+            pass
+
+    class PooledServer(BaseWSGIServer):
+        # Connections are handled by a fixed pool; extra ones wait in line
+        pool = ThreadPoolExecutor(max_workers=threads)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    if kind == 'pooled':
+        server = PooledServer('127.0.0.1', port, app, handler=QuietHandler)
+    else:
+        server = make_server('127.0.0.1', port, app, threaded=True, request_handler=QuietHandler)
+    server.serve_forever()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, env_overrides, kind='werkzeug', threads=8, timeout=60.0):
+    env = {**os.environ, 'AQI_ENABLE_SWAGGER': '0', 'AQI_ASGI_THREADS': str(threads), **env_overrides}
+    proc = subprocess.Popen([sys.executable, '-m', 'benchmarks.load_test', '--serve', str(port),
+                             '--server', kind, '--threads', str(threads)], env=env)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            break
+        try:
+            requests.get(f'http://127.0.0.1:{port}/api/predict/cache/stats', timeout=1)
+            return proc
+        except requests.RequestException:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError('App server failed to start')
+
+
+def run_scenario(base_url, make_workload, concurrency, duration, warmup):
+    latencies, statuses = [], []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(concurrency + 1)
+
+    def worker(seed):
+        rng = random.Random(seed)
+        workload = make_workload()
+        local_latencies, local_statuses = [], []
+        with requests.Session() as session:
+            for _ in range(warmup):
+                workload(session, base_url, rng)
+            start_barrier.wait()
+            deadline = time.perf_counter() + duration
+            while True:
+                start = time.perf_counter()
+                if start >= deadline:
+                    break
+                try:
+                    status = workload(session, base_url, rng).status_code
+                except requests.RequestException:
+                    status = 0
+                local_latencies.append(time.perf_counter() - start)
+                local_statuses.append(status)
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.extend(local_statuses)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': len(latencies),
+        'requests_per_s': round(len(latencies) / elapsed, 1),
+        **percentiles_ms(latencies),
+        'errors': sum(1 for status in statuses if status == 0 or status >= 500),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenario', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--server', choices=SERVERS, default='werkzeug')
+    parser.add_argument('--threads', type=int, default=8,
+                        help='Worker threads for --server pooled and uvicorn (AQI_ASGI_THREADS)')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per scenario')
+    parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per client thread')
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='Fake OpenWeather response delay')
+    parser.add_argument('--env', nargs='*', default=[], metavar='NAME=VALUE',
+                        help='Extra app settings, e.g. AQI_MICROBATCH=1')
+    parser.add_argument('--json', help='Also write the results to this file')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args.serve, args.server, args.threads)
+
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    with FakeOpenWeatherServer(latency=args.latency_ms / 1000.0) as fake:
+        overrides = dict(item.split('=', 1) for item in args.env)
+        server = start_server(port, {'OPENWEATHER_BASE_URL': fake.url, 'OPENWEATHER_API_KEY': 'bench',
+                                     **overrides}, args.server, args.threads)
+        try:
+            requests.post(f'{base_url}/api/records/reset')
+            metrics = {'server_rss_start_mb': rss_mb(server.pid)}
+            print(f'{"scenario":<16} {"req/s":>9} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} '
+                  f'{"errors":>7} {"RSS MB":>7}')
+            for name in args.scenario:
+                r = run_scenario(base_url, SCENARIOS[name], args.concurrency, args.duration, args.warmup)
+                r['server_rss_mb'] = rss_mb(server.pid)
+                metrics.update({f'{name}_{key}': value for key, value in r.items()})
+                print(f'{name:<16} {r["requests_per_s"]:>9.1f} {r["p50_ms"]:>8.2f} {r["p95_ms"]:>8.2f} '
+                      f'{r["p99_ms"]:>8.2f} {r["errors"]:>7} {r["server_rss_mb"] or 0:>7.1f}')
+            metrics['server_rss_end_mb'] = rss_mb(server.pid)
+        finally:
+            server.terminate()
+            server.wait()
+    if args.json:
+        write_report(args.json, 'load', metrics, {k: v for k, v in vars(args).items() if k != 'serve'})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Compare two benchmark JSON reports and flag regressions.
+
+    python -m benchmarks.bench_micro --json base.json
+    python -m benchmarks.load_test --json base-load.json
+    ... check out another commit, rerun with head.json ...
+    python -m benchmarks.report base.json head.json --threshold 0.10
+
+Reports written with ``write_report`` carry the commit and Python version
+they were measured on and a flat ``metrics`` mapping of name to number.
+Name suffixes say which direction is better: ``_per_s`` and ``_ops`` are
+higher-is-better, ``_ms``, ``_us``, ``_mb`` and ``errors`` lower-is-better;
+other metrics (e.g. raw request counts) are shown but never flagged.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+HIGHER_IS_BETTER = ('_per_s', '_ops')
+LOWER_IS_BETTER = ('_ms', '_us', '_mb', 'errors')
+
+
+def percentiles_ms(latencies):
+    # p50/p95/p99 and max of latencies given in seconds
+    if not len(latencies):
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'max_ms': None}
+    values = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50_ms': round(float(p50), 3), 'p95_ms': round(float(p95), 3),
+            'p99_ms': round(float(p99), 3), 'max_ms': round(float(values.max()), 3)}
+
+
+def rss_mb(pid='self'):
+    # Resident set size from /proc; None where /proc is not available
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_report(path, benchmark, metrics, settings=None):
+    report = {
+        'benchmark': benchmark,
+        'commit': git_commit(),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'settings': settings or {},
+        'metrics': metrics,
+    }
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def compare(base, head, threshold=0.10):
+    """Rows of (name, base, head, relative change, regressed) for shared metrics."""
+    rows = []
+    for name, before in base['metrics'].items():
+        after = head['metrics'].get(name)
+        if not isinstance(before, (int, float)) or not isinstance(after, (int, float)):
+            continue
+        if before:
+            change = (after - before) / before
+        else:
+            change = float('inf') if after > 0 else 0.0
+        if name.endswith(HIGHER_IS_BETTER):
+            regressed = -change > threshold
+        else:
+            regressed = name.endswith(LOWER_IS_BETTER) and change > threshold
+        rows.append((name, before, after, change, regressed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative change counted as a regression (default 0.10)')
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    print(f"{base['benchmark']}: {base.get('commit')} -> {head.get('commit')}")
+    rows = compare(base, head, args.threshold)
+    for name, before, after, change, regressed in rows:
+        print(f'{name:<40} {before:>12.3f} {after:>12.3f} {change:>+8.1%}{"  REGRESSION" if regressed else ""}')
+    regressions = sum(1 for row in rows if row[-1])
+    print(f'{regressions} regression(s) over {args.threshold:.0%}')
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Hammer a record store from many threads and check it stays consistent.
+
+Each thread mixes creates, deletes, reads and If-Match updates of a shared
+set of hot records; readers check that no record is ever seen half-written
+or at an older version than before. A final phase clears a large store
+while readers keep reading and reports the worst read stall next to the
+same window without a reset.
+
+    python -m benchmarks.stress_record_store --threads 16 --ops 20000
+    python -m benchmarks.stress_record_store --backend sqlite
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from benchmarks.report import write_report
+from record_store import DictRecordStore, SQLiteRecordStore, VersionConflictError
+from schema import POLLUTANTS
+
+
+def hammer(store, hot_ids, ops, seed, totals, lock):
+    rng = random.Random(seed)
+    own, seen = [], {}
+    counts = {'created': 0, 'deleted': 0, 'updated': 0, 'conflicts': 0, 'reads': 0, 'violations': 0}
+    for _ in range(ops):
+        roll = rng.random()
+        if roll < 0.2:
+            own.append(store.create((float(seed),) * len(POLLUTANTS))['id'])
+            counts['created'] += 1
+        elif roll < 0.3 and own:
+            counts['deleted'] += store.delete(own.pop(rng.randrange(len(own))))
+        elif roll < 0.5:
+            record_id = rng.choice(hot_ids)
+            version = store.get(record_id)['version']
+            value = float(rng.randrange(1000))
+            try:
+                store.update(record_id, (value,) * len(POLLUTANTS), if_match={version})
+                counts['updated'] += 1
+            except VersionConflictError:
+                counts['conflicts'] += 1
+        else:
+            record_id = rng.choice(hot_ids)
+            record = store.get(record_id)
+            counts['reads'] += 1
+            if len({record[p] for p in POLLUTANTS}) != 1 or record['version'] < seen.get(record_id, 0):
+                counts['violations'] += 1
+            seen[record_id] = record['version']
+    with lock:
+        for key, value in counts.items():
+            totals[key] = totals.get(key, 0) + value
+
+
+def stress(store, threads, ops, hot):
+    hot_ids = [store.create((0.0,) * len(POLLUTANTS))['id'] for _ in range(hot)]
+    totals, lock = {}, threading.Lock()
+    workers = [threading.Thread(target=hammer, args=(store, hot_ids, ops // threads, seed, totals, lock))
+               for seed in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    expected = hot + totals['created'] - totals['deleted']
+    version_sum = sum(store.get(record_id)['version'] - 1 for record_id in hot_ids)
+    totals['size_mismatch'] = abs(len(store) - expected)
+    totals['lost_updates'] = abs(version_sum - totals['updated'])
+    totals['ops_per_s'] = (ops // threads) * threads / elapsed
+    return totals
+
+
+def reset_stall_ms(store, size, readers, clear=True):
+    # Worst single get() latency seen by readers while clear() runs; with
+    # clear=False the same window without a reset, as the scheduling baseline
+    ids = [r['id'] for r in store.bulk_create([(1.0,) * len(POLLUTANTS)] * size)]
+    stop = threading.Event()
+    worst = [0.0] * readers
+
+    def read(slot):
+        rng = random.Random(slot)
+        while not stop.is_set():
+            start = time.perf_counter()
+            store.get(rng.choice(ids))
+            worst[slot] = max(worst[slot], time.perf_counter() - start)
+
+    workers = [threading.Thread(target=read, args=(slot,)) for slot in range(readers)]
+    for worker in workers:
+        worker.start()
+    time.sleep(0.05)
+    start = time.perf_counter()
+    if clear:
+        store.clear()
+    clear_ms = (time.perf_counter() - start) * 1000
+    time.sleep(0.05)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    return clear_ms, max(worst) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=['dict', 'sqlite'], default='dict')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--ops', type=int, default=20000, help='Total operations across all threads')
+    parser.add_argument('--hot', type=int, default=20, help='Shared records all threads update')
+    parser.add_argument('--reset-size', type=int, default=200000)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        def make(name):
+            if args.backend == 'dict':
+                return DictRecordStore()
+            return SQLiteRecordStore(os.path.join(tmpdir, f'{name}.db'))
+
+        results = stress(make('stress'), args.threads, args.ops, args.hot)
+        _, results['read_stall_baseline_ms'] = reset_stall_ms(make('baseline'), args.reset_size, 4, clear=False)
+        results['clear_ms'], results['read_stall_during_clear_ms'] = reset_stall_ms(
+            make('reset'), args.reset_size, 4)
+    for name, value in results.items():
+        print(f'{name:<28} {value:>14,.2f}' if isinstance(value, float) else f'{name:<28} {value:>14,}')
+    if args.json:
+        write_report(args.json, f'stress_record_store_{args.backend}', results, vars(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+import hashlib
+import io
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from cache import TTLCache
+
+log = logging.getLogger(__name__)
+
+# Columns shown in the correlation heatmap: the model features plus AQI
+CHART_COLUMNS = ('pm25', 'pm10', 'o3', 'no2', 'co', 'so2', 'aqi')
+LABELS = {'pm25': 'PM2.5', 'pm10': 'PM10', 'o3': 'O3', 'no2': 'NO2', 'co': 'CO', 'so2': 'SO2', 'aqi': 'AQI'}
+
+
+class IncrementalCorrelation:
+    """Pairwise-complete Pearson correlation maintained from running sums.
+
+    ``add`` and ``remove`` fold rows in or out (NaN marks a missing value and
+    only drops that row from the pairs involving it), and ``merge`` combines
+    accumulators, so a matrix never needs the underlying rows again. For each
+    pair (i, j) it keeps the count of rows where both are present and the sums
+    of x_i, x_i^2 and x_i * x_j over those rows.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.n = np.zeros((k, k))
+        self.s = np.zeros((k, k))
+        self.ss = np.zeros((k, k))
+        self.sxy = np.zeros((k, k))
+
+    def _sums(self, X):
+        X = np.asarray(X, dtype=np.float64).reshape(-1, self.k)
+        present = (~np.isnan(X)).astype(np.float64)
+        Z = np.where(present > 0, X, 0.0)
+        return present.T @ present, Z.T @ present, (Z * Z).T @ present, Z.T @ Z
+
+    def add(self, X):
+        n, s, ss, sxy = self._sums(X)
+        self.n += n
+        self.s += s
+        self.ss += ss
+        self.sxy += sxy
+        return self
+
+    def remove(self, X):
+        n, s, ss, sxy = self._sums(X)
+        self.n -= n
+        self.s -= s
+        self.ss -= ss
+        self.sxy -= sxy
+        return self
+
+    def merge(self, other):
+        merged = IncrementalCorrelation(self.k)
+        for name in ('n', 's', 'ss', 'sxy'):
+            setattr(merged, name, getattr(self, name) + getattr(other, name))
+        return merged
+
+    def matrix(self):
+        # s[i, j] is the sum of x_i over rows where x_j is present, so s.T
+        # holds the matching sums of x_j
+        n, s, ss = self.n, self.s, self.ss
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = n * self.sxy - s * s.T
+            var = (n * ss - s * s) * (n * ss.T - s.T * s.T)
+            r = cov / np.sqrt(var)
+        r[n < 2] = np.nan
+        return np.clip(r, -1.0, 1.0)
+
+
+class ChartData:
+    """Correlation accumulators over the ingested dataset and the stored records.
+
+    Dataset accumulators are built once per city and merged on demand; a
+    date-filtered request is computed from just that slice. Records carry no
+    AQI, city or date, so they only contribute pollutant pairs and only to
+    unfiltered charts. New records are folded in from the store's sequence
+    cursor; the record accumulator is rebuilt from scratch after
+    ``records_refresh`` seconds or when records were deleted, which is when
+    in-place updates become visible.
+    """
+
+    def __init__(self, get_dataset, get_record_store, records_refresh=60.0, clock=time.monotonic):
+        self._get_dataset = get_dataset
+        self._get_record_store = get_record_store
+        self._records_refresh = records_refresh
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._dataset = None
+        self._cities = {}
+        self._reset_records()
+
+    def _reset_records(self):
+        self._records = IncrementalCorrelation(len(CHART_COLUMNS))
+        self._records_seq = None
+        self._records_count = 0
+        self._records_built = self._clock()
+
+    def dataset_correlation(self, city=None, start=None, end=None):
+        dataset = self._get_dataset()
+        if start is not None or end is not None:
+            return IncrementalCorrelation(len(CHART_COLUMNS)).add(dataset.matrix(CHART_COLUMNS, city, start, end))
+        with self._lock:
+            if dataset is not self._dataset:
+                self._dataset, self._cities = dataset, {}
+            total = IncrementalCorrelation(len(CHART_COLUMNS))
+            for name in ([dataset.cities[dataset.city_code(city)]] if city else dataset.cities):
+                accumulator = self._cities.get(name)
+                if accumulator is None:
+                    accumulator = IncrementalCorrelation(len(CHART_COLUMNS)).add(dataset.matrix(CHART_COLUMNS, name))
+                    self._cities[name] = accumulator
+                total = total.merge(accumulator)
+            return total
+
+    def records_correlation(self):
+        store = self._get_record_store()
+        with self._lock:
+            if (self._clock() - self._records_built >= self._records_refresh
+                    or len(store) < self._records_count):
+                self._reset_records()
+            rows = []
+            for seq, record in store.scan(after=self._records_seq):
+                rows.append([record[name] for name in CHART_COLUMNS[:-1]] + [np.nan])
+                self._records_seq = seq
+            if rows:
+                self._records.add(rows)
+                self._records_count += len(rows)
+            return self._records, self._records_count
+
+    def scatter(self, measure, city=None, start=None, end=None):
+        X = self._get_dataset().matrix((measure, 'aqi'), city, start, end)
+        X = X[~np.isnan(X).any(axis=1)]
+        return X[:, 0], X[:, 1]
+
+
+def _figure():
+    # Object-oriented matplotlib with the Agg canvas: no pyplot global state,
+    # so figures can be drawn from worker threads
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(8, 6), dpi=100)
+    FigureCanvasAgg(figure)
+    return figure
+
+
+def _png(figure):
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png', bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def render_heatmap(matrix, labels, title):
+    figure = _figure()
+    ax = figure.add_subplot()
+    image = ax.imshow(matrix, cmap='coolwarm', vmin=-1, vmax=1)
+    ax.set_xticks(range(len(labels)), labels)
+    ax.set_yticks(range(len(labels)), labels)
+    for i in range(len(labels)):
+        for j in range(len(labels)):
+            if not np.isnan(matrix[i, j]):
+                ax.text(j, i, f'{matrix[i, j]:.2f}', ha='center', va='center', fontsize=9)
+    ax.set_title(title)
+    figure.colorbar(image, ax=ax)
+    return _png(figure)
+
+
+def render_scatter(x, y, xlabel, ylabel, title):
+    figure = _figure()
+    ax = figure.add_subplot()
+    ax.set_facecolor('#eaeaf2')
+    ax.grid(color='white')
+    ax.set_axisbelow(True)
+    ax.scatter(x, y, s=12, alpha=0.6, edgecolors='white', linewidths=0.3)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.set_title(title)
+    return _png(figure)
+
+
+def content_hash(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.tobytes() if isinstance(part, np.ndarray) else repr(part).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()[:32]
+
+
+class ChartRenderError(Exception):
+    pass
+
+
+class ChartRenderer:
+    """Renders charts on a background executor and caches the PNG bytes.
+
+    Charts are keyed by a hash of exactly the data they plot, which doubles
+    as the ETag. ``get`` returns ``(png, etag)`` once a chart is rendered, or
+    ``(None, etag)`` while it is still rendering after ``wait`` seconds;
+    concurrent requests for the same cold chart share one render. A render
+    that raises is logged and remembered for ``error_ttl`` seconds, during
+    which ``get`` raises ``ChartRenderError`` instead of rendering again.
+    """
+
+    def __init__(self, maxsize=64, workers=1, error_ttl=30.0):
+        self._cache = TTLCache(maxsize=maxsize)
+        self._errors = TTLCache(maxsize=maxsize, ttl=error_ttl)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='chart-render')
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.renders = 0
+        self.render_errors = 0
+
+    def get(self, key, render, wait=0.0):
+        png = self._cache.get(key)
+        if png is not None:
+            return png, key
+        error = self._errors.get(key)
+        if error is not None:
+            raise error
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pending[key] = self._executor.submit(self._render, key, render)
+        try:
+            result = future.result(timeout=wait)
+        except TimeoutError:
+            return None, key
+        if isinstance(result, ChartRenderError):
+            raise result
+        return result, key
+
+    def _render(self, key, render):
+        # Failures are returned rather than raised so every waiter sees the
+        # same cached ChartRenderError
+        try:
+            png = render()
+        except Exception as e:
+            log.exception('Chart rendering failed')
+            error = ChartRenderError(f'{type(e).__name__}: {e}')
+            self._errors.set(key, error)
+            with self._lock:
+                self.render_errors += 1
+            return error
+        else:
+            self._cache.set(key, png)
+            with self._lock:
+                self.renders += 1
+            return png
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            counts = {'renders': self.renders, 'render_errors': self.render_errors,
+                      'rendering': len(self._pending)}
+        return {**self._cache.stats(), **counts}
@@ -0,0 +1,196 @@
+import json
+import os
+
+import numpy as np
+
+# city_day.csv measurement columns and the names they are stored and queried under
+CSV_COLUMNS = {
+    'PM2.5': 'pm25', 'PM10': 'pm10', 'NO': 'no', 'NO2': 'no2', 'NOx': 'nox', 'NH3': 'nh3',
+    'CO': 'co', 'SO2': 'so2', 'O3': 'o3', 'Benzene': 'benzene', 'Toluene': 'toluene',
+    'Xylene': 'xylene', 'AQI': 'aqi',
+}
+MEASURES = tuple(CSV_COLUMNS.values())
+DATE_FORMAT = '%d-%m-%Y'
+
+
+class DatasetNotFoundError(Exception):
+    pass
+
+
+def ingest(csv_path, directory):
+    """Convert ``csv_path`` into a directory of memory-mappable columns.
+
+    Rows are sorted by city then date. City and AQI bucket strings are
+    dictionary encoded into small integer codes, dates are stored as
+    ``datetime64[D]`` and measurements as float32 with NaN for gaps.
+    ``meta.json`` holds the dictionaries and each city's row range.
+    """
+    import pandas as pd
+
+    df = pd.read_csv(csv_path, dtype={c: np.float32 for c in CSV_COLUMNS})
+    df['Date'] = pd.to_datetime(df['Date'], format=DATE_FORMAT)
+    df = df.sort_values(['City', 'Date'], kind='stable').reset_index(drop=True)
+
+    city = pd.Categorical(df['City'])
+    bucket = pd.Categorical(df['AQI_Bucket'])
+    counts = np.bincount(city.codes, minlength=len(city.categories))
+    ends = np.cumsum(counts)
+
+    os.makedirs(directory, exist_ok=True)
+    columns = {
+        'city': city.codes.astype(np.int16),
+        'date': df['Date'].to_numpy().astype('datetime64[D]'),
+        'aqi_bucket': bucket.codes.astype(np.int8),
+        **{name: df[csv_name].to_numpy(dtype=np.float32) for csv_name, name in CSV_COLUMNS.items()},
+    }
+    for name, values in columns.items():
+        np.save(os.path.join(directory, f'{name}.npy'), values)
+    meta = {
+        'source': os.path.basename(csv_path),
+        'rows': int(len(df)),
+        'cities': [str(c) for c in city.categories],
+        'city_offsets': [[int(end - count), int(end)] for count, end in zip(counts, ends)],
+        'aqi_buckets': [str(b) for b in bucket.categories],
+        'measures': list(MEASURES),
+    }
+    # Written last: a directory without meta.json is an incomplete ingest
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    return meta
+
+
+class ColumnarDataset:
+    """Read-only queries over the columns written by ``ingest``.
+
+    Columns are memory-mapped on first use, so a query only pages in the
+    columns and row ranges it touches. Because rows are sorted by city and
+    date, a city is a contiguous slice and a date range within it is found
+    by binary search.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        meta_path = os.path.join(directory, 'meta.json')
+        if not os.path.exists(meta_path):
+            raise DatasetNotFoundError(f'No ingested dataset in {directory}')
+        with open(meta_path) as f:
+            self.meta = json.load(f)
+        self.cities = self.meta['cities']
+        self._city_index = {name.lower(): i for i, name in enumerate(self.cities)}
+        self._columns = {}
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def column(self, name):
+        values = self._columns.get(name)
+        if values is None:
+            values = np.load(os.path.join(self.directory, f'{name}.npy'), mmap_mode='r')
+            self._columns[name] = values
+        return values
+
+    def city_code(self, city):
+        code = self._city_index.get(city.lower())
+        if code is None:
+            raise KeyError(city)
+        return code
+
+    def _bounds(self, city=None, start=None, end=None):
+        # Row range [lo, hi) for an optional city and inclusive date range
+        if city is None:
+            lo, hi = 0, len(self)
+            if start is None and end is None:
+                return lo, hi, None
+            dates = self.column('date')
+            mask = np.ones(hi, dtype=bool)
+            if start is not None:
+                mask &= dates >= np.datetime64(start, 'D')
+            if end is not None:
+                mask &= dates <= np.datetime64(end, 'D')
+            return lo, hi, mask
+        lo, hi = self.meta['city_offsets'][self.city_code(city)]
+        dates = self.column('date')[lo:hi]
+        if start is not None:
+            lo_offset = int(np.searchsorted(dates, np.datetime64(start, 'D'), side='left'))
+        else:
+            lo_offset = 0
+        if end is not None:
+            hi_offset = int(np.searchsorted(dates, np.datetime64(end, 'D'), side='right'))
+        else:
+            hi_offset = len(dates)
+        return lo + lo_offset, lo + max(lo_offset, hi_offset), None
+
+    def city_summaries(self):
+        dates = self.column('date')
+        return [{'city': name, 'rows': hi - lo,
+                 'first_date': str(dates[lo]) if hi > lo else None,
+                 'last_date': str(dates[hi - 1]) if hi > lo else None}
+                for name, (lo, hi) in zip(self.cities, self.meta['city_offsets'])]
+
+    def city_range(self, city, start=None, end=None, measures=MEASURES, limit=None):
+        lo, hi, _ = self._bounds(city, start, end)
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        names = ['date', *measures]
+        columns = [np.datetime_as_string(self.column('date')[lo:hi]).tolist()]
+        for name in measures:
+            values = np.round(np.asarray(self.column(name)[lo:hi], dtype=np.float64), 3)
+            column = values.astype(object)
+            column[np.isnan(values)] = None
+            columns.append(column.tolist())
+        if 'aqi' in measures:
+            buckets = self.meta['aqi_buckets'] + [None]
+            names.append('aqi_bucket')
+            columns.append([buckets[code] for code in self.column('aqi_bucket')[lo:hi].tolist()])
+        return [dict(zip(names, row)) for row in zip(*columns)]
+
+    def matrix(self, measures, city=None, start=None, end=None):
+        """(rows, len(measures)) float64 array of the selected rows, NaN for gaps."""
+        lo, hi, mask = self._bounds(city, start, end)
+        X = np.column_stack([self.column(name)[lo:hi] for name in measures]).astype(np.float64)
+        return X if mask is None else X[mask]
+
+    def aggregate(self, measure, city=None, start=None, end=None, by_city=False):
+        """count/mean/min/max (NaN ignored) of ``measure``, overall or per city."""
+        if by_city:
+            return [{'city': name, **self.aggregate(measure, name, start, end)} for name in self.cities]
+        lo, hi, mask = self._bounds(city, start, end)
+        values = self.column(measure)[lo:hi]
+        if mask is not None:
+            values = values[mask]
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return {'count': 0, 'mean': None, 'min': None, 'max': None}
+        return {
+            'count': int(len(values)),
+            'mean': round(float(values.mean(dtype=np.float64)), 3),
+            'min': round(float(values.min()), 3),
+            'max': round(float(values.max()), 3),
+        }
+
+    def worst(self, measure, n=10, city=None, start=None, end=None):
+        """The ``n`` rows with the highest ``measure``, highest first."""
+        lo, hi, mask = self._bounds(city, start, end)
+        values = np.asarray(self.column(measure)[lo:hi], dtype=np.float64)
+        rows = np.arange(lo, hi)
+        keep = ~np.isnan(values) if mask is None else mask & ~np.isnan(values)
+        values, rows = values[keep], rows[keep]
+        if len(values) > n:
+            top = np.argpartition(values, len(values) - n)[-n:]
+            values, rows = values[top], rows[top]
+        order = np.argsort(-values, kind='stable')
+        city_codes = self.column('city')
+        dates = self.column('date')
+        return [{'city': self.cities[city_codes[row]], 'date': str(dates[row]), measure: round(float(value), 3)}
+                for row, value in zip(rows[order].tolist(), values[order].tolist())]
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Convert city_day.csv into memory-mappable columns')
+    parser.add_argument('csv', nargs='?', default='city_day.csv')
+    parser.add_argument('output', nargs='?', default='city_day.columns')
+    args = parser.parse_args()
+    meta = ingest(args.csv, args.output)
+    print(f"Ingested {meta['rows']} rows for {len(meta['cities'])} cities into {args.output}")
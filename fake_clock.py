@@ -0,0 +1,11 @@
+"""Manually advanced clock for tests of time-based code (TTLs, breakers, rate limits)."""
+
+
+class FakeClock:
+    """Callable returning ``now``, which tests set or advance directly."""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
@@ -0,0 +1,124 @@
+"""Local stand-in for the OpenWeather geocoding and air-pollution APIs.
+
+Used by the tests and benchmarks so no real API key or network is needed:
+
+    python fake_openweather.py --port 8081 --latency-ms 50
+    OPENWEATHER_BASE_URL=http://127.0.0.1:8081 python app.py
+"""
+import argparse
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_COMPONENTS = {
+    'co': 230.31, 'no': 0.0, 'no2': 12.34, 'o3': 61.55, 'so2': 4.2,
+    'pm2_5': 18.7, 'pm10': 27.9, 'nh3': 1.1,
+}
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class FakeOpenWeatherServer:
+    """Threaded HTTP server answering ``/geo/1.0/direct`` and ``/data/2.5/air_pollution``.
+
+    Cities map to coordinates derived from their name unless listed in
+    ``unknown_cities``. ``latency`` adds a fixed delay to every response and
+    ``fail_paths`` forces a ``fail_status`` error for the given path prefixes.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, components=None):
+        self.latency = latency
+        self.components = dict(components or DEFAULT_COMPONENTS)
+        self.unknown_cities = set()
+        self.fail_paths = set()
+        self.fail_status = 500
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._httpd = _Server((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def coordinates(self, city_name):
+        seed = sum(ord(ch) for ch in city_name.lower())
+        return round(-60 + seed % 120 + 0.1234, 4), round(-170 + seed % 340 + 0.5678, 4)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+                with server._lock:
+                    server.calls[parsed.path] += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                if any(parsed.path.startswith(p) for p in server.fail_paths):
+                    return self._send(server.fail_status, {'cod': server.fail_status, 'message': 'forced failure'})
+                if parsed.path == '/geo/1.0/direct':
+                    city = query.get('q', '')
+                    if not city or city.lower() in server.unknown_cities:
+                        return self._send(200, [])
+                    lat, lon = server.coordinates(city)
+                    return self._send(200, [{'name': city, 'lat': lat, 'lon': lon, 'country': 'IN'}])
+                if parsed.path == '/data/2.5/air_pollution':
+                    return self._send(200, {
+                        'coord': {'lat': float(query.get('lat', 0)), 'lon': float(query.get('lon', 0))},
+                        'list': [{'main': {'aqi': 2}, 'components': server.components, 'dt': int(time.time())}],
+                    })
+                return self._send(404, {'cod': 404, 'message': 'not found'})
+
+        return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a fake OpenWeather API server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    args = parser.parse_args()
+    fake = FakeOpenWeatherServer(args.host, args.port, latency=args.latency_ms / 1000.0)
+    print(f'Fake OpenWeather listening on {fake.url}')
+    try:
+        fake._httpd.serve_forever()
+    except KeyboardInterrupt:
+        fake.stop()
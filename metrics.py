@@ -0,0 +1,178 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Latency buckets in seconds, finer than Prometheus' defaults at the low end
+# where most routes and stages land
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        lines += [f'{self.name}{_labels(self.labelnames, labels)} {_number(v)}' for labels, v in items]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def collect(self):
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-2])}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}')
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at scrape time; ``fn`` returns a number or
+    an iterable of ``(label_values, number)`` pairs."""
+
+    type = 'gauge'
+
+    def __init__(self, name, help, fn, labelnames=()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+
+    def collect(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+        value = self.fn()
+        samples = [((), value)] if not self.labelnames else value
+        for labels, v in samples:
+            if v is not None:
+                lines.append(f'{self.name}{_labels(self.labelnames, labels)} {_number(v)}')
+        return lines
+
+
+class CallbackCounter(Gauge):
+    """Monotonic total kept elsewhere (e.g. a stats attribute) and read at
+    scrape time, exposed as a counter so ``rate()`` handles restarts."""
+
+    type = 'counter'
+
+
+class Registry:
+    """Metric families rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines += metric.collect()
+            except Exception:
+                # One failing gauge callback must not break the whole scrape
+                continue
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+stage_seconds = registry.register(Histogram(
+    'aqi_stage_duration_seconds', 'Time spent in one stage of request handling', ('stage',)))
+
+# Stage timings of the current request as {stage: [seconds, calls]}; None outside a request
+_request_stages = ContextVar('aqi_request_stages', default=None)
+
+
+def begin_request():
+    stages = {}
+    _request_stages.set(stages)
+    return stages
+
+
+def end_request():
+    stages = _request_stages.get()
+    _request_stages.set(None)
+    return stages or {}
+
+
+@contextmanager
+def stage(name):
+    """Time a block as ``name`` in the stage histogram and the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_seconds.observe(elapsed, name)
+        stages = _request_stages.get()
+        if stages is not None:
+            entry = stages.get(name)
+            if entry is None:
+                stages[name] = [elapsed, 1]
+            else:
+                entry[0] += elapsed
+                entry[1] += 1
+
+
+def server_timing(stages, total):
+    # Server-Timing header value; repeated stages are summed and counted
+    parts = [f'{name};dur={seconds * 1000:.2f}' + (f';desc="{calls} calls"' if calls > 1 else '')
+             for name, (seconds, calls) in stages.items()]
+    parts.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(parts)
@@ -0,0 +1,155 @@
+import os
+import queue
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class _Pending:
+    __slots__ = ('sample', 'future', 'enqueued_at')
+
+    def __init__(self, sample):
+        self.sample = sample
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-row predictions into one batched call.
+
+    Rows are queued for at most ``flush_window_ms`` (or until ``max_batch_size``
+    rows are waiting) and then handed to ``predict_fn`` as a single 2-D array
+    on a shared worker thread. Every caller gets a future for its own row.
+    The worker starts on the first submit and again in a forked child
+    (e.g. gunicorn --preload), which does not inherit the parent's thread.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=64, flush_window_ms=2.0,
+                 max_queue_depth=1024, latency_window=10000):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.flush_window = flush_window_ms / 1000.0
+        self.max_queue_depth = max_queue_depth
+        self._latencies = deque(maxlen=latency_window)
+        self._reset()
+        ref = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: ref() is not None and ref()._reset())
+
+    def _reset(self):
+        # Fresh queue, locks and no worker: also run in a forked child, where
+        # queued rows belong to the parent and its locks may be held
+        self._queue = queue.Queue(maxsize=self.max_queue_depth)
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._started_at = None
+        self._latencies.clear()
+        self.rows = 0
+        self.batches = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._started_at = time.perf_counter()
+                self._thread = threading.Thread(target=self._run, name='microbatcher', daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, sample):
+        if self._thread is None:
+            self.start()
+        pending = _Pending(sample)
+        try:
+            self._queue.put_nowait(pending)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise QueueFullError('Micro-batch queue is full')
+        return pending.future
+
+    def predict(self, sample, timeout=None):
+        return self.submit(sample).result(timeout)
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = [first]
+            deadline = time.perf_counter() + self.flush_window
+            stop = False
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+            if stop:
+                return
+
+    def _flush(self, batch):
+        try:
+            X = np.asarray([item.sample for item in batch], dtype=np.float64)
+            predictions = self.predict_fn(X)
+        except Exception as exc:
+            with self._lock:
+                self.errors += len(batch)
+            for item in batch:
+                item.future.set_exception(exc)
+            return
+        done = time.perf_counter()
+        with self._lock:
+            self.rows += len(batch)
+            self.batches += 1
+            for item in batch:
+                self._latencies.append(done - item.enqueued_at)
+        for item, prediction in zip(batch, predictions):
+            item.future.set_result(prediction)
+
+    def stats(self):
+        with self._lock:
+            latencies = np.fromiter(self._latencies, dtype=np.float64)
+            rows, batches = self.rows, self.batches
+            rejected, errors = self.rejected, self.errors
+        uptime = time.perf_counter() - self._started_at if self._started_at else 0.0
+        p50, p99 = (np.percentile(latencies, [50, 99]) * 1000).tolist() if len(latencies) else (None, None)
+        return {
+            'rows': rows,
+            'batches': batches,
+            'rejected': rejected,
+            'errors': errors,
+            'queue_depth': self._queue.qsize(),
+            'avg_batch_size': round(rows / batches, 2) if batches else None,
+            'latency_p50_ms': p50,
+            'latency_p99_ms': p99,
+            'rows_per_second': round(rows / uptime, 1) if uptime > 0 else None,
+            'max_batch_size': self.max_batch_size,
+            'flush_window_ms': self.flush_window * 1000,
+            'max_queue_depth': self.max_queue_depth,
+        }
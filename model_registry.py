@@ -0,0 +1,364 @@
+import glob
+import json
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from forest_engine import CompiledForest
+
+log = logging.getLogger(__name__)
+
+ACTIVE_POINTER = 'ACTIVE'
+
+
+class ModelNotFoundError(Exception):
+    pass
+
+
+def read_metadata(path):
+    # Training metadata written next to an artifact, or {} when there is none
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+class ModelVersion:
+    """One loaded model artifact and the engine policy used to run it.
+
+    The sklearn pickle and the compiled forest are each loaded on first use.
+    With the compiled engine, batches up to ``compiled_max_rows`` use the
+    flattened forest (memory-mapped from ``compiled_path`` when it exists)
+    and larger batches fall back to sklearn.
+    """
+
+    def __init__(self, version, model_path, compiled_path=None, metadata=None,
+                 engine='sklearn', compiled_max_rows=512):
+        self.version = version
+        self.model_path = model_path
+        self.compiled_path = compiled_path
+        self.metadata = metadata or {}
+        self.engine = engine
+        self.compiled_max_rows = compiled_max_rows
+        self._sklearn = None
+        self._compiled = None
+        self._lock = threading.Lock()
+
+    @property
+    def sklearn_model(self):
+        if self._sklearn is None:
+            with self._lock:
+                if self._sklearn is None:
+                    import joblib
+                    self._sklearn = joblib.load(self.model_path)
+        return self._sklearn
+
+    @property
+    def compiled_model(self):
+        if self._compiled is None:
+            if self.compiled_path and os.path.isdir(self.compiled_path):
+                compiled = CompiledForest.load(self.compiled_path, mmap_mode='r')
+            else:
+                compiled = CompiledForest.from_sklearn(self.sklearn_model)
+            with self._lock:
+                self._compiled = self._compiled or compiled
+        return self._compiled
+
+    def preload(self):
+        if self.engine == 'compiled':
+            self.compiled_model
+        else:
+            self.sklearn_model
+        return self
+
+    def predict(self, X):
+        if self.engine == 'compiled' and len(X) <= self.compiled_max_rows:
+            return self.compiled_model.predict(X)
+        return self.sklearn_model.predict(X)
+
+    def describe(self):
+        return {
+            'version': self.version,
+            'engine': self.engine,
+            'artifact': os.path.basename(self.model_path),
+            'metrics': self.metadata.get('metrics'),
+            'latency': self.metadata.get('latency'),
+            'created_at': self.metadata.get('created_at'),
+        }
+
+
+class _Comparison:
+    """Rolling latency and output-difference samples for a candidate model."""
+
+    def __init__(self, window=10000):
+        self._lock = threading.Lock()
+        self.live_ms = deque(maxlen=window)
+        self.candidate_ms = deque(maxlen=window)
+        self.abs_diff = deque(maxlen=window)
+        self.rows = 0
+        self.errors = 0
+        self.dropped = 0
+
+    def record(self, live_ms, candidate_ms, diff):
+        with self._lock:
+            self.live_ms.append(live_ms)
+            self.candidate_ms.append(candidate_ms)
+            self.abs_diff.extend(diff.tolist())
+            self.rows += len(diff)
+
+    def add_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def add_dropped(self):
+        with self._lock:
+            self.dropped += 1
+
+    def summary(self):
+        with self._lock:
+            live = np.fromiter(self.live_ms, dtype=np.float64)
+            candidate = np.fromiter(self.candidate_ms, dtype=np.float64)
+            diff = np.fromiter(self.abs_diff, dtype=np.float64)
+            rows, errors, dropped = self.rows, self.errors, self.dropped
+
+        def pct(values, q):
+            return round(float(np.percentile(values, q)), 4) if len(values) else None
+
+        return {
+            'compared_calls': len(live),
+            'compared_rows': rows,
+            'errors': errors,
+            'dropped': dropped,
+            'live_p50_ms': pct(live, 50),
+            'live_p99_ms': pct(live, 99),
+            'candidate_p50_ms': pct(candidate, 50),
+            'candidate_p99_ms': pct(candidate, 99),
+            'mean_abs_diff': round(float(diff.mean()), 4) if len(diff) else None,
+            'max_abs_diff': round(float(diff.max()), 4) if len(diff) else None,
+        }
+
+
+class _Candidate:
+    __slots__ = ('model', 'mode', 'fraction', 'comparison')
+
+    def __init__(self, model, mode, fraction):
+        self.model = model
+        self.mode = mode
+        self.fraction = fraction
+        self.comparison = _Comparison()
+
+
+class ModelRegistry:
+    """Directory of versioned model artifacts with atomic hot swapping.
+
+    Versions are discovered from the ``airquality-<version>.json`` metadata
+    files written by ``train_model.py``. The live model is a single attribute
+    that ``predict`` reads once per call, so activating a new version is a
+    plain reference swap: calls already running finish on the model they
+    started with and the hot path takes no lock. The ``ACTIVE`` pointer file
+    records the choice so other worker processes can follow it via ``watch``.
+
+    A candidate can receive ``shadow`` traffic (run in the background, result
+    discarded) or ``canary`` traffic (served to the caller while the live
+    model runs in the background); either way latency and output differences
+    are recorded for comparison.
+    """
+
+    def __init__(self, directory, default=None, engine='sklearn', compiled_max_rows=512,
+                 max_pending_comparisons=64):
+        self.directory = directory
+        self.engine = engine
+        self.compiled_max_rows = compiled_max_rows
+        self._default = default
+        self._versions = {}
+        self.max_pending_comparisons = max_pending_comparisons
+        self._candidate = None
+        self.swaps = 0
+        self._reset()
+        ref = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: ref() is not None and ref()._reset())
+
+        self._active = default
+        pointer = self._read_pointer()
+        if pointer:
+            self._active = self.get(pointer)
+        if self._active is None:
+            raise ModelNotFoundError('No active model: no default and no ACTIVE pointer')
+
+    def _reset(self):
+        # Also run in a forked child, where the parent's watcher and compare
+        # threads are gone and its locks may be held
+        self._swap_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-compare')
+        # Caps comparisons queued or running on the executor
+        self._pending = threading.BoundedSemaphore(self.max_pending_comparisons)
+        self._watcher = None
+        self._watch_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @property
+    def active(self):
+        return self._active
+
+    @property
+    def candidate(self):
+        return self._candidate
+
+    # ----- discovery -----
+
+    def _metadata_files(self):
+        return sorted(glob.glob(os.path.join(self.directory, 'airquality-*.json')))
+
+    def list_versions(self):
+        versions = []
+        for path in self._metadata_files():
+            with open(path) as f:
+                metadata = json.load(f)
+            versions.append({'version': metadata['version'], 'created_at': metadata.get('created_at'),
+                             'metrics': metadata.get('metrics'), 'latency': metadata.get('latency')})
+        return versions
+
+    def get(self, version):
+        if self._default is not None and version == self._default.version:
+            return self._default
+        model = self._versions.get(version)
+        if model is not None:
+            return model
+        metadata = read_metadata(os.path.join(self.directory, f'airquality-{version}.json'))
+        if not metadata:
+            raise ModelNotFoundError(f'Unknown model version: {version}')
+        compiled = metadata.get('compiled_artifact')
+        model = ModelVersion(
+            version,
+            os.path.join(self.directory, metadata.get('artifact', f'airquality-{version}.joblib')),
+            os.path.join(self.directory, compiled) if compiled else None,
+            metadata=metadata,
+            engine=self.engine,
+            compiled_max_rows=self.compiled_max_rows,
+        )
+        return self._versions.setdefault(version, model)
+
+    # ----- activation -----
+
+    def _pointer_path(self):
+        return os.path.join(self.directory, ACTIVE_POINTER)
+
+    def _read_pointer(self):
+        try:
+            with open(self._pointer_path()) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _write_pointer(self, version):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f'{self._pointer_path()}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(version)
+        os.replace(tmp, self._pointer_path())
+
+    def activate(self, version, persist=True):
+        # Load fully before the swap so no request waits on the new model
+        model = self.get(version).preload()
+        with self._swap_lock:
+            previous = self._active
+            self._active = model
+            self.swaps += 1
+            if persist:
+                self._write_pointer(version)
+        return previous
+
+    def watch(self, interval=5.0):
+        # Follow ACTIVE pointer changes made by other processes. Cheap when
+        # already running, so it can be called on every request; a forked
+        # child starts its own thread. A version that fails to activate is
+        # logged and not retried until the pointer changes again.
+        if self._watcher is not None:
+            return
+        with self._watch_lock:
+            if self._watcher is not None:
+                return
+
+            def run():
+                failed = None
+                while not self._stop.wait(interval):
+                    version = self._read_pointer()
+                    if version != failed:
+                        failed = None
+                    if version and version != self._active.version and version != failed:
+                        try:
+                            self.activate(version, persist=False)
+                        except Exception:
+                            log.exception('Could not activate model version %s from %s', version,
+                                          self._pointer_path())
+                            failed = version
+
+            self._watcher = threading.Thread(target=run, name='model-watch', daemon=True)
+            self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+        self._executor.shutdown(wait=False)
+
+    # ----- shadow / canary -----
+
+    def set_candidate(self, version, mode='shadow', fraction=0.1):
+        if mode not in ('shadow', 'canary'):
+            raise ValueError('mode must be "shadow" or "canary"')
+        if not 0.0 <= fraction <= 1.0:
+            raise ValueError('fraction must be between 0 and 1')
+        self._candidate = _Candidate(self.get(version).preload(), mode, fraction)
+
+    def clear_candidate(self):
+        self._candidate = None
+
+    def candidate_stats(self):
+        candidate = self._candidate
+        if candidate is None:
+            return None
+        return {'version': candidate.model.version, 'mode': candidate.mode,
+                'fraction': candidate.fraction, **candidate.comparison.summary()}
+
+    def predict(self, X):
+        active = self._active
+        candidate = self._candidate
+        if candidate is None or candidate.model is active or random.random() >= candidate.fraction:
+            return active.predict(X)
+
+        primary, secondary = (candidate.model, active) if candidate.mode == 'canary' else (active, candidate.model)
+        start = time.perf_counter()
+        result = primary.predict(X)
+        primary_ms = (time.perf_counter() - start) * 1000
+        self._compare_later(candidate, primary, secondary, X, result, primary_ms)
+        return result
+
+    def _compare_later(self, candidate, primary, secondary, X, result, primary_ms):
+        comparison = candidate.comparison
+        if not self._pending.acquire(blocking=False):
+            comparison.add_dropped()
+            return
+
+        def run():
+            try:
+                start = time.perf_counter()
+                other = secondary.predict(X)
+                secondary_ms = (time.perf_counter() - start) * 1000
+                diff = np.abs(np.asarray(result) - np.asarray(other))
+                if primary is candidate.model:
+                    comparison.record(secondary_ms, primary_ms, diff)
+                else:
+                    comparison.record(primary_ms, secondary_ms, diff)
+            except Exception:
+                comparison.add_error()
+            finally:
+                self._pending.release()
+
+        self._executor.submit(run)
@@ -0,0 +1,234 @@
+import asyncio
+import os
+import threading
+import weakref
+
+import requests
+
+from cache import TTLCache
+from metrics import stage
+from upstream import AsyncUpstreamClient, CircuitOpenError, UpstreamClient, UpstreamError
+
+DEFAULT_BASE_URL = 'http://api.openweathermap.org'
+
+_MISSING = object()
+
+
+class OpenWeatherError(Exception):
+    def __init__(self, message, status_code=500):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class OpenWeatherClient:
+    """Geocoding and air-pollution lookups against the OpenWeather API.
+
+    City coordinates and pollution components are kept in separate TTL/LRU
+    caches, and concurrent lookups for the same key share one upstream call.
+    Calls go through a pooled ``UpstreamClient`` unless another ``upstream``
+    is given; the ``*_async`` methods take an ``AsyncUpstreamClient`` per call
+    so that each event loop owns its connection pool. ``many_city_components``
+    runs on one long-lived event loop thread with its own pooled async
+    client, started on first use (and again in a forked child).
+    """
+
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, geocode_ttl=7 * 24 * 3600,
+                 pollution_ttl=900, maxsize=1024, upstream=None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.upstream = upstream or UpstreamClient()
+        self.geocode_cache = TTLCache(maxsize=maxsize, ttl=geocode_ttl)
+        self.pollution_cache = TTLCache(maxsize=maxsize, ttl=pollution_ttl)
+        self._reset_background()
+        ref = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: ref() is not None and ref()._reset_background())
+
+    def _reset_background(self):
+        # Also run in a forked child, where the parent's loop thread is gone
+        self._async_inflight = {}
+        self._loop = None
+        self._loop_thread = None
+        self._async_client = None
+        self._loop_lock = threading.Lock()
+
+    # ----- request building and response parsing shared by both paths -----
+
+    def _geocode_request(self, city_name):
+        return f'{self.base_url}/geo/1.0/direct', {'q': city_name, 'limit': 1, 'appid': self.api_key}
+
+    def _air_pollution_request(self, lat, lon):
+        return f'{self.base_url}/data/2.5/air_pollution', {'lat': lat, 'lon': lon, 'appid': self.api_key}
+
+    def _parse_geocode(self, response):
+        if response.status_code != 200:
+            raise OpenWeatherError('Failed to fetch location data', 500)
+        try:
+            geocode_data = response.json()
+            if not geocode_data:
+                raise OpenWeatherError('City not found', 404)
+            # Assuming the first result is the most relevant
+            return geocode_data[0]['lat'], geocode_data[0]['lon']
+        except (ValueError, KeyError, IndexError, TypeError):
+            raise OpenWeatherError('Malformed location data', 502)
+
+    def _parse_air_pollution(self, response):
+        if response.status_code != 200:
+            raise OpenWeatherError('Failed to fetch Air Quality Index data', 500)
+        try:
+            return response.json()['list'][0]['components']
+        except (ValueError, KeyError, IndexError, TypeError):
+            raise OpenWeatherError('Malformed Air Quality Index data', 502)
+
+    def _call(self, get, request, failure_message):
+        url, params = request
+        try:
+            return get(url, params=params)
+        except CircuitOpenError:
+            raise OpenWeatherError('Air quality service is temporarily unavailable', 503)
+        except UpstreamError:
+            raise OpenWeatherError(failure_message, 504)
+        except requests.RequestException:
+            # Not retried by the upstream client (e.g. a bad URL or a broken body)
+            raise OpenWeatherError(failure_message, 502)
+
+    @staticmethod
+    def _pollution_key(lat, lon):
+        return round(lat, 4), round(lon, 4)
+
+    # ----- synchronous lookups -----
+
+    def _fetch_geocode(self, city_name):
+        response = self._call(self.upstream.get, self._geocode_request(city_name),
+                              'Failed to fetch location data')
+        return self._parse_geocode(response)
+
+    def _fetch_air_pollution(self, lat, lon):
+        response = self._call(self.upstream.get, self._air_pollution_request(lat, lon),
+                              'Failed to fetch Air Quality Index data')
+        return self._parse_air_pollution(response)
+
+    def geocode(self, city_name):
+        key = city_name.strip().lower()
+        with stage('geocode'):
+            return self.geocode_cache.get_or_load(key, lambda: self._fetch_geocode(city_name))
+
+    def air_pollution(self, lat, lon):
+        key = self._pollution_key(lat, lon)
+        with stage('air_pollution'):
+            return self.pollution_cache.get_or_load(key, lambda: self._fetch_air_pollution(lat, lon))
+
+    def refresh_air_pollution(self, lat, lon):
+        # Always fetch, then cache the reading for interactive lookups
+        with stage('air_pollution'):
+            components = self._fetch_air_pollution(lat, lon)
+        self.pollution_cache.set(self._pollution_key(lat, lon), components)
+        return components
+
+    def city_components(self, city_name):
+        lat, lon = self.geocode(city_name)
+        return self.air_pollution(lat, lon)
+
+    # ----- asyncio lookups -----
+
+    async def _cached_async(self, cache, key, fetch):
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        inflight_key = (id(cache), key)
+        task = self._async_inflight.get(inflight_key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(fetch())
+            self._async_inflight[inflight_key] = task
+            task.add_done_callback(lambda _: self._async_inflight.pop(inflight_key, None))
+        value = await asyncio.shield(task)
+        cache.set(key, value)
+        return value
+
+    async def geocode_async(self, city_name, client):
+        async def fetch():
+            response = await self._call_async(client, self._geocode_request(city_name),
+                                              'Failed to fetch location data')
+            return self._parse_geocode(response)
+        with stage('geocode'):
+            return await self._cached_async(self.geocode_cache, city_name.strip().lower(), fetch)
+
+    async def air_pollution_async(self, lat, lon, client):
+        async def fetch():
+            response = await self._call_async(client, self._air_pollution_request(lat, lon),
+                                              'Failed to fetch Air Quality Index data')
+            return self._parse_air_pollution(response)
+        with stage('air_pollution'):
+            return await self._cached_async(self.pollution_cache, self._pollution_key(lat, lon), fetch)
+
+    async def city_components_async(self, city_name, client):
+        lat, lon = await self.geocode_async(city_name, client)
+        return await self.air_pollution_async(lat, lon, client)
+
+    async def _call_async(self, client, request, failure_message):
+        url, params = request
+        try:
+            return await client.get(url, params=params)
+        except CircuitOpenError:
+            raise OpenWeatherError('Air quality service is temporarily unavailable', 503)
+        except UpstreamError:
+            raise OpenWeatherError(failure_message, 504)
+
+    async def many_city_components_async(self, city_names, client, concurrency=20):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(city_name):
+            async with semaphore:
+                try:
+                    return await self.city_components_async(city_name, client)
+                except OpenWeatherError as e:
+                    return e
+                except Exception:
+                    return OpenWeatherError('Failed to fetch Air Quality Index data', 500)
+
+        return await asyncio.gather(*(one(city_name) for city_name in city_names))
+
+    def _background(self):
+        # The event loop thread and async client shared by all
+        # many_city_components calls; the client shares this client's retry
+        # budget and circuit breaker
+        if self._loop is None:
+            with self._loop_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    self._async_client = AsyncUpstreamClient(
+                        pool_size=self.upstream.pool_size,
+                        connect_timeout=self.upstream.connect_timeout,
+                        read_timeout=self.upstream.read_timeout,
+                        retry=self.upstream.retry,
+                        breaker=self.upstream.breaker,
+                    )
+                    self._loop_thread = threading.Thread(target=loop.run_forever, name='openweather-loop',
+                                                         daemon=True)
+                    self._loop_thread.start()
+                    self._loop = loop
+        return self._loop, self._async_client
+
+    def many_city_components(self, city_names, concurrency=20):
+        # Each entry is either a components dict or the OpenWeatherError for that city
+        loop, client = self._background()
+        coroutine = self.many_city_components_async(city_names, client, concurrency)
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+    def close(self):
+        loop = self._loop
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self._async_client.aclose(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            self._loop_thread.join()
+            loop.close()
+            self._reset_background()
+
+    def cache_stats(self):
+        return {
+            'geocode': self.geocode_cache.stats(),
+            'air_pollution': self.pollution_cache.stats(),
+        }
+
+    def upstream_stats(self):
+        return self.upstream.stats()
@@ -0,0 +1,162 @@
+import logging
+import os
+import threading
+import time
+import weakref
+
+from openweather import OpenWeatherError
+
+log = logging.getLogger(__name__)
+
+# OpenWeather component names in model feature order
+COMPONENTS = ('pm2_5', 'pm10', 'o3', 'no2', 'co', 'so2')
+
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` calls per second and bursts of ``burst``."""
+
+    def __init__(self, rate, burst=1, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        # Take a token and return how many seconds to wait before using it
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class CityPoller:
+    """Poll air pollution for a list of cities into a ``TimeSeriesStore``.
+
+    Every ``interval`` seconds a round fetches each city, with the calls
+    spread evenly over ``spread`` seconds and capped at ``rate`` per second.
+    Readings are fetched fresh (the pollution cache is refreshed, not read)
+    and predicted with one ``predict_fn`` call at the end of the round.
+    ``get_weather`` returns the ``OpenWeatherClient`` to use, so the client
+    can be swapped, e.g. for one pointed at a local fake server. A round
+    that raises is logged and counted, and polling carries on. A forked
+    child (e.g. gunicorn --preload) does not inherit the thread; calling
+    ``start`` there starts its own.
+    """
+
+    def __init__(self, get_weather, predict_fn, store, cities, interval=900.0, spread=None,
+                 rate=1.0, clock=time.time):
+        self.get_weather = get_weather
+        self.predict_fn = predict_fn
+        self.store = store
+        # Deduplicated the way the store keys them: trimmed and case-insensitive
+        unique = {}
+        for city in cities:
+            unique.setdefault(city.strip().lower(), city.strip())
+        self.cities = [city for key, city in unique.items() if key]
+        self.interval = interval
+        self.spread = interval / 2 if spread is None else spread
+        self.rate = rate
+        self._clock = clock
+        self._reset()
+        ref = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: ref() is not None and ref()._reset())
+
+    def _reset(self):
+        # Also run in a forked child, where the parent's thread is gone and
+        # its locks may be held
+        self.limiter = RateLimiter(self.rate)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self.rounds = 0
+        self.polls = 0
+        self.failures = 0
+        self.round_errors = 0
+        self.last_round_at = None
+        self.last_round_seconds = None
+        self.last_round_error = None
+        self.errors = {}
+
+    def start(self):
+        # Cheap when already running, so it can be called on every request
+        if self._thread is None and self.cities:
+            with self._start_lock:
+                if self._thread is None:
+                    self._stop.clear()
+                    self._thread = threading.Thread(target=self._run, name='city-poller', daemon=True)
+                    self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.poll_once()
+            except Exception as e:
+                log.exception('City polling round failed')
+                with self._lock:
+                    self.round_errors += 1
+                    self.last_round_error = f'{type(e).__name__}: {e}'
+            if self._stop.wait(max(0.0, self.interval - (time.monotonic() - started))):
+                return
+
+    def poll_once(self):
+        """Run one round and return the number of readings stored."""
+        started = time.monotonic()
+        step = self.spread / len(self.cities) if self.cities else 0.0
+        readings, errors = [], {}
+        for i, city in enumerate(self.cities):
+            delay = max(started + i * step - time.monotonic(), self.limiter.reserve())
+            if delay > 0 and self._stop.wait(delay):
+                break
+            weather = self.get_weather()
+            try:
+                lat, lon = weather.geocode(city)
+                components = weather.refresh_air_pollution(lat, lon)
+                readings.append((city, self._clock(), [components[name] for name in COMPONENTS]))
+            except OpenWeatherError as e:
+                errors[city] = e.message
+            except (KeyError, TypeError, ValueError):
+                errors[city] = 'Malformed air pollution data'
+            except Exception as e:
+                errors[city] = f'{type(e).__name__}: {e}'
+
+        if readings:
+            predictions = self.predict_fn([values for _, _, values in readings])
+            self.store.append_many([(city, timestamp, values, float(aqi))
+                                    for (city, timestamp, values), aqi in zip(readings, predictions)])
+        with self._lock:
+            self.rounds += 1
+            self.polls += len(readings) + len(errors)
+            self.failures += len(errors)
+            self.errors = errors
+            self.last_round_at = self._clock()
+            self.last_round_seconds = time.monotonic() - started
+        return len(readings)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'cities': len(self.cities),
+                'interval_seconds': self.interval,
+                'running': self._thread is not None and self._thread.is_alive(),
+                'rounds': self.rounds,
+                'polls': self.polls,
+                'failures': self.failures,
+                'round_errors': self.round_errors,
+                'last_round_error': self.last_round_error,
+                'last_round_at': self.last_round_at,
+                'last_round_seconds': self.last_round_seconds,
+                'last_errors': dict(self.errors),
+            }
@@ -0,0 +1,58 @@
+import numpy as np
+
+from cache import TTLCache
+
+
+class PredictionCache:
+    """Bounded LRU of model outputs keyed on (model version, feature row).
+
+    With ``quantum > 0`` each feature is rounded to a multiple of ``quantum``
+    before it is used as a key, so readings that differ only by sensor noise
+    share one entry; ``quantum=0`` keys on the exact float values. The first
+    row seen for a key decides the cached prediction. Entries from a previous
+    model version are dropped as soon as a new version is seen.
+    """
+
+    def __init__(self, maxsize=10000, quantum=0.0):
+        self.quantum = quantum
+        self._cache = TTLCache(maxsize=maxsize)
+        self._version = None
+        self.invalidations = 0
+
+    def _keys(self, X, version):
+        if self._version != version:
+            self._version = version
+            self._cache.clear()
+            self.invalidations += 1
+        if self.quantum > 0:
+            X = np.round(X / self.quantum).astype(np.int64)
+        return [(version, row.tobytes()) for row in X]
+
+    def predict(self, X, version, predict_fn):
+        """Return predictions for the 2-D float array ``X``, calling
+        ``predict_fn`` once for the distinct rows that are not cached."""
+        keys = self._keys(X, version)
+        cached = self._cache.get_many(keys)
+        missing = {}
+        for i, value in enumerate(cached):
+            if value is None:
+                missing.setdefault(keys[i], i)
+        if missing:
+            rows = list(missing.values())
+            predictions = predict_fn(X[rows]).tolist()
+            self._cache.set_many(zip(missing, predictions))
+            computed = dict(zip(missing, predictions))
+            cached = [computed[keys[i]] if value is None else value for i, value in enumerate(cached)]
+        return np.asarray(cached, dtype=np.float64)
+
+    def store(self, X, version, predictions):
+        # Remember predictions already computed for the rows of X
+        self._cache.set_many(zip(self._keys(X, version), np.asarray(predictions).tolist()))
+
+    def get(self, X, version):
+        # Cached prediction for a single-row X, or None
+        return self._cache.get_many(self._keys(X, version))[0]
+
+    def stats(self):
+        return {**self._cache.stats(), 'quantum': self.quantum, 'version': self._version,
+                'invalidations': self.invalidations}
@@ -0,0 +1,331 @@
+import operator
+import sqlite3
+import threading
+import time
+from bisect import bisect_right
+from uuid import uuid4
+
+from schema import AQIRecord, POLLUTANTS
+
+# Range filter operators as (field, op, value) triples, e.g. ('pm25', 'gt', 50.0)
+FILTER_OPS = {'gt': operator.gt, 'gte': operator.ge, 'lt': operator.lt, 'lte': operator.le}
+SQL_FILTER_OPS = {'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+
+
+class VersionConflictError(Exception):
+    """A conditional write named versions that no longer match the record."""
+
+    def __init__(self, record_id, current_version):
+        super().__init__(f'Record {record_id} is at version {current_version}')
+        self.record_id = record_id
+        self.current_version = current_version
+
+
+class _Generation:
+    # Everything one DictRecordStore generation indexes, swapped as a unit by clear()
+    __slots__ = ('records', 'seq_of', 'order', 'tombstones')
+
+    def __init__(self):
+        self.records = {}
+        self.seq_of = {}
+        # (seqs, ids) in sequence order; replaced as one tuple by compaction
+        self.order = ([], [])
+        self.tombstones = 0
+
+
+class DictRecordStore:
+    """Process-local record store backed by a plain dict (the default).
+
+    Records are held as ``AQIRecord`` slot objects rather than dicts. Every
+    record gets a monotonically increasing sequence number used as the
+    pagination cursor. Append-only ``order`` lists keep sequence order
+    so ``scan`` can bisect to a cursor; deleted entries are skipped lazily and
+    compacted once they make up half of the index.
+
+    Reads take no lock. Stored records are never mutated: an update installs
+    a new ``AQIRecord`` with the next version, so a reader sees either the old
+    or the new record, never a mix. Writes hold a lock so a bulk operation is
+    applied as a whole and conditional (``if_match``) writes check and apply
+    atomically. ``clear`` swaps in an empty generation in one assignment and
+    frees the old one outside the lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._state = _Generation()
+        self._next_seq = 1
+
+    def __len__(self):
+        return len(self._state.records)
+
+    def all(self):
+        return [record for _, record in self.scan()]
+
+    def scan(self, after=None, filters=(), limit=None):
+        state = self._state
+        seqs, ids = state.order
+        checks = [(field, FILTER_OPS[op], value) for field, op, value in filters]
+        count = 0
+        for i in range(bisect_right(seqs, after) if after else 0, len(seqs)):
+            record_id = ids[i]
+            record = state.records.get(record_id)
+            if record is None or state.seq_of.get(record_id) != seqs[i]:
+                continue
+            if checks and not all(check(getattr(record, field), value) for field, check, value in checks):
+                continue
+            yield seqs[i], record.to_dict()
+            count += 1
+            if limit is not None and count >= limit:
+                return
+
+    def get(self, record_id):
+        record = self._state.records.get(record_id)
+        return record.to_dict() if record is not None else None
+
+    def create(self, values):
+        return self.bulk_create([values])[0]
+
+    def bulk_create(self, items):
+        records = [AQIRecord(str(uuid4()), values) for values in items]
+        with self._lock:
+            state = self._state
+            seqs, ids = state.order
+            for record in records:
+                seq = self._next_seq
+                self._next_seq += 1
+                state.records[record.id] = record
+                state.seq_of[record.id] = seq
+                # ids first: a concurrent scan bounded by len(seqs) must find the id
+                ids.append(record.id)
+                seqs.append(seq)
+        return [record.to_dict() for record in records]
+
+    @staticmethod
+    def _check(record, if_match):
+        if if_match is not None and record.version not in if_match:
+            raise VersionConflictError(record.id, record.version)
+
+    def _replace(self, record_id, values, if_match=None):
+        records = self._state.records
+        record = records.get(record_id)
+        if record is None:
+            return None
+        self._check(record, if_match)
+        record = records[record_id] = AQIRecord(record_id, values, record.version + 1)
+        return record.to_dict()
+
+    def update(self, record_id, values, if_match=None):
+        """Replace a record's values; ``if_match`` is a collection of acceptable
+        current versions, and a mismatch raises VersionConflictError."""
+        with self._lock:
+            return self._replace(record_id, values, if_match)
+
+    def bulk_update(self, changes):
+        with self._lock:
+            return [self._replace(record_id, values) for record_id, values in changes]
+
+    def _remove(self, record_id, if_match=None):
+        state = self._state
+        record = state.records.get(record_id)
+        if record is None:
+            return False
+        self._check(record, if_match)
+        del state.records[record_id]
+        state.seq_of.pop(record_id, None)
+        state.tombstones += 1
+        return True
+
+    def delete(self, record_id, if_match=None):
+        with self._lock:
+            removed = self._remove(record_id, if_match)
+            self._maybe_compact()
+            return removed
+
+    def bulk_delete(self, record_ids):
+        with self._lock:
+            results = [self._remove(record_id) for record_id in record_ids]
+            self._maybe_compact()
+            return results
+
+    def _maybe_compact(self):
+        state = self._state
+        if state.tombstones <= len(state.records):
+            return
+        live = [(seq, record_id) for seq, record_id in zip(*state.order)
+                if state.seq_of.get(record_id) == seq]
+        # Swap in new lists so running scans keep iterating the old ones
+        state.order = ([seq for seq, _ in live], [record_id for _, record_id in live])
+        state.tombstones = 0
+
+    def clear(self):
+        with self._lock:
+            old, self._state = self._state, _Generation()
+        # Dropping the last reference frees every record; do it after releasing
+        # the lock so writers to the new generation are not held up
+        del old
+
+
+class SQLiteRecordStore:
+    """Record store persisted in SQLite, shareable across worker processes.
+
+    The database runs in WAL mode so readers never block the writer. Each
+    thread gets its own connection; statements are parameterised constants
+    so sqlite3's statement cache reuses the prepared form. Pollutant values
+    live in indexed REAL columns. Every write bumps the row's ``version``;
+    conditional writes check it inside the same ``BEGIN IMMEDIATE``
+    transaction, so they are atomic across worker processes too.
+    """
+
+    _COLUMNS = ', '.join(POLLUTANTS)
+    _SELECT = f'SELECT id, version, {_COLUMNS} FROM records'
+    _INSERT = (f'INSERT INTO records (id, created_at, {_COLUMNS}) '
+               f'VALUES (?, ?, {", ".join("?" * len(POLLUTANTS))})')
+    _UPDATE = (f'UPDATE records SET {", ".join(f"{p} = ?" for p in POLLUTANTS)}, version = version + 1 '
+               f'WHERE id = ? RETURNING version')
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS records (
+                    seq INTEGER PRIMARY KEY,
+                    id TEXT NOT NULL UNIQUE,
+                    created_at REAL NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 1,
+                    {", ".join(f"{p} REAL NOT NULL" for p in POLLUTANTS)}
+                )''')
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(records)')}
+            if 'version' not in columns:
+                # Databases created before records were versioned
+                conn.execute('ALTER TABLE records ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_records_created_at ON records (created_at)')
+            for pollutant in POLLUTANTS:
+                conn.execute(f'CREATE INDEX IF NOT EXISTS idx_records_{pollutant} ON records ({pollutant})')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, cached_statements=64, check_same_thread=False)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_dict(row):
+        # (id, version, *pollutants)
+        return AQIRecord(row[0], row[2:], row[1]).to_dict()
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM records').fetchone()[0]
+
+    def all(self):
+        return [record for _, record in self.scan()]
+
+    def scan(self, after=None, filters=(), limit=None, chunk_size=1000):
+        # Keyset pagination in chunks so no cursor stays open between yields
+        where, params = ['seq > ?'], []
+        for field, op, value in filters:
+            if field not in POLLUTANTS:
+                raise ValueError(f'Unknown filter field: {field}')
+            where.append(f'{field} {SQL_FILTER_OPS[op]} ?')
+            params.append(value)
+        sql = f'SELECT seq, id, version, {self._COLUMNS} FROM records WHERE {" AND ".join(where)} ORDER BY seq LIMIT ?'
+        conn = self._connect()
+        last_seq = after or 0
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            rows = conn.execute(sql, (last_seq, *params, size)).fetchall()
+            for row in rows:
+                yield row[0], self._to_dict(row[1:])
+            if len(rows) < size:
+                return
+            last_seq = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+
+    def get(self, record_id):
+        row = self._connect().execute(f'{self._SELECT} WHERE id = ?', (record_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def create(self, values):
+        return self.bulk_create([values])[0]
+
+    def bulk_create(self, items):
+        now = time.time()
+        records = [AQIRecord(str(uuid4()), values) for values in items]
+        conn = self._connect()
+        with conn:
+            conn.executemany(self._INSERT, [(r.id, now, *r.values()) for r in records])
+        return [record.to_dict() for record in records]
+
+    @staticmethod
+    def _check(conn, record_id, if_match):
+        # False when the record does not exist; raises on a version mismatch
+        if if_match is None:
+            return True
+        row = conn.execute('SELECT version FROM records WHERE id = ?', (record_id,)).fetchone()
+        if row is None:
+            return False
+        if row[0] not in if_match:
+            raise VersionConflictError(record_id, row[0])
+        return True
+
+    def _update(self, conn, record_id, values, if_match=None):
+        if not self._check(conn, record_id, if_match):
+            return None
+        row = conn.execute(self._UPDATE, (*values, record_id)).fetchone()
+        return AQIRecord(record_id, values, row[0]).to_dict() if row else None
+
+    def update(self, record_id, values, if_match=None):
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            return self._update(conn, record_id, values, if_match)
+
+    def bulk_update(self, changes):
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            return [self._update(conn, record_id, values) for record_id, values in changes]
+
+    def _delete(self, conn, record_id, if_match=None):
+        if not self._check(conn, record_id, if_match):
+            return False
+        return conn.execute('DELETE FROM records WHERE id = ?', (record_id,)).rowcount > 0
+
+    def delete(self, record_id, if_match=None):
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            return self._delete(conn, record_id, if_match)
+
+    def bulk_delete(self, record_ids):
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            return [self._delete(conn, record_id) for record_id in record_ids]
+
+    def clear(self):
+        # An unqualified DELETE is SQLite's truncate fast path; WAL readers
+        # keep their snapshot until it commits
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM records')
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def create_record_store(url):
+    # 'memory' for the in-process dict, 'sqlite:///path/to/records.db' for SQLite
+    if not url or url == 'memory':
+        return DictRecordStore()
+    if url.startswith('sqlite:///'):
+        return SQLiteRecordStore(url[len('sqlite:///'):])
+    raise ValueError(f'Unsupported record store: {url}')
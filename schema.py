@@ -0,0 +1,101 @@
+POLLUTANTS = ('pm25', 'pm10', 'o3', 'no2', 'co', 'so2')
+
+# Accepted value range per pollutant (ug/m3; CO as reported by OpenWeather)
+POLLUTANT_BOUNDS = {
+    'pm25': (0.0, 2000.0),
+    'pm10': (0.0, 5000.0),
+    'o3': (0.0, 2000.0),
+    'no2': (0.0, 2000.0),
+    'co': (0.0, 100000.0),
+    'so2': (0.0, 5000.0),
+}
+
+# Numeric strings longer than this are rejected before float() is attempted
+MAX_STRING_LENGTH = 32
+
+
+class AQIRecord:
+    """Compact stored form of an AQI record: an id, a write version and six float pollutants.
+
+    Stores never mutate a record; an update replaces it with a new one.
+    """
+
+    __slots__ = ('id', 'version') + POLLUTANTS
+
+    def __init__(self, record_id, values, version=1):
+        self.id = record_id
+        self.version = version
+        self.pm25, self.pm10, self.o3, self.no2, self.co, self.so2 = values
+
+    def values(self):
+        return self.pm25, self.pm10, self.o3, self.no2, self.co, self.so2
+
+    def to_dict(self):
+        return {'id': self.id, 'version': self.version, 'pm25': self.pm25, 'pm10': self.pm10,
+                'o3': self.o3, 'no2': self.no2, 'co': self.co, 'so2': self.so2}
+
+
+def _coerce(value):
+    kind = type(value)
+    if kind is int:
+        try:
+            return float(value)
+        except OverflowError:
+            # Too large for a float: let the range check reject it
+            return float('inf') if value > 0 else float('-inf')
+    if kind is str and len(value) <= MAX_STRING_LENGTH:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+def compile_validator(fields=POLLUTANTS, bounds=POLLUTANT_BOUNDS):
+    """Generate a validator specialised for ``fields`` and ``bounds``.
+
+    The returned function takes a decoded JSON payload and returns
+    ``(values, None)`` with the values as a tuple of floats in ``fields``
+    order, or ``(None, message)`` when the payload is rejected. The per-field
+    checks are unrolled into straight-line code so the hot path performs no
+    loops, key-set comparisons or raised exceptions for valid input.
+    """
+    n = len(fields)
+    lines = [
+        'def validate(data):',
+        '    if type(data) is not dict:',
+        "        return None, 'Payload must be a JSON object'",
+        '    try:',
+    ]
+    lines += [f'        v{i} = data[{field!r}]' for i, field in enumerate(fields)]
+    lines += [
+        '    except KeyError as e:',
+        "        return None, 'Missing field: ' + str(e.args[0])",
+        # Every required key is present, so any extra entry is an unknown field
+        f'    if len(data) != {n}:',
+        '        return None, unknown_fields(data)',
+    ]
+    for i, field in enumerate(fields):
+        low, high = bounds[field]
+        lines += [
+            f'    if type(v{i}) is not float:',
+            f'        v{i} = coerce(v{i})',
+            f'        if v{i} is None:',
+            f"            return None, 'Invalid value for {field}'",
+            f'    if not ({float(low)!r} <= v{i} <= {float(high)!r}):',
+            f"        return None, '{field} must be between {low:g} and {high:g}'",
+        ]
+    lines.append(f'    return ({", ".join(f"v{i}" for i in range(n))},), None')
+
+    allowed = frozenset(fields)
+
+    def unknown_fields(data):
+        unknown = sorted(str(k)[:MAX_STRING_LENGTH] for k in data.keys() - allowed)
+        return 'Unknown fields: ' + ', '.join(unknown[:10]) + (', ...' if len(unknown) > 10 else '')
+
+    namespace = {'coerce': _coerce, 'unknown_fields': unknown_fields}
+    exec('\n'.join(lines), namespace)
+    return namespace['validate']
+
+
+validate_record = compile_validator()
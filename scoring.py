@@ -0,0 +1,315 @@
+import csv
+import io
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from uuid import uuid4
+
+import numpy as np
+
+from aqi import classify
+from schema import POLLUTANTS
+
+# Accepted input column names per model feature, compared case-insensitively
+FEATURE_ALIASES = {
+    'pm25': ('pm2.5', 'pm25', 'pm2_5'),
+    'pm10': ('pm10',),
+    'o3': ('o3',),
+    'no2': ('no2',),
+    'co': ('co',),
+    'so2': ('so2',),
+}
+MISSING_POLICIES = ('impute', 'skip')
+
+
+class ScoringError(Exception):
+    pass
+
+
+def resolve_columns(header):
+    """Index of each model feature in a CSV header row."""
+    positions = {name.strip().lower(): i for i, name in enumerate(header)}
+    indexes, missing = [], []
+    for feature in POLLUTANTS:
+        index = next((positions[a] for a in FEATURE_ALIASES[feature] if a in positions), None)
+        if index is None:
+            missing.append(FEATURE_ALIASES[feature][0].upper())
+        indexes.append(index)
+    if missing:
+        raise ScoringError(f'Missing columns: {", ".join(missing)}')
+    return indexes
+
+
+def _float(value):
+    # Numbers and numeric strings; anything else counts as missing
+    if type(value) in (int, float):
+        try:
+            return float(value)
+        except OverflowError:
+            return np.nan
+    if type(value) is str and value.strip():
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    return np.nan
+
+
+_FLOAT32_MAX = float(np.finfo(np.float32).max)
+
+
+def _float_column(values):
+    try:
+        return np.array([v if v else 'nan' for v in values], dtype=np.float64)
+    except ValueError:
+        return np.array([_float(v) for v in values], dtype=np.float64)
+
+
+class Scorer:
+    """Scores CSV or NDJSON input chunk by chunk with one model call per chunk.
+
+    Rows with missing, non-numeric or non-finite features are filled from ``fill_values``
+    (the training means) under the ``impute`` policy; under ``skip`` they are
+    passed through with empty predictions so output rows still line up with
+    input rows. Only one chunk of rows is held in memory at a time.
+    """
+
+    def __init__(self, predict_fn, fill_values=None, missing='impute', chunk_rows=10000):
+        if missing not in MISSING_POLICIES:
+            raise ScoringError(f'missing must be one of: {", ".join(MISSING_POLICIES)}')
+        if missing == 'impute' and not fill_values:
+            raise ScoringError('The active model has no imputation values; use missing=skip')
+        self.predict_fn = predict_fn
+        self.fill = np.array([fill_values[f] for f in POLLUTANTS]) if missing == 'impute' else None
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self.scored = 0
+        self.imputed = 0
+        self.skipped = 0
+        self.errors = 0
+
+    def _predict(self, X):
+        # Returns predictions and labels, with None where a row was skipped
+        # NaN, infinities and values beyond float32 (which the model casts to) count as missing
+        missing = ~np.isfinite(X) | (np.abs(X) > _FLOAT32_MAX)
+        incomplete = missing.any(axis=1)
+        predictions = [None] * len(X)
+        labels = [None] * len(X)
+        if self.fill is not None:
+            X = np.where(missing, self.fill, X)
+            self.imputed += int(incomplete.sum())
+            rows = np.arange(len(X))
+        else:
+            self.skipped += int(incomplete.sum())
+            rows = np.flatnonzero(~incomplete)
+        if len(rows):
+            values = np.round(self.predict_fn(X[rows]), 2)
+            _, results, _ = classify(values)
+            for row, value, result in zip(rows.tolist(), values.tolist(), results):
+                predictions[row] = value
+                labels[row] = result
+        self.rows += len(X)
+        self.scored += len(rows)
+        return predictions, labels
+
+    def score_csv(self, reader, indexes, header):
+        """Yield CSV text: ``header`` plus predicted_aqi and result columns."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow([*header, 'predicted_aqi', 'result'])
+        while True:
+            rows = list(islice(reader, self.chunk_rows))
+            if not rows:
+                break
+            chunk = [row for row in rows if row]
+            if not chunk:
+                continue
+            X = np.column_stack([_float_column([row[i] if i < len(row) else '' for row in chunk])
+                                 for i in indexes])
+            predictions, labels = self._predict(X)
+            writer.writerows([*row, '' if p is None else p, label or '']
+                             for row, p, label in zip(chunk, predictions, labels))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    def score_ndjson(self, lines):
+        """Yield NDJSON text: each input object plus predicted_aqi and result.
+
+        Lines that are not JSON objects are answered with an error object in
+        their place.
+        """
+        while True:
+            chunk = []
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    item = None
+                chunk.append(item if isinstance(item, dict) else None)
+                if len(chunk) >= self.chunk_rows:
+                    break
+            if not chunk:
+                return
+            items = [item for item in chunk if item is not None]
+            X = np.array([[_float(v) for v in self._features(item)] for item in items],
+                         dtype=np.float64).reshape(-1, len(POLLUTANTS))
+            predictions, labels = self._predict(X)
+            scored = iter(zip(items, predictions, labels))
+            out = []
+            for position, item in enumerate(chunk, self.rows - len(items) + self.errors + 1):
+                if item is None:
+                    self.errors += 1
+                    out.append(json.dumps({'error': 'Invalid JSON object', 'row': position}) + '\n')
+                else:
+                    item, p, label = next(scored)
+                    out.append(json.dumps({**item, 'predicted_aqi': p, 'result': label}) + '\n')
+            yield ''.join(out)
+
+    @staticmethod
+    def _features(item):
+        lowered = {str(k).lower(): v for k, v in item.items()}
+        return [next((lowered[a] for a in FEATURE_ALIASES[f] if a in lowered), None) for f in POLLUTANTS]
+
+    def progress(self):
+        return {'rows': self.rows, 'scored': self.scored, 'imputed': self.imputed,
+                'skipped': self.skipped, 'errors': self.errors}
+
+
+def open_scoring_stream(binary, fmt, scorer):
+    """Return a generator of output text for a binary input stream.
+
+    The CSV header is read eagerly so a bad header raises ScoringError before
+    any output is produced.
+    """
+    text = io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.reader(text)
+        header = next(reader, None)
+        if not header:
+            raise ScoringError('Empty CSV upload')
+        return scorer.score_csv(reader, resolve_columns(header), header)
+    return scorer.score_ndjson(text)
+
+
+class _CountingReader(io.RawIOBase):
+    # Binary file wrapper that counts bytes consumed, for job progress
+
+    def __init__(self, f):
+        self._f = f
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = self._f.readinto(b)
+        self.bytes_read += n or 0
+        return n
+
+
+class ScoringJobs:
+    """Background scoring jobs over spooled upload files.
+
+    An upload is copied to ``directory`` in fixed-size blocks, scored on a
+    small worker pool into a result file and polled through ``get``. Job
+    state lives in this process; finished jobs beyond ``max_finished`` are
+    forgotten and their files removed, oldest first.
+    """
+
+    def __init__(self, directory, workers=2, max_finished=50, block_size=1 << 20):
+        self.directory = directory
+        self.block_size = block_size
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scoring-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _path(self, job_id, name):
+        return os.path.join(self.directory, job_id, name)
+
+    def submit(self, upload, fmt, scorer):
+        job_id = uuid4().hex
+        os.makedirs(os.path.join(self.directory, job_id))
+        input_path = self._path(job_id, 'input')
+        with open(input_path, 'wb') as f:
+            shutil.copyfileobj(upload, f, self.block_size)
+        job = {
+            'id': job_id, 'status': 'queued', 'format': fmt, 'created_at': time.time(),
+            'finished_at': None, 'bytes_total': os.path.getsize(input_path), 'bytes_read': 0,
+            'error': None, 'cancelled': False, 'scorer': scorer, 'reader': None,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._evict()
+        self._executor.submit(self._run, job)
+        return self.get(job_id)
+
+    def _run(self, job):
+        if job['cancelled']:
+            shutil.rmtree(os.path.join(self.directory, job['id']), ignore_errors=True)
+            return
+        job['status'] = 'running'
+        try:
+            with open(self._path(job['id'], 'input'), 'rb') as source, \
+                    open(self._path(job['id'], 'output'), 'w', encoding='utf-8', newline='') as output:
+                job['reader'] = reader = _CountingReader(source)
+                for text in open_scoring_stream(io.BufferedReader(reader), job['format'], job['scorer']):
+                    if job['cancelled']:
+                        job['status'] = 'cancelled'
+                        return
+                    output.write(text)
+            job['status'] = 'done'
+        except ScoringError as e:
+            job['status'], job['error'] = 'failed', str(e)
+        except Exception as e:
+            job['status'], job['error'] = 'failed', f'Scoring failed: {type(e).__name__}'
+        finally:
+            job['bytes_read'] = job['reader'].bytes_read if job['reader'] else 0
+            job['finished_at'] = time.time()
+            if job['cancelled']:
+                shutil.rmtree(os.path.join(self.directory, job['id']), ignore_errors=True)
+
+    def _evict(self):
+        finished = [j for j in self._jobs.values() if j['finished_at'] is not None]
+        finished.sort(key=lambda j: j['finished_at'])
+        for job in finished[:max(0, len(finished) - self.max_finished)]:
+            self._jobs.pop(job['id'], None)
+            shutil.rmtree(os.path.join(self.directory, job['id']), ignore_errors=True)
+
+    def get(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        bytes_read = job['reader'].bytes_read if job['reader'] else job['bytes_read']
+        total = job['bytes_total']
+        return {
+            'id': job['id'], 'status': job['status'], 'format': job['format'], 'error': job['error'],
+            'bytes_total': total, 'bytes_read': bytes_read,
+            'progress': round(min(bytes_read / total, 1.0), 4) if total else 1.0,
+            **job['scorer'].progress(),
+        }
+
+    def result_path(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None or job['status'] != 'done':
+            return None
+        return self._path(job_id, 'output')
+
+    def delete(self, job_id):
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job is None:
+            return False
+        job['cancelled'] = True
+        if job['finished_at'] is not None:
+            shutil.rmtree(os.path.join(self.directory, job_id), ignore_errors=True)
+        return True
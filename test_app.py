@@ -1,6 +1,18 @@
 import unittest
+import io
 import json
+import os
+import tempfile
+import threading
+import time
+import app as app_module
 from app import app
+from fake_openweather import FakeOpenWeatherServer
+from openweather import OpenWeatherClient
+from poller import CityPoller
+from timeseries import TimeSeriesStore
+from dataset import ColumnarDataset, ingest
+from test_dataset import write_csv
 
 class TestAQIAPI(unittest.TestCase):
 
@@ -121,6 +133,27 @@ class TestAQIAPI(unittest.TestCase):
         self.assertEqual(put_resp.status_code, 404)
         self.assertIn('error', put_resp.get_json())
 
+    def test_create_record_rejects_unknown_fields(self):
+        data = {"pm25": 10, "pm10": 20, "o3": 5, "no2": 3, "co": 0.1, "so2": 1, "admin": True}
+        response = self.client.post('/api/records', json=data)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('admin', response.get_json()['details'])
+
+    def test_huge_integer_is_rejected_not_a_server_error(self):
+        body = '{"pm25": %s, "pm10": 20, "o3": 5, "no2": 3, "co": 0.1, "so2": 1}' % ('9' * 400)
+        for path, payload in (('/api/records', body), ('/api/records/bulk', f'[{body}]'),
+                              ('/api/predict/batch', f'[{body}]')):
+            with self.subTest(path=path):
+                response = self.client.post(path, data=payload, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('pm25 must be between', response.get_data(as_text=True))
+
+    def test_create_record_coerces_numeric_strings(self):
+        data = {"pm25": "10.5", "pm10": 20, "o3": 5, "no2": 3, "co": 0.1, "so2": 1}
+        response = self.client.post('/api/records', json=data)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.get_json()['pm25'], 10.5)
+
     def test_delete_record_success(self):
         data = {
             "pm25": 10,
@@ -145,5 +178,649 @@ class TestAQIAPI(unittest.TestCase):
         self.assertEqual(del_resp.status_code, 404)
         self.assertIn('error', del_resp.get_json())
 
+    def test_record_etag_and_conditional_get(self):
+        data = {"pm25": 10, "pm10": 20, "o3": 5, "no2": 3, "co": 0.1, "so2": 1}
+        post_resp = self.client.post('/api/records', json=data)
+        self.assertEqual(post_resp.headers['ETag'], '"1"')
+        record_id = post_resp.get_json()['id']
+        get_resp = self.client.get(f'/api/records/{record_id}')
+        self.assertEqual(get_resp.get_json()['version'], 1)
+        cached = self.client.get(f'/api/records/{record_id}', headers={'If-None-Match': get_resp.headers['ETag']})
+        self.assertEqual(cached.status_code, 304)
+
+    def test_if_match_guards_put_and_delete(self):
+        data = {"pm25": 10, "pm10": 20, "o3": 5, "no2": 3, "co": 0.1, "so2": 1}
+        record_id = self.client.post('/api/records', json=data).get_json()['id']
+        put_resp = self.client.put(f'/api/records/{record_id}', json={**data, 'pm25': 11},
+                                   headers={'If-Match': '"1"'})
+        self.assertEqual(put_resp.status_code, 200)
+        self.assertEqual(put_resp.headers['ETag'], '"2"')
+
+        stale = self.client.put(f'/api/records/{record_id}', json={**data, 'pm25': 12},
+                                headers={'If-Match': '"1"'})
+        self.assertEqual(stale.status_code, 412)
+        self.assertEqual(stale.get_json()['version'], 2)
+        self.assertEqual(self.client.delete(f'/api/records/{record_id}', headers={'If-Match': '"1"'}).status_code, 412)
+        self.assertEqual(self.client.get(f'/api/records/{record_id}').get_json()['pm25'], 11)
+
+        del_resp = self.client.delete(f'/api/records/{record_id}', headers={'If-Match': put_resp.headers['ETag']})
+        self.assertEqual(del_resp.status_code, 204)
+
+class TestRecordQueries(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.client.post('/api/records/reset')
+        self.ids = []
+        for i in range(5):
+            data = {"pm25": 10 * i, "pm10": 20, "o3": 5, "no2": 3, "co": 0.1, "so2": 1}
+            self.ids.append(self.client.post('/api/records', json=data).get_json()['id'])
+
+    def test_cursor_pagination(self):
+        first = self.client.get('/api/records?limit=2')
+        self.assertEqual([r['id'] for r in first.get_json()], self.ids[:2])
+        cursor = first.headers['X-Next-Cursor']
+        second = self.client.get(f'/api/records?limit=2&after={cursor}')
+        self.assertEqual([r['id'] for r in second.get_json()], self.ids[2:4])
+        third = self.client.get(f'/api/records?limit=2&after={second.headers["X-Next-Cursor"]}')
+        self.assertEqual([r['id'] for r in third.get_json()], self.ids[4:])
+        self.assertNotIn('X-Next-Cursor', third.headers)
+
+    def test_range_filters(self):
+        response = self.client.get('/api/records?pm25_gt=10&pm25_lte=30')
+        self.assertEqual([r['pm25'] for r in response.get_json()], [20, 30])
+
+    def test_field_projection(self):
+        response = self.client.get('/api/records?fields=pm25&limit=1')
+        self.assertEqual(set(response.get_json()[0]), {'id', 'pm25'})
+
+    def test_ndjson_stream(self):
+        response = self.client.get('/api/records?format=ndjson')
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], self.ids)
+
+    def test_invalid_query(self):
+        self.assertEqual(self.client.get('/api/records?limit=abc').status_code, 400)
+        self.assertEqual(self.client.get('/api/records?pm25_gt=x').status_code, 400)
+        self.assertEqual(self.client.get('/api/records?fields=secret').status_code, 400)
+
+class TestBulkRecords(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.client.post('/api/records/reset')
+        self.row = {"pm25": 10, "pm10": 20, "o3": 5, "no2": 3, "co": 0.1, "so2": 1}
+
+    def test_bulk_create_reports_item_errors(self):
+        response = self.client.post('/api/records/bulk', json=[self.row, {"pm25": "bad"}, self.row])
+        self.assertEqual(response.status_code, 201)
+        resp_json = response.get_json()
+        self.assertEqual(len(resp_json['created']), 2)
+        self.assertEqual([e['index'] for e in resp_json['errors']], [1])
+        self.assertEqual(len(self.client.get('/api/records').get_json()), 2)
+
+    def test_bulk_create_ndjson_with_predictions(self):
+        body = '\n'.join(json.dumps(self.row) for _ in range(3))
+        response = self.client.post('/api/records/bulk?predict=true', data=body,
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        for record in response.get_json()['created']:
+            self.assertIn('predicted_aqi', record)
+
+    def test_bulk_create_ndjson_keeps_valid_lines(self):
+        body = '\n'.join([json.dumps(self.row), '{"pm25": 10,', '', json.dumps(self.row), '\xff not json'])
+        response = self.client.post('/api/records/bulk', data=body.encode('latin-1'),
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        resp_json = response.get_json()
+        self.assertEqual(len(resp_json['created']), 2)
+        self.assertEqual([e['index'] for e in resp_json['errors']], [1, 3])
+        for error in resp_json['errors']:
+            self.assertEqual(error['error'], 'Invalid input data')
+            self.assertTrue(error['details'].startswith('Invalid JSON'))
+
+    def test_bulk_ndjson_size_is_checked_while_reading(self):
+        original = app.config['MAX_BULK_SIZE']
+        app.config['MAX_BULK_SIZE'] = 2
+        try:
+            body = '\n'.join([json.dumps(self.row)] * 3 + ['not json'] * 100)
+            response = self.client.post('/api/records/bulk', data=body, content_type='application/x-ndjson')
+        finally:
+            app.config['MAX_BULK_SIZE'] = original
+        self.assertEqual(response.status_code, 413)
+
+    def test_bulk_update_and_delete(self):
+        created = self.client.post('/api/records/bulk', json=[self.row] * 2).get_json()['created']
+        ids = [r['id'] for r in created]
+        updates = [{**self.row, 'id': ids[0], 'pm25': 50}, {**self.row, 'id': 'missing'}]
+        response = self.client.put('/api/records/bulk', json=updates)
+        self.assertEqual(response.get_json()['updated'][0]['pm25'], 50)
+        self.assertEqual(response.get_json()['errors'], [{'index': 1, 'error': 'Record not found'}])
+
+        response = self.client.delete('/api/records/bulk', json={'ids': ids + ['missing']})
+        self.assertEqual(response.get_json()['deleted'], ids)
+        self.assertEqual(response.get_json()['errors'][0]['index'], 2)
+        self.assertEqual(self.client.get('/api/records').get_json(), [])
+
+    def test_bulk_all_invalid(self):
+        response = self.client.post('/api/records/bulk', json=[{"pm25": 1}])
+        self.assertEqual(response.status_code, 400)
+
+class TestBatchPredictAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.row = {
+            "pm25": 20.5,
+            "pm10": 30.1,
+            "o3": 15.2,
+            "no2": 10.3,
+            "co": 0.4,
+            "so2": 5.0
+        }
+
+    def test_batch_predict_json(self):
+        response = self.client.post('/api/predict/batch', json=[self.row] * 3)
+        self.assertEqual(response.status_code, 200)
+        resp_json = response.get_json()
+        self.assertEqual(resp_json['count'], 3)
+        self.assertEqual(len(resp_json['predictions']), 3)
+        self.assertIn('rows_per_second', resp_json)
+        for item in resp_json['predictions']:
+            self.assertIn('prediction', item)
+            self.assertTrue(item['result'].startswith('Air Quality Index is'))
+
+    def test_batch_predict_ndjson(self):
+        body = '\n'.join(json.dumps(self.row) for _ in range(2)) + '\n'
+        response = self.client.post('/api/predict/batch', data=body,
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['count'], 2)
+
+    def test_batch_predict_invalid_ndjson_line(self):
+        body = json.dumps(self.row) + '\n{"pm25":\n'
+        response = self.client.post('/api/predict/batch', data=body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['index'], 1)
+        self.assertTrue(response.get_json()['details'].startswith('Invalid JSON'))
+
+    def test_batch_predict_invalid_row(self):
+        response = self.client.post('/api/predict/batch', json=[self.row, {"pm25": "bad"}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['index'], 1)
+
+    def test_batch_predict_too_large(self):
+        original = app.config['MAX_BATCH_SIZE']
+        app.config['MAX_BATCH_SIZE'] = 2
+        try:
+            response = self.client.post('/api/predict/batch', json=[self.row] * 3)
+        finally:
+            app.config['MAX_BATCH_SIZE'] = original
+        self.assertEqual(response.status_code, 413)
+
+class TestPredictionForms(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+
+    def test_predict_manually(self):
+        form = {'PM2.5': '20.5', 'PM10': '30.1', 'O3': '15.2', 'NO2': '10.3', 'CO': '0.4', 'SO2': '5.0'}
+        response = self.client.post('/predict_manually', data=form)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Air Quality Index is', response.data)
+
+    def test_microbatch_stats_disabled_by_default(self):
+        response = self.client.get('/api/predict/microbatch/stats')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {'enabled': False})
+
+    def test_slow_microbatch_falls_back_to_inline_prediction(self):
+        gate = threading.Event()
+
+        def stalled(X):
+            gate.wait(5)
+            return app_module.predict_batch(X)
+
+        original, timeout = app_module.microbatcher, app.config['MICROBATCH_TIMEOUT_MS']
+        app_module.microbatcher = app_module.MicroBatcher(stalled, flush_window_ms=0)
+        app.config['MICROBATCH_TIMEOUT_MS'] = 50
+        try:
+            sample = [20.5, 30.1, 15.2, 10.3, 0.4, 5.0]
+            start = time.monotonic()
+            self.assertEqual(app_module.predict_one(sample), float(app_module.predict_batch([sample])[0]))
+            self.assertLess(time.monotonic() - start, 2)
+        finally:
+            gate.set()
+            app_module.microbatcher.stop(timeout=1)
+            app_module.microbatcher, app.config['MICROBATCH_TIMEOUT_MS'] = original, timeout
+
+    def test_microbatched_prediction_looks_the_cache_up_once(self):
+        original_cache, original_batcher = app_module.prediction_cache, app_module.microbatcher
+        app_module.prediction_cache = app_module.PredictionCache(maxsize=100)
+        app_module.microbatcher = app_module.MicroBatcher(app_module.predict_and_cache, flush_window_ms=0)
+        try:
+            sample = [20.5, 30.1, 15.2, 10.3, 0.4, 5.0]
+            first = app_module.predict_one(sample)
+            self.assertEqual(app_module.predict_one(sample), first)
+            stats = app_module.prediction_cache.stats()
+            self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        finally:
+            app_module.microbatcher.stop(timeout=1)
+            app_module.prediction_cache, app_module.microbatcher = original_cache, original_batcher
+
+    def test_batch_sub_index(self):
+        rows = [{'pm25': 30, 'pm10': 40, 'o3': 20, 'no2': 10, 'co': 0.5, 'so2': 5}]
+        response = self.client.post('/api/predict/batch?sub_index=true', json=rows)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['predictions'][0]['sub_index_aqi'], 50.0)
+
+    def test_prediction_cache_serves_repeated_rows(self):
+        original = app_module.prediction_cache
+        app_module.prediction_cache = app_module.PredictionCache(maxsize=100)
+        try:
+            rows = [{'pm25': 20.5, 'pm10': 30.1, 'o3': 15.2, 'no2': 10.3, 'co': 0.4, 'so2': 5.0}] * 3
+            first = self.client.post('/api/predict/batch', json=rows).get_json()
+            second = self.client.post('/api/predict/batch', json=rows).get_json()
+            self.assertEqual(first['predictions'], second['predictions'])
+            stats = self.client.get('/api/predict/cache/stats').get_json()
+            self.assertTrue(stats['enabled'])
+            self.assertEqual((stats['hits'], stats['misses']), (3, 3))
+            self.assertEqual(stats['size'], 1)
+        finally:
+            app_module.prediction_cache = original
+
+class TestDatasetAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmpdir.name, 'columns')
+        ingest(write_csv(self.tmpdir.name), path)
+        self.original = app_module.dataset
+        app_module.dataset = ColumnarDataset(path)
+
+    def tearDown(self):
+        app_module.dataset = self.original
+        self.tmpdir.cleanup()
+
+    def test_cities(self):
+        response = self.client.get('/api/dataset/cities')
+        self.assertEqual([c['city'] for c in response.get_json()], ['Chennai', 'Delhi'])
+
+    def test_city_range(self):
+        response = self.client.get('/api/dataset/cities/Delhi?start=2019-01-02&measures=aqi')
+        data = response.get_json()
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(data['rows'][0], {'date': '2019-01-02', 'aqi': 350.0, 'aqi_bucket': 'Very Poor'})
+        self.assertEqual(self.client.get('/api/dataset/cities/Atlantis').status_code, 404)
+        self.assertEqual(self.client.get('/api/dataset/cities/Delhi?start=yesterday').status_code, 400)
+        self.assertEqual(self.client.get('/api/dataset/cities/Delhi?measures=radon').status_code, 400)
+
+    def test_aggregates(self):
+        data = self.client.get('/api/dataset/aggregates?measure=pm25&city=Delhi').get_json()
+        self.assertEqual(data, {'measure': 'pm25', 'count': 2, 'mean': 175.0, 'min': 150.0, 'max': 200.0})
+        data = self.client.get('/api/dataset/aggregates?by=city').get_json()
+        self.assertEqual(len(data['cities']), 2)
+
+    def test_worst(self):
+        data = self.client.get('/api/dataset/worst?n=1').get_json()
+        self.assertEqual(data['rows'], [{'city': 'Delhi', 'date': '2019-01-02', 'aqi': 350.0}])
+        self.assertEqual(self.client.get('/api/dataset/worst?n=0').status_code, 400)
+
+    def test_not_ingested(self):
+        app_module.dataset = None
+        original_path = app.config['DATASET_PATH']
+        app.config['DATASET_PATH'] = os.path.join(self.tmpdir.name, 'missing')
+        try:
+            self.assertEqual(self.client.get('/api/dataset/worst').status_code, 503)
+        finally:
+            app.config['DATASET_PATH'] = original_path
+
+class TestScoringAPI(unittest.TestCase):
+
+    CSV = 'City,PM2.5,PM10,O3,NO2,CO,SO2\nDelhi,100,200,30,40,1.2,10\nDelhi,,200,30,40,1.2,10\n'
+
+    def setUp(self):
+        self.client = app.test_client()
+
+    def test_streams_scored_csv(self):
+        response = self.client.post('/api/score?missing=skip', data=self.CSV, content_type='text/csv')
+        self.assertEqual(response.status_code, 200)
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual(lines[0], 'City,PM2.5,PM10,O3,NO2,CO,SO2,predicted_aqi,result')
+        self.assertIn('Air Quality Index is', lines[1])
+        self.assertTrue(lines[2].endswith(',,'))
+
+    def test_streams_scored_ndjson(self):
+        body = json.dumps({'pm25': 20.5, 'pm10': 30.1, 'o3': 15.2, 'no2': 10.3, 'co': 0.4, 'so2': 5.0}) + '\n'
+        response = self.client.post('/api/score?missing=skip', data=body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('predicted_aqi', json.loads(response.get_data(as_text=True)))
+
+    def test_rejects_missing_columns(self):
+        response = self.client.post('/api/score', data='a,b\n1,2\n', content_type='text/csv')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/score?format=xml', data=self.CSV, content_type='text/csv')
+        self.assertEqual(response.status_code, 400)
+
+    def test_background_job(self):
+        response = self.client.post('/api/score/jobs?missing=skip',
+                                    data={'file': (io.BytesIO(self.CSV.encode()), 'export.csv')})
+        self.assertEqual(response.status_code, 202)
+        status_url = response.headers['Location']
+        deadline = time.monotonic() + 10
+        job = response.get_json()
+        while job['status'] in ('queued', 'running') and time.monotonic() < deadline:
+            time.sleep(0.02)
+            job = self.client.get(status_url).get_json()
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual((job['rows'], job['scored'], job['skipped']), (2, 1, 1))
+        result = self.client.get(status_url + '/result')
+        self.assertEqual(result.status_code, 200)
+        self.assertIn('predicted_aqi', result.get_data(as_text=True))
+        self.assertEqual(self.client.delete(status_url).status_code, 204)
+        self.assertEqual(self.client.get(status_url).status_code, 404)
+
+class TestChartAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmpdir.name, 'columns')
+        ingest(write_csv(self.tmpdir.name), path)
+        self.original = app_module.dataset
+        app_module.dataset = ColumnarDataset(path)
+        self.client.post('/api/records/reset')
+        self.wait = app.config['CHART_WAIT_SECONDS']
+        app.config['CHART_WAIT_SECONDS'] = 10.0
+
+    def tearDown(self):
+        app_module.dataset = self.original
+        app.config['CHART_WAIT_SECONDS'] = self.wait
+        self.tmpdir.cleanup()
+
+    def test_pollutant_chart_and_conditional_get(self):
+        response = self.client.get('/charts/pollutants/pm10.png?city=Delhi')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'image/png')
+        etag = response.headers['ETag']
+        response = self.client.get('/charts/pollutants/pm10.png?city=Delhi', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get('/charts/pollutants/radon.png').status_code, 404)
+
+    def test_heatmap_changes_with_records(self):
+        first = self.client.get('/charts/heatmap.png')
+        self.assertEqual(first.status_code, 200)
+        self.client.post('/api/records/bulk', json=[
+            {'pm25': v, 'pm10': 2 * v, 'o3': 10, 'no2': v / 2, 'co': 1, 'so2': 3} for v in (10.0, 20.0, 40.0)])
+        second = self.client.get('/charts/heatmap.png')
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(first.headers['ETag'], second.headers['ETag'])
+
+    def test_failed_render_answers_500(self):
+        original = app_module.render_scatter
+        app_module.render_scatter = lambda *args: 1 / 0
+        try:
+            with self.assertLogs('charts', 'ERROR'):
+                response = self.client.get('/charts/pollutants/co.png?start=2019-01-03')
+        finally:
+            app_module.render_scatter = original
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.get_json(), {'error': 'Failed to render chart'})
+
+    def test_cold_chart_is_rendered_in_the_background(self):
+        app.config['CHART_WAIT_SECONDS'] = 0
+        url = '/charts/pollutants/so2.png?start=2019-01-02'
+        response = self.client.get(url)
+        if response.status_code == 202:
+            self.assertEqual(response.headers['Retry-After'], '1')
+        deadline = time.monotonic() + 10
+        while response.status_code == 202 and time.monotonic() < deadline:
+            time.sleep(0.05)
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_falls_back_to_static_images(self):
+        app_module.dataset = None
+        original_path = app.config['DATASET_PATH']
+        app.config['DATASET_PATH'] = os.path.join(self.tmpdir.name, 'missing')
+        try:
+            response = self.client.get('/charts/pollutants/co.png')
+            self.assertEqual(response.status_code, 302)
+            self.assertTrue(response.headers['Location'].endswith('/static/AQI_CO.png'))
+            self.assertEqual(self.client.get('/charts/heatmap.png').status_code, 302)
+        finally:
+            app.config['DATASET_PATH'] = original_path
+
+    def test_heatmap_page(self):
+        response = self.client.get('/heatmap?city=Delhi')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'/charts/heatmap.png?city=Delhi', response.data)
+
+class TestModelAdmin(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.original_token = app.config['ADMIN_TOKEN']
+        app.config['ADMIN_TOKEN'] = 'secret'
+        self.client.environ_base['HTTP_X_ADMIN_TOKEN'] = 'secret'
+
+    def tearDown(self):
+        app.config['ADMIN_TOKEN'] = self.original_token
+
+    def test_list_models(self):
+        response = self.client.get('/api/admin/models')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['active']['version'], app_module.model_registry.active.version)
+        self.assertIsInstance(data['versions'], list)
+
+    def test_activate_unknown_version(self):
+        response = self.client.post('/api/admin/models/activate', json={'version': 'no-such-version'})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post('/api/admin/models/activate', json={})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/admin/models/activate', json=['v1'])
+        self.assertEqual(response.status_code, 400)
+
+    def test_candidate_requires_valid_input(self):
+        response = self.client.put('/api/admin/models/candidate', json={'fraction': 0.5})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.put('/api/admin/models/candidate', json='v1')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.put('/api/admin/models/candidate', json={'version': 'no-such-version'})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/api/admin/models/candidate')
+        self.assertEqual(response.get_json(), {'candidate': None})
+
+    def test_admin_token(self):
+        del self.client.environ_base['HTTP_X_ADMIN_TOKEN']
+        self.assertEqual(self.client.get('/api/admin/models').status_code, 403)
+        response = self.client.get('/api/admin/models', headers={'X-Admin-Token': 'wrong'})
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get('/api/admin/models', headers={'X-Admin-Token': 'secret'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_admin_disabled_without_a_configured_token(self):
+        app.config['ADMIN_TOKEN'] = None
+        self.assertEqual(self.client.get('/api/admin/models').status_code, 403)
+        response = self.client.post('/api/admin/models/activate', json={'version': 'v1'})
+        self.assertEqual(response.status_code, 403)
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+
+    def test_metrics_count_requests_by_route(self):
+        self.client.post('/api/records/reset')
+        self.client.post('/api/predict/batch', json=[{
+            'pm25': 10, 'pm10': 20, 'o3': 5, 'no2': 3, 'co': 0.1, 'so2': 2}])
+        self.client.get('/api/records/missing-id')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        text = response.get_data(as_text=True)
+        self.assertIn('aqi_http_requests_total{method="GET",route="/api/records/<record_id>",status="404"}', text)
+        self.assertIn('aqi_http_request_duration_seconds_count{method="POST",route="/api/predict/batch"}', text)
+        self.assertIn('aqi_stage_duration_seconds_count{stage="inference"}', text)
+        self.assertIn('aqi_records 0', text)
+        self.assertIn('aqi_cache_hits_total{cache="geocode"}', text)
+        self.assertIn('# TYPE aqi_upstream_calls_total counter', text)
+        self.assertIn('# TYPE aqi_cache_entries gauge', text)
+
+    def test_unhandled_exceptions_are_counted_as_500(self):
+        class BrokenStore:
+            def get(self, record_id):
+                raise RuntimeError('store unavailable')
+
+        line = 'aqi_http_requests_total{method="GET",route="/api/records/<record_id>",status="500"}'
+
+        def count():
+            for row in self.client.get('/metrics').get_data(as_text=True).splitlines():
+                if row.startswith(line):
+                    return float(row.split()[-1])
+            return 0.0
+
+        before = count()
+        original_store = app_module.record_store
+        original_propagate = app.config['PROPAGATE_EXCEPTIONS']
+        app_module.record_store = BrokenStore()
+        app.config['PROPAGATE_EXCEPTIONS'] = True
+        try:
+            with self.assertRaises(RuntimeError):
+                self.client.get('/api/records/some-id')
+        finally:
+            app_module.record_store = original_store
+            app.config['PROPAGATE_EXCEPTIONS'] = original_propagate
+        self.assertEqual(count(), before + 1)
+
+    def test_server_timing_header_lists_stages(self):
+        response = self.client.post('/api/predict/batch', json=[{
+            'pm25': 10, 'pm10': 20, 'o3': 5, 'no2': 3, 'co': 0.1, 'so2': 2}])
+        timing = response.headers['Server-Timing']
+        self.assertIn('inference;dur=', timing)
+        self.assertIn('serialization;dur=', timing)
+        self.assertIn('total;dur=', timing)
+        self.assertIn('template;dur=', self.client.get('/').headers['Server-Timing'])
+
+class TestPredictAutomatically(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeOpenWeatherServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.original_weather = app_module.weather
+        app_module.weather = OpenWeatherClient('test-key', base_url=self.server.url)
+
+    def tearDown(self):
+        app_module.weather = self.original_weather
+
+    def test_predict_city(self):
+        response = self.client.post('/predict_automatically', data={'city_name': 'Delhi'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Air Quality Index is', response.data)
+
+    def test_city_not_found(self):
+        self.server.unknown_cities.add('atlantis')
+        response = self.client.post('/predict_automatically', data={'city_name': 'Atlantis'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_missing_city(self):
+        response = self.client.post('/predict_automatically', data={})
+        self.assertEqual(response.status_code, 400)
+
+    def test_predict_many_cities(self):
+        self.server.unknown_cities.add('atlantis')
+        cities = ['Delhi', 'Atlantis', 'Mumbai']
+        response = self.client.post('/api/predict/cities', json={'cities': cities})
+        self.assertEqual(response.status_code, 200)
+        resp_json = response.get_json()
+        self.assertEqual([item['city'] for item in resp_json['results']], cities)
+        self.assertEqual(resp_json['failed'], 1)
+        self.assertEqual(resp_json['results'][1]['error_code'], 404)
+        self.assertIn('prediction', resp_json['results'][0])
+        self.assertIn('prediction', resp_json['results'][2])
+
+    def test_predict_many_cities_invalid(self):
+        response = self.client.post('/api/predict/cities', json={'cities': []})
+        self.assertEqual(response.status_code, 400)
+
+
+class TestHistoryAPI(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeOpenWeatherServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.server.calls.clear()
+        self.original_weather = app_module.weather
+        self.original_store = app_module.history_store
+        app_module.weather = OpenWeatherClient('test-key', base_url=self.server.url)
+        app_module.history_store = TimeSeriesStore()
+        self.poller = CityPoller(lambda: app_module.weather, app_module.predict_batch,
+                                 app_module.history_store, ['Delhi', 'Mumbai'], spread=0.0, rate=1000.0)
+
+    def tearDown(self):
+        app_module.weather = self.original_weather
+        app_module.history_store = self.original_store
+
+    def test_form_answers_from_fresh_reading(self):
+        self.poller.poll_once()
+        calls = sum(self.server.calls.values())
+        response = self.client.post('/predict_automatically', data={'city_name': 'delhi'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Air Quality Index is', response.data)
+        self.assertEqual(sum(self.server.calls.values()), calls)
+
+    def test_stale_reading_falls_back_to_lookup(self):
+        app_module.history_store.append('Delhi', time.time() - app.config['POLL_MAX_AGE'] - 1,
+                                        [1, 2, 3, 4, 0.1, 5], 42.0)
+        response = self.client.post('/predict_automatically', data={'city_name': 'Delhi'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.calls['/data/2.5/air_pollution'], 1)
+
+    def test_history_without_upstream_calls(self):
+        self.poller.poll_once()
+        self.poller.poll_once()
+        calls = sum(self.server.calls.values())
+        response = self.client.get('/api/history/Mumbai?resolution=raw')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['count'], 2)
+        point = data['points'][0]
+        self.assertIn('result', point)
+        self.assertEqual(point['pm25'], self.server.components['pm2_5'])
+        self.assertEqual(data['latest']['timestamp'], data['points'][-1]['timestamp'])
+        rollup = self.client.get('/api/history/Mumbai?start=2020-01-01').get_json()
+        self.assertEqual(rollup['resolution'], 'rollup')
+        self.assertEqual(rollup['points'][0]['count'], 2)
+        self.assertEqual(sum(self.server.calls.values()), calls)
+
+    def test_history_listing(self):
+        self.poller.poll_once()
+        data = self.client.get('/api/history').get_json()
+        self.assertEqual(sorted(c['city'] for c in data['cities']), ['Delhi', 'Mumbai'])
+        self.assertIn('rounds', data['poller'])
+
+    def test_history_errors(self):
+        self.assertEqual(self.client.get('/api/history/Atlantis').status_code, 404)
+        self.poller.poll_once()
+        self.assertEqual(self.client.get('/api/history/Delhi?resolution=daily').status_code, 400)
+        self.assertEqual(self.client.get('/api/history/Delhi?start=yesterday').status_code, 400)
+
 if __name__ == '__main__':
     unittest.main()
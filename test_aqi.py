@@ -0,0 +1,64 @@
+import unittest
+
+import numpy as np
+
+from aqi import BUCKET_EDGES, CONCLUSIONS, RESULTS, bucketize, classify, compute_aqi, determine_air_quality, sub_index
+
+
+class TestBucketing(unittest.TestCase):
+
+    def test_boundaries_have_no_gaps(self):
+        values = [0, 49.9, 50, 50.5, 100, 100.5, 200, 250.2, 300.5, 400, 400.1, 1000]
+        np.testing.assert_array_equal(bucketize(values), [0, 0, 0, 1, 1, 2, 2, 3, 4, 4, 5, 5])
+
+    def test_classify_returns_labels(self):
+        codes, results, conclusions = classify(np.array([10.0, 150.0, 450.0]))
+        self.assertEqual(codes.tolist(), [0, 2, 5])
+        self.assertEqual(list(results), [RESULTS[0], RESULTS[2], RESULTS[5]])
+        self.assertEqual(conclusions[1], CONCLUSIONS[2])
+
+    def test_scalar_matches_vectorized(self):
+        values = np.linspace(0, 600, 2401)
+        codes = bucketize(values)
+        for value, code in zip(values.tolist(), codes.tolist()):
+            self.assertEqual(determine_air_quality(value), (RESULTS[code], CONCLUSIONS[code]))
+        self.assertEqual(determine_air_quality(50.5)[0], 'Air Quality Index is Satisfactory')
+        self.assertEqual(determine_air_quality(100.5)[0], 'Air Quality Index is Moderately Polluted')
+
+    def test_scalar_matches_vectorized_on_edges(self):
+        values = [edge + offset for edge in [0.0, *BUCKET_EDGES.tolist()] for offset in (-0.01, 0.0, 0.01)]
+        _, results, conclusions = classify(values)
+        for value, result, conclusion in zip(values, results, conclusions):
+            self.assertEqual(determine_air_quality(value), (result, conclusion))
+
+    def test_non_finite_values_are_rejected(self):
+        for value in (float('nan'), float('inf'), float('-inf'), np.float64('nan')):
+            with self.assertRaises(ValueError):
+                determine_air_quality(value)
+            with self.assertRaises(ValueError):
+                classify([10.0, value])
+
+
+
+class TestSubIndex(unittest.TestCase):
+
+    def test_breakpoints_map_to_category_edges(self):
+        np.testing.assert_allclose(sub_index('pm25', [0, 30, 60, 90, 120, 250]), [0, 50, 100, 200, 300, 400])
+        np.testing.assert_allclose(sub_index('co', [1.0, 10.0]), [50, 200])
+
+    def test_interpolates_and_extends_severe(self):
+        np.testing.assert_allclose(sub_index('pm10', [75, 470]), [75, 450])
+        np.testing.assert_allclose(sub_index('pm25', [510]), [600])
+
+    def test_compute_aqi_takes_max_sub_index(self):
+        X = np.array([
+            [30.0, 40.0, 20.0, 10.0, 0.5, 5.0],     # PM2.5 dominates at 50
+            [10.0, 300.0, 20.0, 10.0, 0.5, 5.0],    # PM10 dominates at 250
+            [np.nan, np.nan, np.nan, 80.0, np.nan, np.nan],
+        ])
+        np.testing.assert_allclose(compute_aqi(X), [50, 250, 100])
+        self.assertTrue(np.isnan(compute_aqi(np.full((1, 6), np.nan))[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import asyncio
+import io
+import time
+import unittest
+
+import httpx
+
+import app as app_module
+from asgi import AsyncCityLookups, build_environ, city_names
+from fake_openweather import FakeOpenWeatherServer
+from openweather import OpenWeatherClient
+from timeseries import TimeSeriesStore
+
+
+class AsyncOnlyClient(OpenWeatherClient):
+    # Fails the test if a route falls back to a blocking lookup
+
+    def city_components(self, city_name):
+        raise AssertionError('blocking lookup')
+
+    def many_city_components(self, city_names, concurrency=20):
+        raise AssertionError('blocking lookup')
+
+
+class BrokenAsyncClient(OpenWeatherClient):
+    # Async lookups fail unexpectedly; the blocking path still works
+
+    async def many_city_components_async(self, city_names, client, concurrency=20):
+        raise RuntimeError('event loop lookup failed')
+
+
+class TestBuildEnviron(unittest.TestCase):
+
+    def test_scope_to_environ(self):
+        scope = {'type': 'http', 'method': 'POST', 'path': '/api/x', 'root_path': '', 'http_version': '1.1',
+                 'query_string': b'a=1', 'server': ('example.org', 8000), 'client': ('10.0.0.1', 1234),
+                 'headers': [(b'content-type', b'application/json'), (b'x-tag', b'a'), (b'x-tag', b'b')]}
+        environ = build_environ(scope, io.BytesIO(b'{}'))
+        self.assertEqual((environ['PATH_INFO'], environ['QUERY_STRING']), ('/api/x', 'a=1'))
+        self.assertEqual((environ['SERVER_NAME'], environ['SERVER_PORT']), ('example.org', '8000'))
+        self.assertEqual(environ['CONTENT_TYPE'], 'application/json')
+        self.assertEqual(environ['HTTP_X_TAG'], 'a,b')
+        self.assertEqual(environ['REMOTE_ADDR'], '10.0.0.1')
+
+
+class TestCityNames(unittest.TestCase):
+
+    def test_form_and_json_bodies(self):
+        content_type = 'application/x-www-form-urlencoded'
+        self.assertEqual(city_names('form', b'city_name=New+Delhi', content_type), ['New Delhi'])
+        self.assertEqual(city_names('json', b'{"cities": ["A", "B", "A"]}', 'application/json'), ['A', 'B'])
+
+    def test_invalid_bodies_are_left_to_the_route(self):
+        self.assertIsNone(city_names('form', b'city_name=', 'application/x-www-form-urlencoded'))
+        self.assertIsNone(city_names('form', b'--x', 'multipart/form-data; boundary=x'))
+        self.assertIsNone(city_names('json', b'{"cities": "Delhi"}', 'application/json'))
+        self.assertIsNone(city_names('json', b'not json', 'application/json'))
+
+
+class TestAsyncCityLookups(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeOpenWeatherServer(latency=0.2).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.original_weather = app_module.weather
+        app_module.weather = AsyncOnlyClient('test-key', base_url=self.server.url, pollution_ttl=0)
+        self.application = AsyncCityLookups(app_module.app, threads=2)
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=self.application),
+                                        base_url='http://testserver')
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        if self.application.client is not None:
+            await self.application.client.aclose()
+
+    def tearDown(self):
+        app_module.weather = self.original_weather
+        self.application.executor.shutdown()
+
+    async def test_city_form_is_answered_from_async_lookups(self):
+        response = await self.client.post('/predict_automatically', data={'city_name': 'Delhi'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Air Quality Index is', response.text)
+
+    async def test_fresh_polled_reading_skips_the_lookup(self):
+        original_store = app_module.history_store
+        app_module.history_store = TimeSeriesStore()
+        app_module.history_store.append('Delhi', time.time(), [1, 2, 3, 4, 0.1, 5], 42.0)
+        calls = sum(self.server.calls.values())
+        try:
+            response = await self.client.post('/predict_automatically', data={'city_name': 'Delhi'})
+        finally:
+            app_module.history_store = original_store
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('42.0', response.text)
+        self.assertEqual(sum(self.server.calls.values()), calls)
+
+    async def test_unknown_city_keeps_the_error_page(self):
+        self.server.unknown_cities.add('atlantis')
+        response = await self.client.post('/predict_automatically', data={'city_name': 'Atlantis'})
+        self.assertEqual(response.status_code, 404)
+
+    async def test_many_cities(self):
+        self.server.unknown_cities.add('atlantis')
+        cities = ['Delhi', 'Atlantis', 'Mumbai']
+        response = await self.client.post('/api/predict/cities', json={'cities': cities})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['city'] for item in response.json()['results']], cities)
+        self.assertEqual(response.json()['failed'], 1)
+
+    async def test_invalid_input_and_other_routes_go_to_flask(self):
+        response = await self.client.post('/api/predict/cities', json={'cities': 'Delhi'})
+        self.assertEqual(response.status_code, 400)
+        response = await self.client.post('/predict_automatically', data={})
+        self.assertEqual(response.status_code, 400)
+        response = await self.client.get('/api/predict/cache/stats')
+        self.assertEqual(response.status_code, 200)
+
+    async def test_streamed_responses_arrive_whole(self):
+        await self.client.post('/api/records/reset')
+        for i in range(3):
+            await self.client.post('/api/records', json={'pm25': i, 'pm10': 1, 'o3': 1, 'no2': 1, 'co': 1, 'so2': 1})
+        response = await self.client.get('/api/records?format=ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['content-type'], 'application/x-ndjson')
+        self.assertEqual(len(response.text.splitlines()), 3)
+        await self.client.post('/api/records/reset')
+
+    async def test_unexpected_lookup_error_falls_back_to_the_route(self):
+        app_module.weather = BrokenAsyncClient('test-key', base_url=self.server.url, pollution_ttl=0)
+        with self.assertLogs('asgi', 'ERROR'):
+            response = await self.client.post('/predict_automatically', data={'city_name': 'Delhi'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Air Quality Index is', response.text)
+
+    async def test_lookups_do_not_hold_worker_threads(self):
+        # 20 requests of two 0.2 s upstream calls on 2 threads would take
+        # about 4 s if each request held a thread for its lookups
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(
+            self.client.post('/predict_automatically', data={'city_name': f'City {i}'}) for i in range(20)))
+        elapsed = time.perf_counter() - start
+        self.assertEqual({response.status_code for response in responses}, {200})
+        self.assertLess(elapsed, 2.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
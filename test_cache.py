@@ -0,0 +1,81 @@
+import threading
+import time
+import unittest
+
+from cache import TTLCache
+from fake_clock import FakeClock
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_entries_expire_after_ttl(self):
+        clock = FakeClock()
+        cache = TTLCache(maxsize=4, ttl=10, clock=clock)
+        cache.set('a', 1)
+        clock.now = 9
+        self.assertEqual(cache.get('a'), 1)
+        clock.now = 10
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = TTLCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_hit_and_miss_counters(self):
+        cache = TTLCache()
+        cache.get_or_load('k', lambda: 'v')
+        cache.get_or_load('k', lambda: 'other')
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['hit_ratio'], 0.5)
+
+    def test_get_many_and_set_many(self):
+        cache = TTLCache(maxsize=4)
+        cache.set_many([('a', 1), ('b', 2)])
+        self.assertEqual(cache.get_many(['a', 'x', 'b']), [1, None, 2])
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_concurrent_loads_are_coalesced(self):
+        cache = TTLCache()
+        calls = []
+        release = threading.Event()
+
+        def loader():
+            calls.append(1)
+            release.wait(1)
+            return 42
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_load('k', loader)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [42] * 8)
+        self.assertEqual(cache.stats()['coalesced'], 7)
+
+    def test_loader_errors_are_not_cached(self):
+        cache = TTLCache()
+
+        def failing():
+            raise ValueError('upstream down')
+
+        with self.assertRaises(ValueError):
+            cache.get_or_load('k', failing)
+        self.assertEqual(cache.get_or_load('k', lambda: 'ok'), 'ok')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import threading
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from charts import ChartRenderError, ChartRenderer, IncrementalCorrelation, render_heatmap, render_scatter
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+class TestIncrementalCorrelation(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        X = rng.normal(size=(500, 4))
+        X[:, 1] += X[:, 0]
+        X[rng.random(X.shape) < 0.1] = np.nan
+        self.X = X
+
+    def test_matches_pandas_pairwise_correlation(self):
+        expected = pd.DataFrame(self.X).corr().to_numpy()
+        np.testing.assert_allclose(IncrementalCorrelation(4).add(self.X).matrix(), expected, atol=1e-9)
+
+    def test_chunks_merge_and_remove(self):
+        expected = IncrementalCorrelation(4).add(self.X).matrix()
+        chunked = IncrementalCorrelation(4).add(self.X[:200]).merge(IncrementalCorrelation(4).add(self.X[200:]))
+        np.testing.assert_allclose(chunked.matrix(), expected, atol=1e-9)
+        extra = np.ones((10, 4)) * 1000
+        accumulator = IncrementalCorrelation(4).add(self.X).add(extra).remove(extra)
+        np.testing.assert_allclose(accumulator.matrix(), expected, atol=1e-6)
+
+    def test_too_few_pairs_is_nan(self):
+        matrix = IncrementalCorrelation(2).add([[1.0, np.nan], [2.0, 3.0]]).matrix()
+        self.assertTrue(np.isnan(matrix[0, 1]))
+
+
+class TestRendering(unittest.TestCase):
+
+    def test_renders_png(self):
+        self.assertTrue(render_heatmap(np.eye(3), ['a', 'b', 'c'], 'Correlation').startswith(PNG_SIGNATURE))
+        self.assertTrue(render_scatter([1, 2, 3], [3, 2, 1], 'x', 'y', 'Scatter').startswith(PNG_SIGNATURE))
+
+    def test_renderer_caches_and_shares_cold_renders(self):
+        renderer = ChartRenderer()
+        release = threading.Event()
+        calls = []
+
+        def render():
+            calls.append(1)
+            release.wait(5)
+            return b'png'
+
+        self.assertEqual(renderer.get('k', render, wait=0), (None, 'k'))
+        self.assertEqual(renderer.get('k', render, wait=0), (None, 'k'))
+        release.set()
+        self.assertEqual(renderer.get('k', render, wait=5), (b'png', 'k'))
+        self.assertEqual(renderer.get('k', render), (b'png', 'k'))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(renderer.stats()['renders'], 1)
+
+    def test_failed_render_is_remembered(self):
+        renderer = ChartRenderer(error_ttl=60)
+        calls = []
+
+        def render():
+            calls.append(1)
+            raise RuntimeError('no backend')
+
+        with self.assertLogs('charts', 'ERROR'):
+            with self.assertRaises(ChartRenderError):
+                renderer.get('k', render, wait=5)
+        with self.assertRaises(ChartRenderError):
+            renderer.get('k', render, wait=5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(renderer.stats()['render_errors'], 1)
+        self.assertEqual(renderer.stats()['rendering'], 0)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from dataset import ColumnarDataset, DatasetNotFoundError, ingest
+
+HEADER = 'City,Date,PM2.5,PM10,NO,NO2,NOx,NH3,CO,SO2,O3,Benzene,Toluene,Xylene,AQI,AQI_Bucket\n'
+ROWS = [
+    'Delhi,02-01-2019,200,300,1,50,60,10,2,10,40,1,1,1,350,Very Poor',
+    'Chennai,01-01-2019,30,40,1,10,12,5,0.5,5,20,0,0,0,60,Satisfactory',
+    'Delhi,01-01-2019,150,250,1,40,50,10,1.5,9,35,1,1,1,,',
+    'Delhi,03-01-2019,,280,1,45,55,10,1.8,11,38,1,1,1,310,Very Poor',
+    'Chennai,02-01-2019,35,45,1,11,13,5,0.6,6,22,0,0,0,70,Satisfactory',
+]
+
+
+def write_csv(directory, rows=ROWS):
+    path = os.path.join(directory, 'city_day.csv')
+    with open(path, 'w') as f:
+        f.write(HEADER + '\n'.join(rows) + '\n')
+    return path
+
+
+class TestColumnarDataset(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'columns')
+        ingest(write_csv(self.tmpdir.name), self.path)
+        self.dataset = ColumnarDataset(self.path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_sorted_by_city_and_date_with_offsets(self):
+        self.assertEqual(self.dataset.cities, ['Chennai', 'Delhi'])
+        self.assertEqual(self.dataset.meta['city_offsets'], [[0, 2], [2, 5]])
+        self.assertEqual(self.dataset.column('date').dtype, np.dtype('datetime64[D]'))
+        self.assertIsInstance(self.dataset.column('pm25'), np.memmap)
+        summaries = self.dataset.city_summaries()
+        self.assertEqual(summaries[1], {'city': 'Delhi', 'rows': 3, 'first_date': '2019-01-01',
+                                        'last_date': '2019-01-03'})
+
+    def test_city_range(self):
+        rows = self.dataset.city_range('delhi', start='2019-01-02', measures=('pm25', 'aqi'))
+        self.assertEqual(rows, [
+            {'date': '2019-01-02', 'pm25': 200.0, 'aqi': 350.0, 'aqi_bucket': 'Very Poor'},
+            {'date': '2019-01-03', 'pm25': None, 'aqi': 310.0, 'aqi_bucket': 'Very Poor'},
+        ])
+        self.assertEqual(len(self.dataset.city_range('Delhi', end='2019-01-01')), 1)
+        self.assertEqual(self.dataset.city_range('Delhi', start='2019-02-01'), [])
+        with self.assertRaises(KeyError):
+            self.dataset.city_range('Atlantis')
+
+    def test_aggregate(self):
+        self.assertEqual(self.dataset.aggregate('pm25', 'Delhi'), {'count': 2, 'mean': 175.0, 'min': 150.0, 'max': 200.0})
+        self.assertEqual(self.dataset.aggregate('aqi', start='2019-01-02')['count'], 3)
+        by_city = self.dataset.aggregate('aqi', by_city=True)
+        self.assertEqual([c['city'] for c in by_city], ['Chennai', 'Delhi'])
+        self.assertEqual(by_city[0]['mean'], 65.0)
+
+    def test_worst(self):
+        rows = self.dataset.worst('aqi', n=2)
+        self.assertEqual([(r['city'], r['date'], r['aqi']) for r in rows],
+                         [('Delhi', '2019-01-02', 350.0), ('Delhi', '2019-01-03', 310.0)])
+        self.assertEqual(self.dataset.worst('aqi', n=5, city='Chennai')[0]['aqi'], 70.0)
+
+    def test_missing_dataset(self):
+        with self.assertRaises(DatasetNotFoundError):
+            ColumnarDataset(os.path.join(self.tmpdir.name, 'nope'))
+
+
+if __name__ == '__main__':
+    unittest.main()
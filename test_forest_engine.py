@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+from forest_engine import CompiledForest
+
+
+class TestCompiledForest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(0)
+        X = rng.uniform(0, 300, size=(500, 6))
+        y = X[:, 0] * 1.5 + X[:, 1] * 0.5 + rng.normal(0, 5, size=500)
+        cls.model = RandomForestRegressor(n_estimators=20, max_depth=8, random_state=0).fit(X, y)
+        cls.engine = CompiledForest.from_sklearn(cls.model)
+        cls.X = rng.uniform(0, 300, size=(3000, 6))
+
+    def test_single_row_matches_sklearn(self):
+        row = self.X[:1]
+        np.testing.assert_allclose(self.engine.predict(row), self.model.predict(row), rtol=1e-9)
+
+    def test_batch_matches_sklearn(self):
+        # Larger than one chunk so the chunked path is covered too
+        np.testing.assert_allclose(self.engine.predict(self.X), self.model.predict(self.X), rtol=1e-9)
+
+    def test_thresholds_compare_like_sklearn(self):
+        # Inputs sitting exactly on split thresholds must take the same branch
+        thresholds = self.engine.threshold[~self.engine.is_leaf][:50]
+        X = np.repeat(thresholds[:, None], 6, axis=1)
+        np.testing.assert_allclose(self.engine.predict(X), self.model.predict(X), rtol=1e-9)
+
+    def test_save_and_memory_mapped_load(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'model.forest')
+            self.engine.save(path)
+            loaded = CompiledForest.load(path, mmap_mode='r')
+            self.assertIsInstance(loaded.threshold, np.memmap)
+            self.assertFalse(loaded.threshold.flags.writeable)
+            np.testing.assert_array_equal(loaded.predict(self.X[:100]), self.engine.predict(self.X[:100]))
+
+    def test_empty_input(self):
+        self.assertEqual(len(self.engine.predict(np.empty((0, 6)))), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
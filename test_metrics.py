@@ -0,0 +1,80 @@
+import unittest
+
+from metrics import CallbackCounter, Counter, Gauge, Histogram, Registry, begin_request, end_request, server_timing, stage
+
+
+class TestMetricTypes(unittest.TestCase):
+
+    def test_counter_renders_labelled_series(self):
+        counter = Counter('requests_total', 'Requests', ('route', 'status'))
+        counter.inc('/a', '200')
+        counter.inc('/a', '200', amount=2)
+        counter.inc('/b', '404')
+        lines = counter.collect()
+        self.assertEqual(lines[:2], ['# HELP requests_total Requests', '# TYPE requests_total counter'])
+        self.assertIn('requests_total{route="/a",status="200"} 3', lines)
+        self.assertIn('requests_total{route="/b",status="404"} 1', lines)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram('latency_seconds', 'Latency', ('route',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, '/a')
+        lines = histogram.collect()
+        self.assertIn('latency_seconds_bucket{route="/a",le="0.1"} 2', lines)
+        self.assertIn('latency_seconds_bucket{route="/a",le="1.0"} 3', lines)
+        self.assertIn('latency_seconds_bucket{route="/a",le="+Inf"} 4', lines)
+        self.assertIn('latency_seconds_sum{route="/a"} 3.65', lines)
+        self.assertIn('latency_seconds_count{route="/a"} 4', lines)
+
+    def test_gauge_reads_callback_and_skips_none(self):
+        self.assertIn('size 7', Gauge('size', 'Size', lambda: 7).collect())
+        lines = Gauge('ratio', 'Ratio', lambda: [(('a',), 0.5), (('b',), None)], ('cache',)).collect()
+        self.assertIn('ratio{cache="a"} 0.5', lines)
+        self.assertFalse(any(line.startswith('ratio{cache="b"}') for line in lines))
+
+    def test_callback_counter_is_typed_as_counter(self):
+        lines = CallbackCounter('polls_total', 'Polls', lambda: 3).collect()
+        self.assertIn('# TYPE polls_total counter', lines)
+        self.assertIn('polls_total 3', lines)
+
+    def test_label_values_are_escaped(self):
+        counter = Counter('c', 'C', ('path',))
+        counter.inc('a"b\\c\nd')
+        self.assertIn('c{path="a\\"b\\\\c\\nd"} 1', counter.collect())
+
+    def test_failing_gauge_does_not_break_scrape(self):
+        registry = Registry()
+        registry.register(Gauge('broken', 'Broken', lambda: 1 / 0))
+        registry.register(Gauge('ok', 'Ok', lambda: 1))
+        text = registry.render()
+        self.assertIn('ok 1\n', text)
+        self.assertNotIn('broken', text)
+
+
+class TestStageTiming(unittest.TestCase):
+
+    def test_stages_accumulate_within_a_request(self):
+        begin_request()
+        with stage('upstream'):
+            pass
+        with stage('upstream'):
+            pass
+        with stage('inference'):
+            pass
+        stages = end_request()
+        self.assertEqual(stages['upstream'][1], 2)
+        self.assertEqual(stages['inference'][1], 1)
+        self.assertEqual(end_request(), {})
+
+    def test_stage_outside_a_request_is_not_recorded_per_request(self):
+        with stage('inference'):
+            pass
+        self.assertEqual(end_request(), {})
+
+    def test_server_timing_header(self):
+        header = server_timing({'inference': [0.0012, 1], 'geocode': [0.004, 3]}, 0.01)
+        self.assertEqual(header, 'inference;dur=1.20, geocode;dur=4.00;desc="3 calls", total;dur=10.00')
+
+
+if __name__ == '__main__':
+    unittest.main()
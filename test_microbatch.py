@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from microbatch import MicroBatcher, QueueFullError
+
+
+class TestMicroBatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.batch_sizes = []
+
+        def predict_fn(X):
+            self.batch_sizes.append(len(X))
+            return X.sum(axis=1)
+
+        self.batcher = MicroBatcher(predict_fn, max_batch_size=16, flush_window_ms=20).start()
+
+    def tearDown(self):
+        self.batcher.stop(timeout=1)
+
+    def test_single_prediction(self):
+        self.assertEqual(self.batcher.predict([1, 2, 3, 4, 5, 6], timeout=1), 21)
+
+    def test_concurrent_requests_are_coalesced(self):
+        results = {}
+
+        def worker(i):
+            results[i] = self.batcher.predict([i, 0, 0, 0, 0, 0], timeout=2)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(32)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, {i: i for i in range(32)})
+        self.assertLess(len(self.batch_sizes), 32)
+        self.assertLessEqual(max(self.batch_sizes), 16)
+        stats = self.batcher.stats()
+        self.assertEqual(stats['rows'], 32)
+        self.assertIsNotNone(stats['latency_p99_ms'])
+
+    def test_worker_starts_on_first_submit(self):
+        batcher = MicroBatcher(lambda X: X.sum(axis=1), flush_window_ms=1)
+        try:
+            self.assertEqual(batcher.predict([1, 1, 1, 1, 1, 1], timeout=1), 6)
+        finally:
+            batcher.stop(timeout=1)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs os.fork')
+    def test_forked_child_gets_its_own_worker(self):
+        self.assertEqual(self.batcher.predict([1, 0, 0, 0, 0, 0], timeout=1), 1)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                ok = self.batcher.predict([2, 0, 0, 0, 0, 0], timeout=2) == 2
+            except BaseException:
+                ok = False
+            os._exit(0 if ok else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+    def test_errors_propagate_to_every_caller(self):
+        def failing(X):
+            raise RuntimeError('boom')
+
+        batcher = MicroBatcher(failing, flush_window_ms=1).start()
+        try:
+            with self.assertRaises(RuntimeError):
+                batcher.predict([0] * 6, timeout=1)
+            self.assertEqual(batcher.stats()['errors'], 1)
+        finally:
+            batcher.stop(timeout=1)
+
+    def test_queue_depth_is_bounded(self):
+        gate = threading.Event()
+
+        def slow(X):
+            gate.wait(1)
+            return np.zeros(len(X))
+
+        batcher = MicroBatcher(slow, max_batch_size=1, flush_window_ms=0, max_queue_depth=1).start()
+        try:
+            first = batcher.submit([0] * 6)
+            time.sleep(0.05)
+            batcher.submit([0] * 6)
+            with self.assertRaises(QueueFullError):
+                batcher.submit([0] * 6)
+            gate.set()
+            self.assertEqual(first.result(timeout=1), 0)
+        finally:
+            gate.set()
+            batcher.stop(timeout=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,197 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+from forest_engine import CompiledForest
+from model_registry import ModelNotFoundError, ModelRegistry, ModelVersion
+
+
+def write_version(directory, version, model, compiled=True):
+    # Same layout train_model.py writes: .joblib, .forest and .json per version
+    artifact = f'airquality-{version}.joblib'
+    joblib.dump(model, os.path.join(directory, artifact))
+    metadata = {'version': version, 'artifact': artifact, 'metrics': {'r2': 0.9}}
+    if compiled:
+        CompiledForest.from_sklearn(model).save(os.path.join(directory, f'airquality-{version}.forest'))
+        metadata['compiled_artifact'] = f'airquality-{version}.forest'
+    with open(os.path.join(directory, f'airquality-{version}.json'), 'w') as f:
+        json.dump(metadata, f)
+
+
+class TestModelRegistry(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(0)
+        X = rng.uniform(0, 300, size=(300, 6))
+        cls.model_a = RandomForestRegressor(n_estimators=5, max_depth=6, random_state=0).fit(X, X[:, 0])
+        cls.model_b = RandomForestRegressor(n_estimators=5, max_depth=6, random_state=0).fit(X, X[:, 1] * 2)
+        cls.X = rng.uniform(0, 300, size=(20, 6))
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dir = self.tmpdir.name
+        write_version(self.dir, 'v1', self.model_a)
+        write_version(self.dir, 'v2', self.model_b, compiled=False)
+        default_path = os.path.join(self.dir, 'default.joblib')
+        joblib.dump(self.model_a, default_path)
+        self.registry = ModelRegistry(self.dir, default=ModelVersion('default', default_path))
+
+    def tearDown(self):
+        self.registry.stop()
+        self.tmpdir.cleanup()
+
+    def test_serves_default_without_pointer(self):
+        self.assertEqual(self.registry.active.version, 'default')
+        np.testing.assert_allclose(self.registry.predict(self.X), self.model_a.predict(self.X))
+
+    def test_lists_versions_from_metadata(self):
+        self.assertEqual([v['version'] for v in self.registry.list_versions()], ['v1', 'v2'])
+
+    def test_activate_swaps_model_and_writes_pointer(self):
+        previous = self.registry.activate('v2')
+        self.assertEqual(previous.version, 'default')
+        np.testing.assert_allclose(self.registry.predict(self.X), self.model_b.predict(self.X))
+        with open(os.path.join(self.dir, 'ACTIVE')) as f:
+            self.assertEqual(f.read(), 'v2')
+        # A new registry (e.g. another worker) starts on the pointed-to version
+        other = ModelRegistry(self.dir)
+        self.assertEqual(other.active.version, 'v2')
+        other.stop()
+
+    def test_unknown_version(self):
+        with self.assertRaises(ModelNotFoundError):
+            self.registry.activate('missing')
+
+    def test_compiled_engine_uses_exported_forest(self):
+        registry = ModelRegistry(self.dir, default=self.registry.active, engine='compiled')
+        registry.activate('v1', persist=False)
+        self.assertIsNotNone(registry.active._compiled)
+        np.testing.assert_allclose(registry.predict(self.X), self.model_a.predict(self.X), rtol=1e-9)
+        registry.stop()
+
+    def test_in_flight_prediction_finishes_on_old_model(self):
+        started, release = threading.Event(), threading.Event()
+        old = self.registry.active
+
+        class Slow:
+            version = 'slow'
+
+            def predict(self, X):
+                started.set()
+                release.wait(5)
+                return old.predict(X)
+
+        self.registry._active = Slow()
+        results = []
+        worker = threading.Thread(target=lambda: results.append(self.registry.predict(self.X)))
+        worker.start()
+        started.wait(5)
+        self.registry.activate('v2')
+        release.set()
+        worker.join(5)
+        np.testing.assert_allclose(results[0], self.model_a.predict(self.X))
+        np.testing.assert_allclose(self.registry.predict(self.X), self.model_b.predict(self.X))
+
+    def test_watch_follows_pointer_changes(self):
+        self.registry.watch(interval=0.01)
+        with open(os.path.join(self.dir, 'ACTIVE'), 'w') as f:
+            f.write('v1')
+        deadline = time.monotonic() + 5
+        while self.registry.active.version != 'v1' and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.registry.active.version, 'v1')
+
+    def test_watch_logs_a_failed_version_and_does_not_retry_it(self):
+        with open(os.path.join(self.dir, 'ACTIVE'), 'w') as f:
+            f.write('v9')
+        with self.assertLogs('model_registry', 'ERROR') as logs:
+            self.registry.watch(interval=0.01)
+            time.sleep(0.2)
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('v9', logs.output[0])
+        self.assertEqual(self.registry.active.version, 'default')
+        with open(os.path.join(self.dir, 'ACTIVE'), 'w') as f:
+            f.write('v2')
+        deadline = time.monotonic() + 5
+        while self.registry.active.version != 'v2' and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.registry.active.version, 'v2')
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs os.fork')
+    def test_forked_child_starts_its_own_watcher(self):
+        self.registry.watch(interval=60)
+        pid = os.fork()
+        if pid == 0:
+            inherited = self.registry._watcher
+            self.registry.watch(interval=60)
+            os._exit(0 if inherited is None and self.registry._watcher.is_alive() else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+    def wait_for_comparisons(self, count):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            stats = self.registry.candidate_stats()
+            if stats['compared_calls'] >= count:
+                return stats
+            time.sleep(0.01)
+        self.fail('comparisons did not complete')
+
+    def test_shadow_returns_live_result_and_compares(self):
+        self.registry.set_candidate('v2', mode='shadow', fraction=1.0)
+        np.testing.assert_allclose(self.registry.predict(self.X), self.model_a.predict(self.X))
+        stats = self.wait_for_comparisons(1)
+        self.assertEqual(stats['mode'], 'shadow')
+        self.assertEqual(stats['compared_rows'], len(self.X))
+        self.assertGreater(stats['mean_abs_diff'], 0)
+        self.assertIsNotNone(stats['candidate_p50_ms'])
+
+    def test_canary_serves_candidate(self):
+        self.registry.set_candidate('v2', mode='canary', fraction=1.0)
+        np.testing.assert_allclose(self.registry.predict(self.X), self.model_b.predict(self.X))
+        self.wait_for_comparisons(1)
+        self.registry.clear_candidate()
+        self.assertIsNone(self.registry.candidate_stats())
+        np.testing.assert_allclose(self.registry.predict(self.X), self.model_a.predict(self.X))
+
+    def test_concurrent_comparisons_are_all_accounted_for(self):
+        self.registry.stop()
+        self.registry = ModelRegistry(self.dir, default=self.registry.active, max_pending_comparisons=2)
+        self.registry.set_candidate('v2', mode='shadow', fraction=1.0)
+        calls = 8 * 25
+
+        def worker():
+            for _ in range(25):
+                self.registry.predict(self.X[:1])
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            stats = self.registry.candidate_stats()
+            if stats['compared_calls'] + stats['dropped'] + stats['errors'] == calls:
+                break
+            time.sleep(0.01)
+        self.assertEqual(stats['compared_calls'] + stats['dropped'] + stats['errors'], calls)
+        self.assertGreater(stats['dropped'], 0)
+
+    def test_candidate_validation(self):
+        with self.assertRaises(ValueError):
+            self.registry.set_candidate('v2', mode='mirror')
+        with self.assertRaises(ValueError):
+            self.registry.set_candidate('v2', fraction=1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
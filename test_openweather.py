@@ -0,0 +1,96 @@
+import unittest
+
+import requests
+
+from fake_openweather import FakeOpenWeatherServer
+from openweather import OpenWeatherClient, OpenWeatherError
+from upstream import UpstreamClient
+
+
+class BrokenUpstream(UpstreamClient):
+    # Raises, or answers 200 with a body that is not JSON
+    def __init__(self, exc=None):
+        super().__init__()
+        self.exc = exc
+
+    def get(self, url, params=None):
+        if self.exc is not None:
+            raise self.exc
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'<html>'
+        return response
+
+
+class TestOpenWeatherClient(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeOpenWeatherServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.calls.clear()
+        self.server.unknown_cities.clear()
+        self.server.fail_paths.clear()
+        self.client = OpenWeatherClient('test-key', base_url=self.server.url)
+
+    def test_city_components(self):
+        components = self.client.city_components('Delhi')
+        self.assertEqual(components['pm2_5'], self.server.components['pm2_5'])
+
+    def test_repeated_lookups_hit_the_cache(self):
+        for _ in range(5):
+            self.client.city_components('Delhi')
+            self.client.city_components(' delhi ')
+        self.assertEqual(self.server.calls['/geo/1.0/direct'], 1)
+        self.assertEqual(self.server.calls['/data/2.5/air_pollution'], 1)
+        stats = self.client.cache_stats()
+        self.assertEqual(stats['geocode']['hits'], 9)
+        self.assertEqual(stats['air_pollution']['misses'], 1)
+
+    def test_unknown_city(self):
+        self.server.unknown_cities.add('atlantis')
+        with self.assertRaises(OpenWeatherError) as ctx:
+            self.client.city_components('Atlantis')
+        self.assertEqual(ctx.exception.status_code, 404)
+
+    def test_upstream_failure(self):
+        self.server.fail_paths.add('/data/2.5/air_pollution')
+        with self.assertRaises(OpenWeatherError) as ctx:
+            self.client.city_components('Mumbai')
+        self.assertEqual(ctx.exception.message, 'Failed to fetch Air Quality Index data')
+
+    def test_invalid_json_is_an_openweather_error(self):
+        client = OpenWeatherClient('test-key', base_url=self.server.url, upstream=BrokenUpstream())
+        with self.assertRaises(OpenWeatherError) as ctx:
+            client.city_components('Delhi')
+        self.assertEqual(ctx.exception.status_code, 502)
+
+    def test_unexpected_requests_error_is_an_openweather_error(self):
+        upstream = BrokenUpstream(requests.exceptions.InvalidURL('bad url'))
+        client = OpenWeatherClient('test-key', base_url=self.server.url, upstream=upstream)
+        with self.assertRaises(OpenWeatherError) as ctx:
+            client.city_components('Delhi')
+        self.assertEqual(ctx.exception.message, 'Failed to fetch location data')
+
+    def test_many_cities_reuse_one_event_loop(self):
+        self.server.unknown_cities.add('atlantis')
+        try:
+            first = self.client.many_city_components(['Delhi', 'Atlantis'])
+            loop, thread = self.client._loop, self.client._loop_thread
+            second = self.client.many_city_components(['Mumbai'])
+            self.assertIs(self.client._loop, loop)
+        finally:
+            self.client.close()
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(first[0]['pm2_5'], self.server.components['pm2_5'])
+        self.assertEqual(first[1].status_code, 404)
+        self.assertEqual(second[0]['pm2_5'], self.server.components['pm2_5'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import os
+import time
+import unittest
+
+from fake_clock import FakeClock
+from fake_openweather import FakeOpenWeatherServer
+from openweather import OpenWeatherClient
+from poller import CityPoller, RateLimiter
+from timeseries import TimeSeriesStore
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_waits_once_the_burst_is_used(self):
+        clock = FakeClock()
+        limiter = RateLimiter(rate=2.0, burst=2, clock=clock)
+        self.assertEqual(limiter.reserve(), 0.0)
+        self.assertEqual(limiter.reserve(), 0.0)
+        self.assertEqual(limiter.reserve(), 0.5)
+        self.assertEqual(limiter.reserve(), 1.0)
+        clock.now = 10.0
+        self.assertEqual(limiter.reserve(), 0.0)
+
+
+class TestCityPoller(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeOpenWeatherServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.calls.clear()
+        self.server.unknown_cities.clear()
+        self.weather = OpenWeatherClient('test-key', base_url=self.server.url)
+        self.store = TimeSeriesStore()
+        self.batches = []
+
+    def predict(self, samples):
+        self.batches.append(samples)
+        return [sum(sample) for sample in samples]
+
+    def poller(self, cities, **kwargs):
+        kwargs.setdefault('spread', 0.0)
+        kwargs.setdefault('rate', 1000.0)
+        return CityPoller(lambda: self.weather, self.predict, self.store, cities, **kwargs)
+
+    def test_round_predicts_in_one_batch(self):
+        poller = self.poller(['Delhi', 'Mumbai', 'delhi'])
+        self.assertEqual(poller.poll_once(), 2)
+        self.assertEqual(len(self.batches), 1)
+        self.assertEqual(len(self.batches[0]), 2)
+        latest = self.store.latest('Mumbai')
+        self.assertEqual(latest['pm25'], self.server.components['pm2_5'])
+        self.assertAlmostEqual(latest['aqi'], sum(self.batches[0][1]), places=3)
+
+    def test_readings_bypass_and_refresh_the_cache(self):
+        poller = self.poller(['Delhi'])
+        poller.poll_once()
+        poller.poll_once()
+        self.assertEqual(self.server.calls['/geo/1.0/direct'], 1)
+        self.assertEqual(self.server.calls['/data/2.5/air_pollution'], 2)
+        self.weather.city_components('Delhi')
+        self.assertEqual(self.server.calls['/data/2.5/air_pollution'], 2)
+
+    def test_failed_cities_are_reported(self):
+        self.server.unknown_cities.add('atlantis')
+        poller = self.poller(['Atlantis', 'Delhi'])
+        self.assertEqual(poller.poll_once(), 1)
+        stats = poller.stats()
+        self.assertEqual(stats['failures'], 1)
+        self.assertEqual(stats['last_errors'], {'Atlantis': 'City not found'})
+        self.assertIsNone(self.store.latest('Atlantis'))
+
+    def test_calls_are_staggered(self):
+        poller = self.poller(['Delhi', 'Mumbai', 'Chennai'], spread=0.3)
+        start = time.monotonic()
+        poller.poll_once()
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    def test_calls_are_rate_limited(self):
+        poller = self.poller(['Delhi', 'Mumbai', 'Chennai'], rate=10.0)
+        start = time.monotonic()
+        poller.poll_once()
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    def test_background_thread_polls_until_stopped(self):
+        poller = self.poller(['Delhi'], interval=0.05).start()
+        deadline = time.monotonic() + 5
+        while poller.rounds < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        poller.stop(timeout=5)
+        self.assertGreaterEqual(poller.rounds, 2)
+        self.assertFalse(poller.stats()['running'])
+
+    def test_a_failing_round_does_not_stop_polling(self):
+        calls = []
+
+        def flaky(samples):
+            calls.append(len(samples))
+            if len(calls) == 1:
+                raise RuntimeError('model unavailable')
+            return [0.0] * len(samples)
+
+        poller = CityPoller(lambda: self.weather, flaky, self.store, ['Delhi'], interval=0.05,
+                            spread=0.0, rate=1000.0)
+        with self.assertLogs('poller', 'ERROR'):
+            poller.start()
+            deadline = time.monotonic() + 5
+            while poller.rounds < 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        poller.stop(timeout=5)
+        stats = poller.stats()
+        self.assertEqual(stats['round_errors'], 1)
+        self.assertEqual(stats['last_round_error'], 'RuntimeError: model unavailable')
+        self.assertIsNotNone(self.store.latest('Delhi'))
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs os.fork')
+    def test_forked_child_starts_its_own_thread(self):
+        poller = self.poller(['Delhi'], interval=60).start()
+        try:
+            pid = os.fork()
+            if pid == 0:
+                running = poller.stats()['running']
+                poller.start()
+                os._exit(0 if not running and poller.stats()['running'] else 1)
+            _, status = os.waitpid(pid, 0)
+            self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        finally:
+            poller.stop(timeout=5)
+
+    def test_no_cities_does_not_start(self):
+        poller = self.poller([' ']).start()
+        self.assertFalse(poller.stats()['running'])
+        self.assertEqual(poller.poll_once(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
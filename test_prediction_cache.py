@@ -0,0 +1,73 @@
+import unittest
+
+import numpy as np
+
+from prediction_cache import PredictionCache
+
+
+class CountingModel:
+
+    def __init__(self):
+        self.rows = 0
+
+    def __call__(self, X):
+        self.rows += len(X)
+        return X.sum(axis=1)
+
+
+class TestPredictionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.model = CountingModel()
+        self.X = np.array([[1.0, 2, 3, 4, 5, 6], [2.0, 3, 4, 5, 6, 7]])
+
+    def test_repeated_rows_hit_the_cache(self):
+        cache = PredictionCache(maxsize=100)
+        np.testing.assert_allclose(cache.predict(self.X, 'v1', self.model), [21, 27])
+        np.testing.assert_allclose(cache.predict(self.X[::-1], 'v1', self.model), [27, 21])
+        self.assertEqual(self.model.rows, 2)
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 2))
+
+    def test_store_fills_without_counting_lookups(self):
+        cache = PredictionCache(maxsize=100)
+        cache.store(self.X, 'v1', [21.0, 27.0])
+        self.assertEqual(cache.get(self.X[1:], 'v1'), 27.0)
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 0))
+
+    def test_duplicates_within_a_batch_are_predicted_once(self):
+        cache = PredictionCache(maxsize=100)
+        X = np.repeat(self.X[:1], 5, axis=0)
+        np.testing.assert_allclose(cache.predict(X, 'v1', self.model), [21] * 5)
+        self.assertEqual(self.model.rows, 1)
+
+    def test_quantization_shares_nearby_rows(self):
+        cache = PredictionCache(maxsize=100, quantum=0.1)
+        cache.predict(self.X[:1], 'v1', self.model)
+        noisy = self.X[:1] + 0.01
+        np.testing.assert_allclose(cache.predict(noisy, 'v1', self.model), [21])
+        self.assertEqual(self.model.rows, 1)
+        # Exact keys keep the rows apart
+        exact = PredictionCache(maxsize=100)
+        exact.predict(self.X[:1], 'v1', self.model)
+        exact.predict(noisy, 'v1', self.model)
+        self.assertEqual(self.model.rows, 3)
+
+    def test_new_model_version_invalidates(self):
+        cache = PredictionCache(maxsize=100)
+        cache.predict(self.X, 'v1', self.model)
+        self.assertIsNotNone(cache.get(self.X[:1], 'v1'))
+        self.assertIsNone(cache.get(self.X[:1], 'v2'))
+        self.assertEqual(cache.stats()['size'], 0)
+        cache.predict(self.X, 'v2', self.model)
+        self.assertEqual(self.model.rows, 4)
+
+    def test_bounded_size(self):
+        cache = PredictionCache(maxsize=10)
+        cache.predict(np.arange(120, dtype=np.float64).reshape(20, 6), 'v1', self.model)
+        self.assertEqual(cache.stats()['size'], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from record_store import DictRecordStore, SQLiteRecordStore, VersionConflictError, create_record_store
+
+SAMPLE = (10.0, 20.0, 5.0, 3.0, 0.1, 1.0)
+
+
+def sample(pm25):
+    return (pm25,) + SAMPLE[1:]
+
+
+class RecordStoreTests:
+
+    def test_create_and_get(self):
+        record = self.store.create(SAMPLE)
+        self.assertEqual(self.store.get(record['id']), record)
+        self.assertEqual(record['pm10'], 20.0)
+        self.assertEqual(len(self.store), 1)
+
+    def test_all_keeps_insertion_order(self):
+        ids = [self.store.create(sample(float(i)))['id'] for i in range(5)]
+        self.assertEqual([r['id'] for r in self.store.all()], ids)
+
+    def test_update(self):
+        record = self.store.create(SAMPLE)
+        updated = self.store.update(record['id'], sample(99.0))
+        self.assertEqual(updated['pm25'], 99.0)
+        self.assertEqual(self.store.get(record['id'])['pm25'], 99.0)
+        self.assertIsNone(self.store.update('missing', SAMPLE))
+
+    def test_scan_cursor_skips_deleted(self):
+        ids = [self.store.create(sample(float(i)))['id'] for i in range(6)]
+        self.store.delete(ids[1])
+        self.store.delete(ids[2])
+        page = list(self.store.scan(limit=2))
+        self.assertEqual([r['id'] for _, r in page], [ids[0], ids[3]])
+        rest = list(self.store.scan(after=page[-1][0]))
+        self.assertEqual([r['id'] for _, r in rest], ids[4:])
+
+    def test_scan_filters(self):
+        for i in range(6):
+            self.store.create(sample(float(i)))
+        found = [r['pm25'] for _, r in self.store.scan(filters=[('pm25', 'gte', 2.0), ('pm25', 'lt', 4.0)])]
+        self.assertEqual(found, [2.0, 3.0])
+
+    def test_delete_and_clear(self):
+        record = self.store.create(SAMPLE)
+        self.assertTrue(self.store.delete(record['id']))
+        self.assertFalse(self.store.delete(record['id']))
+        self.store.bulk_create([SAMPLE] * 3)
+        self.assertEqual(len(self.store), 3)
+        self.store.clear()
+        self.assertEqual(self.store.all(), [])
+
+    def test_writes_bump_the_version(self):
+        record = self.store.create(SAMPLE)
+        self.assertEqual(record['version'], 1)
+        self.assertEqual(self.store.update(record['id'], sample(1.0))['version'], 2)
+        self.assertEqual(self.store.bulk_update([(record['id'], sample(2.0))])[0]['version'], 3)
+        self.assertEqual(self.store.get(record['id'])['version'], 3)
+
+    def test_conditional_update_and_delete(self):
+        record = self.store.create(SAMPLE)
+        updated = self.store.update(record['id'], sample(1.0), if_match={1})
+        with self.assertRaises(VersionConflictError) as caught:
+            self.store.update(record['id'], sample(2.0), if_match={1})
+        self.assertEqual(caught.exception.current_version, 2)
+        self.assertEqual(self.store.get(record['id'])['pm25'], 1.0)
+        with self.assertRaises(VersionConflictError):
+            self.store.delete(record['id'], if_match={1})
+        self.assertTrue(self.store.delete(record['id'], if_match={updated['version']}))
+        self.assertIsNone(self.store.update(record['id'], SAMPLE, if_match={2}))
+        self.assertFalse(self.store.delete(record['id'], if_match={2}))
+
+    def test_concurrent_crud_stays_consistent(self):
+        threads, ops = 8, 150
+        shared = [self.store.create((0.0,) * 6)['id'] for _ in range(10)]
+        created, deleted, problems = [0] * threads, [0] * threads, []
+        wins = [0]
+        lock = threading.Lock()
+
+        def hammer(worker):
+            rng = random.Random(worker)
+            own, seen = [], {}
+            for _ in range(ops):
+                roll = rng.random()
+                if roll < 0.3:
+                    own.append(self.store.create((float(worker),) * 6)['id'])
+                    created[worker] += 1
+                elif roll < 0.5 and own:
+                    if self.store.delete(own.pop(rng.randrange(len(own)))):
+                        deleted[worker] += 1
+                elif roll < 0.7:
+                    record_id = rng.choice(shared)
+                    current = self.store.get(record_id)
+                    value = float(rng.randrange(1000))
+                    try:
+                        self.store.update(record_id, (value,) * 6, if_match={current['version']})
+                        with lock:
+                            wins[0] += 1
+                    except VersionConflictError:
+                        pass
+                else:
+                    for record_id in shared:
+                        record = self.store.get(record_id)
+                        # Torn writes would mix values; versions never go back
+                        if len({record[p] for p in ('pm25', 'pm10', 'o3', 'no2', 'co', 'so2')}) != 1:
+                            problems.append(('torn', record))
+                        if record['version'] < seen.get(record_id, 0):
+                            problems.append(('version went back', record))
+                        seen[record_id] = record['version']
+                    list(self.store.scan(limit=20))
+
+        workers = [threading.Thread(target=hammer, args=(i,)) for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(problems, [])
+        self.assertEqual(len(self.store), len(shared) + sum(created) - sum(deleted))
+        # Each successful conditional update bumped exactly one version
+        self.assertEqual(sum(self.store.get(i)['version'] - 1 for i in shared), wins[0])
+
+
+class TestDictRecordStore(RecordStoreTests, unittest.TestCase):
+
+    def setUp(self):
+        self.store = DictRecordStore()
+
+    def test_clear_does_not_disturb_a_running_scan(self):
+        ids = [self.store.create(sample(float(i)))['id'] for i in range(5)]
+        scan = self.store.scan()
+        first = next(scan)[1]['id']
+        self.store.clear()
+        self.store.create(SAMPLE)
+        self.assertEqual([first] + [r['id'] for _, r in scan], ids)
+        self.assertEqual(len(self.store), 1)
+
+
+class TestSQLiteRecordStore(RecordStoreTests, unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'records.db')
+        self.store = SQLiteRecordStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def test_records_persist_across_instances(self):
+        record = self.store.create(SAMPLE)
+        reopened = create_record_store(f'sqlite:///{self.path}')
+        self.assertEqual(reopened.get(record['id']), record)
+        reopened.close()
+
+    def test_unversioned_database_is_migrated(self):
+        path = os.path.join(self.tmpdir.name, 'old.db')
+        with sqlite3.connect(path) as conn:
+            conn.execute('CREATE TABLE records (seq INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, '
+                         'created_at REAL NOT NULL, pm25 REAL NOT NULL, pm10 REAL NOT NULL, o3 REAL NOT NULL, '
+                         'no2 REAL NOT NULL, co REAL NOT NULL, so2 REAL NOT NULL)')
+            conn.execute("INSERT INTO records VALUES (1, 'a', 0, 1, 2, 3, 4, 5, 6)")
+        conn.close()
+        store = SQLiteRecordStore(path)
+        self.assertEqual(store.get('a')['version'], 1)
+        self.assertEqual(store.update('a', SAMPLE, if_match={1})['version'], 2)
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
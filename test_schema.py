@@ -0,0 +1,57 @@
+import unittest
+
+from schema import AQIRecord, compile_validator, validate_record
+
+VALID = {"pm25": 10, "pm10": 20.5, "o3": "5", "no2": 3.0, "co": 0.1, "so2": 1}
+
+
+class TestCompiledValidator(unittest.TestCase):
+
+    def test_valid_payload_is_coerced_to_floats(self):
+        values, message = validate_record(VALID)
+        self.assertIsNone(message)
+        self.assertEqual(values, (10.0, 20.5, 5.0, 3.0, 0.1, 1.0))
+        self.assertTrue(all(type(v) is float for v in values))
+
+    def test_rejections(self):
+        cases = {
+            'not a dict': [1, 2, 3],
+            'missing field': {k: v for k, v in VALID.items() if k != 'so2'},
+            'unknown field': {**VALID, 'extra': 1},
+            'bad string': {**VALID, 'pm25': 'abc'},
+            'oversized string': {**VALID, 'pm25': '1' * 100},
+            'boolean': {**VALID, 'pm25': True},
+            'negative': {**VALID, 'pm25': -1},
+            'too large': {**VALID, 'pm10': 1e9},
+            'nan': {**VALID, 'o3': float('nan')},
+        }
+        for name, payload in cases.items():
+            with self.subTest(name):
+                values, message = validate_record(payload)
+                self.assertIsNone(values)
+                self.assertTrue(message)
+
+    def test_huge_integer_is_out_of_range(self):
+        for value in (10 ** 400, -10 ** 400):
+            with self.subTest(value=value):
+                self.assertEqual(validate_record({**VALID, 'pm25': value}),
+                                 (None, 'pm25 must be between 0 and 2000'))
+
+    def test_custom_schema(self):
+        validate = compile_validator(fields=('a',), bounds={'a': (0, 1)})
+        self.assertEqual(validate({'a': 0.5}), ((0.5,), None))
+        self.assertIsNone(validate({'a': 2})[0])
+
+
+class TestAQIRecord(unittest.TestCase):
+
+    def test_round_trip(self):
+        record = AQIRecord('abc', (1.0, 2.0, 3.0, 4.0, 5.0, 6.0))
+        self.assertEqual(record.to_dict()['co'], 5.0)
+        self.assertEqual(record.values(), (1.0, 2.0, 3.0, 4.0, 5.0, 6.0))
+        with self.assertRaises(AttributeError):
+            record.extra = 1
+
+
+if __name__ == '__main__':
+    unittest.main()
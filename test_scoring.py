@@ -0,0 +1,128 @@
+import csv
+import io
+import json
+import tempfile
+import time
+import unittest
+
+from scoring import Scorer, ScoringError, ScoringJobs, open_scoring_stream, resolve_columns
+
+MEANS = {'pm25': 60.0, 'pm10': 100.0, 'o3': 30.0, 'no2': 25.0, 'co': 2.0, 'so2': 15.0}
+CSV_TEXT = (
+    'City,Date,PM2.5,PM10,O3,NO2,CO,SO2\n'
+    'Delhi,01-01-2020,100,200,30,40,1.2,10\n'
+    'Delhi,02-01-2020,,200,30,40,1.2,10\n'
+    '\n'
+    'Pune,03-01-2020,n/a,1,2,3,4,5\n'
+)
+
+
+class SumModel:
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, X):
+        self.calls.append(len(X))
+        return X.sum(axis=1)
+
+
+def score(text, fmt='csv', **kwargs):
+    scorer = Scorer(kwargs.pop('model', SumModel()), MEANS, **kwargs)
+    output = ''.join(open_scoring_stream(io.BytesIO(text.encode()), fmt, scorer))
+    return output, scorer
+
+
+class TestScorer(unittest.TestCase):
+
+    def test_resolve_columns(self):
+        self.assertEqual(resolve_columns(['so2', 'CO', 'no2', 'o3', 'pm10', 'PM2.5']), [5, 4, 3, 2, 1, 0])
+        with self.assertRaises(ScoringError):
+            resolve_columns(['PM2.5', 'PM10'])
+
+    def test_csv_imputes_missing_values(self):
+        output, scorer = score(CSV_TEXT)
+        rows = list(csv.reader(io.StringIO(output)))
+        self.assertEqual(rows[0][-2:], ['predicted_aqi', 'result'])
+        self.assertEqual([float(r[-2]) for r in rows[1:]], [381.2, 341.2, 75.0])
+        self.assertEqual(rows[1][-1], 'Air Quality Index is Very Poor')
+        self.assertEqual(scorer.progress(), {'rows': 3, 'scored': 3, 'imputed': 2, 'skipped': 0, 'errors': 0})
+
+    def test_csv_skip_leaves_rows_unscored(self):
+        output, scorer = score(CSV_TEXT, missing='skip')
+        rows = list(csv.reader(io.StringIO(output)))
+        self.assertEqual([r[-2] for r in rows[1:]], ['381.2', '', ''])
+        self.assertEqual(scorer.skipped, 2)
+
+    def test_non_finite_values_count_as_missing(self):
+        body = 'PM2.5,PM10,O3,NO2,CO,SO2\n1,2,3,4,5,6\ninf,2,3,4,5,6\n1e39,2,3,4,5,6\n'
+        output, scorer = score(body, missing='skip')
+        rows = list(csv.reader(io.StringIO(output)))
+        self.assertEqual([r[-2] for r in rows[1:]], ['21.0', '', ''])
+        self.assertEqual(scorer.skipped, 2)
+        lines = [json.dumps({'pm25': 10 ** 400, 'pm10': 2, 'o3': 3, 'no2': 4, 'co': 5, 'so2': 6})]
+        output, scorer = score('\n'.join(lines) + '\n', fmt='ndjson')
+        self.assertEqual(json.loads(output)['predicted_aqi'], 80.0)
+        self.assertEqual(scorer.imputed, 1)
+
+    def test_chunks_bound_each_model_call(self):
+        body = 'PM2.5,PM10,O3,NO2,CO,SO2\n' + '1,2,3,4,5,6\n' * 25
+        model = SumModel()
+        output, _ = score(body, model=model, chunk_rows=10)
+        self.assertEqual(model.calls, [10, 10, 5])
+        self.assertEqual(len(output.splitlines()), 26)
+
+    def test_ndjson(self):
+        lines = [json.dumps({'PM2.5': 1, 'pm10': 2, 'o3': 3, 'no2': 4, 'co': 5, 'so2': 6, 'city': 'A'}), 'oops', '']
+        output, scorer = score('\n'.join(lines) + '\n', fmt='ndjson')
+        first, second = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual((first['city'], first['predicted_aqi']), ('A', 21.0))
+        self.assertEqual(second, {'error': 'Invalid JSON object', 'row': 2})
+        self.assertEqual(scorer.errors, 1)
+
+    def test_impute_requires_means(self):
+        with self.assertRaises(ScoringError):
+            Scorer(SumModel(), None, 'impute')
+        with self.assertRaises(ScoringError):
+            Scorer(SumModel(), MEANS, 'guess')
+
+
+class TestScoringJobs(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.jobs = ScoringJobs(self.tmpdir.name, max_finished=1)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def wait(self, job_id):
+        deadline = time.monotonic() + 5
+        while self.jobs.get(job_id)['status'] in ('queued', 'running') and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.jobs.get(job_id)
+
+    def test_job_progress_and_result(self):
+        job = self.jobs.submit(io.BytesIO(CSV_TEXT.encode()), 'csv', Scorer(SumModel(), MEANS))
+        job = self.wait(job['id'])
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual((job['progress'], job['rows']), (1.0, 3))
+        with open(self.jobs.result_path(job['id'])) as f:
+            self.assertIn('predicted_aqi', f.readline())
+
+    def test_failed_job_and_eviction(self):
+        first = self.jobs.submit(io.BytesIO(b'a,b\n1,2\n'), 'csv', Scorer(SumModel(), MEANS))
+        first = self.wait(first['id'])
+        self.assertEqual(first['status'], 'failed')
+        self.assertIn('Missing columns', first['error'])
+        self.assertIsNone(self.jobs.result_path(first['id']))
+        second = self.jobs.submit(io.BytesIO(CSV_TEXT.encode()), 'csv', Scorer(SumModel(), MEANS))
+        self.wait(second['id'])
+        self.jobs.submit(io.BytesIO(CSV_TEXT.encode()), 'csv', Scorer(SumModel(), MEANS))
+        self.assertIsNone(self.jobs.get(first['id']))
+        self.assertTrue(self.jobs.delete(second['id']))
+        self.assertFalse(self.jobs.delete(second['id']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import sys
+import threading
+import unittest
+
+import numpy as np
+
+from fake_clock import FakeClock
+from timeseries import TimeSeriesStore, downsample
+
+VALUES = [10.0, 20.0, 30.0, 40.0, 0.5, 5.0]
+
+
+class TestDownsample(unittest.TestCase):
+
+    def test_bucket_means_and_counts(self):
+        t = np.array([0.0, 10.0, 3600.0, 3700.0, 3800.0])
+        v = np.array([[1.0], [3.0], [2.0], [4.0], [6.0]], dtype=np.float32)
+        starts, means, counts = downsample(t, v, 3600)
+        self.assertEqual(starts.tolist(), [0.0, 3600.0])
+        self.assertEqual(means[:, 0].tolist(), [2.0, 4.0])
+        self.assertEqual(counts.tolist(), [2, 3])
+
+    def test_empty(self):
+        starts, means, counts = downsample(np.empty(0), np.empty((0, 7), dtype=np.float32), 3600)
+        self.assertEqual(len(starts), 0)
+        self.assertEqual(len(counts), 0)
+
+
+class TestTimeSeriesStore(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.store = TimeSeriesStore(raw_retention=2 * 3600, retention=24 * 3600, resolution=3600,
+                                     clock=self.clock)
+
+    def fill(self, hours, step=900, city='Delhi'):
+        # One reading every step seconds, aqi rising by one per reading
+        for i in range(int(hours * 3600 / step)):
+            self.clock.now = i * step
+            self.store.append(city, self.clock.now, VALUES, float(i))
+
+    def test_latest_is_case_insensitive(self):
+        self.store.append('Delhi', 100.0, VALUES, 150.0)
+        self.store.append('delhi ', 200.0, VALUES, 160.0)
+        latest = self.store.latest('DELHI')
+        self.assertEqual(latest['timestamp'], 200.0)
+        self.assertEqual(latest['aqi'], 160.0)
+        self.assertEqual(latest['pm25'], 10.0)
+        self.assertIsNone(self.store.latest('Mumbai'))
+
+    def test_old_readings_are_rolled_up(self):
+        self.fill(hours=6)
+        entry = self.store.cities()[0]
+        # Raw readings cover the last two hours plus the current partial bucket
+        self.assertLessEqual(entry['readings'], 3 * 4)
+        _, rows = self.store.history('Delhi', resolution='rollup')
+        self.assertEqual([row['timestamp'] for row in rows], [h * 3600.0 for h in range(6)])
+        self.assertTrue(all(row['count'] == 4 for row in rows[:-1]))
+        self.assertEqual(rows[0]['aqi'], 1.5)
+
+    def test_late_readings_fold_into_the_last_bucket(self):
+        self.clock.now = 4 * 3600
+        for i, aqi in enumerate([10.0, 20.0, 30.0]):
+            self.store.append('Delhi', 60.0 * i, VALUES, aqi)
+        _, rows = self.store.history('Delhi', resolution='rollup')
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['count'], 3)
+        self.assertEqual(rows[0]['aqi'], 20.0)
+
+    def test_rollups_expire_after_retention(self):
+        self.fill(hours=30, step=1800)
+        _, rows = self.store.history('Delhi', resolution='rollup')
+        self.assertGreaterEqual(rows[0]['timestamp'], self.clock.now - 24 * 3600 - 3600)
+
+    def test_raw_window(self):
+        self.fill(hours=1)
+        resolution, rows = self.store.history('Delhi', start=900, end=1800, resolution='raw')
+        self.assertEqual(resolution, 'raw')
+        self.assertEqual([row['timestamp'] for row in rows], [900.0, 1800.0])
+
+    def test_auto_resolution(self):
+        self.fill(hours=6)
+        self.assertEqual(self.store.history('Delhi', start=self.clock.now - 3600)[0], 'raw')
+        self.assertEqual(self.store.history('Delhi')[0], 'rollup')
+
+    def test_concurrent_reads_never_see_torn_rows(self):
+        # Every value is derived from its reading's timestamp, so a row whose
+        # values belong to another reading or bucket is detectable
+        step = 900
+        stop = threading.Event()
+        bad = []
+
+        def write():
+            for i in range(4000):
+                self.clock.now = i * step
+                self.store.append('Delhi', i * step, [i * step / step] * 6, float(i))
+            stop.set()
+
+        def check(row):
+            count = row.get('count')
+            if count is None:
+                expected = row['timestamp'] / step
+            elif count == 4:
+                expected = (row['timestamp'] + 1.5 * step) / step
+            else:
+                return
+            if abs(row['pm25'] - expected) > 0.01:
+                bad.append(row)
+
+        def read():
+            while not stop.is_set():
+                for resolution in ('raw', 'rollup'):
+                    if self.store.latest('Delhi') is None:
+                        continue
+                    for row in self.store.history('Delhi', resolution=resolution)[1]:
+                        check(row)
+                for city in self.store.cities():
+                    if city['latest'] is not None:
+                        check(city['latest'])
+
+        # Switch threads often so reads interleave with retention shifts
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-5)
+        try:
+            threads = [threading.Thread(target=write)] + [threading.Thread(target=read) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+        self.assertEqual(bad, [])
+
+    def test_unknown_city_and_resolution(self):
+        with self.assertRaises(KeyError):
+            self.store.history('Atlantis')
+        self.store.append('Delhi', 0.0, VALUES, 1.0)
+        with self.assertRaises(ValueError):
+            self.store.history('Delhi', resolution='minutely')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import json
+import os
+import tempfile
+import unittest
+
+import joblib
+import numpy as np
+
+from train_model import load_dataset, parse_args, train
+
+
+class TestTrainModel(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.csv = os.path.join(self.tmpdir.name, 'city_day.csv')
+        rng = np.random.default_rng(0)
+        with open(self.csv, 'w') as f:
+            f.write('City,Date,PM2.5,PM10,NO,NO2,NOx,NH3,CO,SO2,O3,Benzene,Toluene,Xylene,AQI,AQI_Bucket\n')
+            for i in range(200):
+                pm25, pm10, no2, co, so2, o3 = rng.uniform(0, 200, size=6)
+                pm25_text = '' if i % 10 == 0 else f'{pm25:.2f}'
+                f.write(f'Delhi,01-01-2015,{pm25_text},{pm10:.2f},1,{no2:.2f},1,1,{co:.2f},{so2:.2f},'
+                        f'{o3:.2f},0,0,0,{pm25 + pm10 / 2:.1f},Poor\n')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_load_dataset_imputes_column_means(self):
+        X, y, means = load_dataset(self.csv)
+        self.assertEqual(X.shape, (200, 6))
+        self.assertEqual(X.dtype, np.float32)
+        self.assertFalse(np.isnan(X).any())
+        self.assertAlmostEqual(float(X[0, 0]), float(means['PM2.5']), places=3)
+
+    def test_train_writes_versioned_artifact_and_metadata(self):
+        output_dir = os.path.join(self.tmpdir.name, 'models')
+        installed = os.path.join(self.tmpdir.name, 'airquality.joblib')
+        args = parse_args(['--csv', self.csv, '--output-dir', output_dir, '--install', installed,
+                           '--n-estimators', '5', '--max-depth', '4'])
+        artifact, metadata = train(args)
+
+        self.assertTrue(os.path.exists(artifact))
+        self.assertTrue(os.path.exists(installed))
+        self.assertTrue(os.path.isdir(os.path.join(self.tmpdir.name, 'airquality.forest')))
+        with open(os.path.join(self.tmpdir.name, 'airquality.json')) as f:
+            self.assertIn('pm25', json.load(f)['imputation']['values'])
+        with open(artifact.replace('.joblib', '.json')) as f:
+            self.assertEqual(json.load(f)['version'], metadata['version'])
+        self.assertEqual(metadata['features'], ['pm25', 'pm10', 'o3', 'no2', 'co', 'so2'])
+        self.assertIn('r2', metadata['metrics'])
+        self.assertGreater(metadata['latency']['single_row_p50_ms'], 0)
+        model = joblib.load(installed)
+        self.assertEqual(model.n_estimators, 5)
+        self.assertEqual(model.n_jobs, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import asyncio
+import unittest
+
+import requests
+
+from fake_clock import FakeClock
+from fake_openweather import FakeOpenWeatherServer
+from openweather import OpenWeatherClient, OpenWeatherError
+from upstream import (AsyncUpstreamClient, CircuitBreaker, CircuitOpenError, RetryPolicy,
+                      UpstreamClient, UpstreamError)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_opens_after_threshold_and_half_opens(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+        self.assertFalse(breaker.allow())
+
+        clock.now = 10
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_retry_budget_limits_retries(self):
+        policy = RetryPolicy(max_retries=5, budget_ratio=0.0, min_retries=1)
+        policy.record_call()
+        self.assertTrue(policy.acquire_retry(0))
+        self.assertFalse(policy.acquire_retry(1))
+
+
+class TestUpstreamClient(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeOpenWeatherServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.calls.clear()
+        self.server.fail_paths.clear()
+        self.server.fail_status = 500
+        self.server.latency = 0.0
+
+    def test_retries_then_opens_circuit(self):
+        self.server.fail_paths.add('/data')
+        self.server.fail_status = 503
+        client = UpstreamClient(retry=RetryPolicy(max_retries=2, backoff=0.001),
+                                breaker=CircuitBreaker(failure_threshold=1))
+        with self.assertRaises(UpstreamError):
+            client.get(self.server.url + '/data/2.5/air_pollution')
+        self.assertEqual(self.server.calls['/data/2.5/air_pollution'], 3)
+        with self.assertRaises(CircuitOpenError):
+            client.get(self.server.url + '/data/2.5/air_pollution')
+        self.assertEqual(self.server.calls['/data/2.5/air_pollution'], 3)
+
+    def test_read_timeout(self):
+        self.server.latency = 0.3
+        client = UpstreamClient(read_timeout=0.05, retry=RetryPolicy(max_retries=0))
+        with self.assertRaises(UpstreamError):
+            client.get(self.server.url + '/geo/1.0/direct', params={'q': 'Delhi'})
+
+    def test_open_circuit_maps_to_service_unavailable(self):
+        self.server.fail_paths.add('/geo')
+        self.server.fail_status = 503
+        upstream = UpstreamClient(retry=RetryPolicy(max_retries=0),
+                                  breaker=CircuitBreaker(failure_threshold=1))
+        weather = OpenWeatherClient('key', base_url=self.server.url, upstream=upstream)
+        with self.assertRaises(OpenWeatherError) as ctx:
+            weather.geocode('Delhi')
+        self.assertEqual(ctx.exception.status_code, 504)
+        with self.assertRaises(OpenWeatherError) as ctx:
+            weather.geocode('Delhi')
+        self.assertEqual(ctx.exception.status_code, 503)
+
+    def test_unexpected_error_settles_the_trial_call(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+        client = UpstreamClient(retry=RetryPolicy(max_retries=0), breaker=breaker)
+        breaker.record_failure()
+        clock.now = 10
+
+        def truncated(*args, **kwargs):
+            raise requests.exceptions.ChunkedEncodingError('truncated body')
+
+        client.session.get = truncated
+        with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+            client.get(self.server.url + '/geo/1.0/direct')
+        self.assertEqual(breaker.state, 'open')
+        del client.session.get
+        clock.now = 20
+        client.get(self.server.url + '/geo/1.0/direct', params={'q': 'Delhi'})
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_cancelled_async_trial_call_is_settled(self):
+        self.server.latency = 0.5
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        clock.now = 10
+
+        async def run():
+            async with AsyncUpstreamClient(breaker=breaker) as client:
+                task = asyncio.ensure_future(client.get(self.server.url + '/geo/1.0/direct'))
+                await asyncio.sleep(0.05)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+
+        asyncio.run(run())
+        clock.now = 20
+        self.assertTrue(breaker.allow())
+
+    def test_async_client_fetches_cities_concurrently(self):
+        weather = OpenWeatherClient('key', base_url=self.server.url)
+        cities = ['Delhi', 'Mumbai', 'Chennai', 'Delhi']
+
+        async def run():
+            async with AsyncUpstreamClient() as client:
+                return await asyncio.gather(*(weather.city_components_async(c, client) for c in cities))
+
+        results = asyncio.run(run())
+        self.assertEqual(len(results), 4)
+        self.assertEqual(results[0]['pm10'], self.server.components['pm10'])
+        self.assertEqual(self.server.calls['/geo/1.0/direct'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+import weakref
+
+import numpy as np
+
+from schema import POLLUTANTS
+
+# Columns of every stored reading: the model features plus the predicted AQI
+FIELDS = POLLUTANTS + ('aqi',)
+RESOLUTIONS = ('auto', 'raw', 'rollup')
+
+
+class _Series:
+    # Growable parallel columns: float64 timestamps and float32 values,
+    # appended in time order
+
+    __slots__ = ('t', 'v', 'n')
+
+    def __init__(self, width, capacity=16):
+        self.t = np.empty(capacity, dtype=np.float64)
+        self.v = np.empty((capacity, width), dtype=np.float32)
+        self.n = 0
+
+    def extend(self, t, v):
+        need = self.n + len(t)
+        if need > len(self.t):
+            capacity = max(need, 2 * len(self.t))
+            self.t = np.resize(self.t, capacity)
+            self.v = np.resize(self.v, (capacity, self.v.shape[1]))
+        self.t[self.n:need] = t
+        self.v[self.n:need] = v
+        self.n = need
+
+    def drop_before(self, cutoff):
+        # Remove and return the rows older than cutoff
+        k = int(np.searchsorted(self.t[:self.n], cutoff, side='left'))
+        dropped = self.t[:k].copy(), self.v[:k].copy()
+        if k:
+            self.t[:self.n - k] = self.t[k:self.n]
+            self.v[:self.n - k] = self.v[k:self.n]
+            self.n -= k
+        return dropped
+
+    def window(self, start=None, end=None):
+        t = self.t[:self.n]
+        lo = 0 if start is None else int(np.searchsorted(t, start, side='left'))
+        hi = self.n if end is None else int(np.searchsorted(t, end, side='right'))
+        return self.t[lo:hi], self.v[lo:hi]
+
+
+def downsample(t, v, resolution):
+    """Mean of ``v`` per ``resolution``-second bucket of sorted timestamps ``t``.
+
+    Returns bucket start times, the means and the number of rows per bucket.
+    """
+    if len(t) == 0:
+        return t, v, np.empty(0, dtype=np.int64)
+    buckets = np.floor(t / resolution) * resolution
+    starts, index, counts = np.unique(buckets, return_index=True, return_counts=True)
+    sums = np.add.reduceat(v.astype(np.float64), index, axis=0)
+    return starts, (sums / counts[:, None]).astype(np.float32), counts
+
+
+class TimeSeriesStore:
+    """Per-city pollutant readings and predicted AQI in two tiers.
+
+    Raw readings are kept for ``raw_retention`` seconds. Older readings are
+    averaged into ``resolution``-second buckets, which are kept until
+    ``retention``. Both tiers are float32 numpy columns, so a reading costs
+    36 bytes and a rollup bucket 40. Rollups only ever cover complete
+    buckets, so raw and rollup rows never overlap. Readings of one city must
+    be appended in time order.
+    """
+
+    def __init__(self, raw_retention=2 * 86400, retention=30 * 86400, resolution=3600, clock=time.time):
+        self.raw_retention = raw_retention
+        self.retention = retention
+        self.resolution = resolution
+        self._clock = clock
+        self._cities = {}
+        self._lock = threading.Lock()
+        # A forked child must not inherit the lock held by a parent thread
+        ref = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: ref() is not None and ref()._reset_lock())
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    def _entry(self, city):
+        return self._cities.get(city.strip().lower())
+
+    def append(self, city, timestamp, values, aqi):
+        self.append_many([(city, timestamp, values, aqi)])
+
+    def append_many(self, readings):
+        """Store ``(city, timestamp, pollutant values, predicted aqi)`` tuples."""
+        now = self._clock()
+        with self._lock:
+            for city, timestamp, values, aqi in readings:
+                key = city.strip().lower()
+                entry = self._cities.get(key)
+                if entry is None:
+                    entry = self._cities[key] = {
+                        'name': city.strip(),
+                        'raw': _Series(len(FIELDS)),
+                        'rollup': _Series(len(FIELDS) + 1),
+                    }
+                entry['raw'].extend([timestamp], [[*values, aqi]])
+            for entry in self._cities.values():
+                self._compact(entry, now)
+
+    def _compact(self, entry, now):
+        # Roll whole buckets older than the raw retention into the rollup tier
+        cutoff = np.floor((now - self.raw_retention) / self.resolution) * self.resolution
+        raw = entry['raw']
+        if raw.n and raw.t[0] < cutoff:
+            t, v = raw.drop_before(cutoff)
+            starts, means, counts = downsample(t, v, self.resolution)
+            rollup = entry['rollup']
+            if rollup.n and starts[0] == rollup.t[rollup.n - 1]:
+                # A late reading for the newest bucket: fold it into that mean
+                last = rollup.v[rollup.n - 1]
+                total = last[-1] + counts[0]
+                last[:-1] = (last[:-1] * last[-1] + means[0] * counts[0]) / total
+                last[-1] = total
+                starts, means, counts = starts[1:], means[1:], counts[1:]
+            rollup.extend(starts, np.column_stack([means, counts]))
+        entry['rollup'].drop_before(now - self.retention)
+
+    def cities(self):
+        # Rows are built under the lock: retention shifts the columns in place
+        with self._lock:
+            return [{'city': e['name'], 'readings': e['raw'].n, 'rollups': e['rollup'].n,
+                     'latest': self._latest(e)} for e in self._cities.values()]
+
+    @staticmethod
+    def _row(t, v, count=None):
+        row = {'timestamp': float(t), **{f: round(float(x), 3) for f, x in zip(FIELDS, v)}}
+        if count is not None:
+            row['count'] = int(count)
+        return row
+
+    def _latest(self, entry):
+        raw = entry['raw']
+        return self._row(raw.t[raw.n - 1], raw.v[raw.n - 1]) if raw.n else None
+
+    def latest(self, city):
+        """The newest raw reading of ``city`` or None."""
+        with self._lock:
+            entry = self._entry(city)
+            return self._latest(entry) if entry is not None else None
+
+    def history(self, city, start=None, end=None, resolution='auto'):
+        """``(resolution used, rows)`` for ``city`` between ``start`` and ``end``.
+
+        ``raw`` returns stored readings; ``rollup`` returns bucket means,
+        averaging recent raw readings on the fly; ``auto`` picks raw when
+        the window lies within the raw retention. Raises KeyError for an
+        unknown city.
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f'resolution must be one of: {", ".join(RESOLUTIONS)}')
+        with self._lock:
+            entry = self._entry(city)
+            if entry is None:
+                raise KeyError(city)
+            if resolution == 'auto':
+                raw_from = self._clock() - self.raw_retention
+                resolution = 'raw' if start is not None and start >= raw_from else 'rollup'
+            t, v = entry['raw'].window(start, end)
+            if resolution == 'raw':
+                return 'raw', [self._row(*row) for row in zip(t, v)]
+            starts, means, counts = downsample(t, v, self.resolution)
+            rt, rv = entry['rollup'].window(start, end)
+            rows = [self._row(ts, row[:-1], row[-1]) for ts, row in zip(rt, rv)]
+        rows += [self._row(*row) for row in zip(starts, means, counts)]
+        return 'rollup', rows
@@ -0,0 +1,248 @@
+import asyncio
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class UpstreamError(Exception):
+    pass
+
+
+class CircuitOpenError(UpstreamError):
+    pass
+
+
+class CircuitBreaker:
+    """Open after ``failure_threshold`` consecutive failures and fail fast.
+
+    Once ``reset_timeout`` seconds have passed a single trial call is let
+    through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self.rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if self._clock() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._clock() - self._opened_at >= self.reset_timeout and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+
+
+class RetryPolicy:
+    """Bounded retries with exponential backoff, full jitter and a retry budget.
+
+    Retries are only spent while they stay under ``budget_ratio`` of all
+    calls made (plus ``min_retries``), so a struggling upstream is not
+    hammered with amplified traffic.
+    """
+
+    def __init__(self, max_retries=2, backoff=0.1, max_backoff=2.0, budget_ratio=0.2,
+                 min_retries=10, retry_statuses=(429, 502, 503, 504)):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget_ratio = budget_ratio
+        self.min_retries = min_retries
+        self.retry_statuses = frozenset(retry_statuses)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+
+    def record_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def acquire_retry(self, attempt):
+        if attempt >= self.max_retries:
+            return False
+        with self._lock:
+            if self.retries >= self.min_retries + self.budget_ratio * self.calls:
+                return False
+            self.retries += 1
+            return True
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+
+class _ClientBase:
+
+    def __init__(self, pool_size, connect_timeout, read_timeout, retry, breaker):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.failures = 0
+
+    def _before_call(self):
+        if not self.breaker.allow():
+            raise CircuitOpenError('Upstream circuit is open')
+        self.retry.record_call()
+
+    def _fail(self, message):
+        self.failures += 1
+        self.breaker.record_failure()
+        return UpstreamError(message)
+
+    def _fail_unexpected(self):
+        # Any other exception (a broken body, a cancelled task) still counts
+        # as a failure, so a half-open trial call is always settled
+        self.failures += 1
+        self.breaker.record_failure()
+
+    def stats(self):
+        return {
+            'pool_size': self.pool_size,
+            'calls': self.retry.calls,
+            'retries': self.retry.retries,
+            'failures': self.failures,
+            'circuit_state': self.breaker.state,
+            'circuit_rejected': self.breaker.rejected,
+        }
+
+
+class UpstreamClient(_ClientBase):
+    """Pooled keep-alive HTTP client with timeouts, retries and a circuit breaker."""
+
+    def __init__(self, pool_size=20, connect_timeout=2.0, read_timeout=5.0, retry=None, breaker=None):
+        super().__init__(pool_size, connect_timeout, read_timeout, retry, breaker)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, url, params=None):
+        self._before_call()
+        try:
+            return self._get(url, params)
+        except UpstreamError:
+            raise
+        except BaseException:
+            self._fail_unexpected()
+            raise
+
+    def _get(self, url, params):
+        attempt = 0
+        while True:
+            try:
+                response = self.session.get(url, params=params,
+                                            timeout=(self.connect_timeout, self.read_timeout))
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                error = f'{type(exc).__name__}: {exc}'
+            else:
+                if response.status_code not in self.retry.retry_statuses:
+                    if response.status_code >= 500:
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+                    return response
+                error = f'HTTP {response.status_code}'
+            if not self.retry.acquire_retry(attempt):
+                raise self._fail(error)
+            time.sleep(self.retry.delay(attempt))
+            attempt += 1
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncUpstreamClient(_ClientBase):
+    """asyncio counterpart of UpstreamClient built on an ``httpx.AsyncClient``.
+
+    The underlying connection pool is bound to the event loop it is first
+    used on; create one client per loop and ``aclose`` it when done.
+    """
+
+    def __init__(self, pool_size=20, connect_timeout=2.0, read_timeout=5.0, retry=None, breaker=None):
+        super().__init__(pool_size, connect_timeout, read_timeout, retry, breaker)
+        self._client = None
+
+    def _http(self):
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.pool_size,
+                                    max_keepalive_connections=self.pool_size),
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            )
+        return self._client
+
+    async def get(self, url, params=None):
+        self._before_call()
+        try:
+            return await self._get(url, params)
+        except UpstreamError:
+            raise
+        except BaseException:
+            self._fail_unexpected()
+            raise
+
+    async def _get(self, url, params):
+        import httpx
+        attempt = 0
+        while True:
+            try:
+                response = await self._http().get(url, params=params)
+            except (httpx.TransportError, httpx.TimeoutException) as exc:
+                error = f'{type(exc).__name__}: {exc}'
+            else:
+                if response.status_code not in self.retry.retry_statuses:
+                    if response.status_code >= 500:
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+                    return response
+                error = f'HTTP {response.status_code}'
+            if not self.retry.acquire_retry(attempt):
+                raise self._fail(error)
+            await asyncio.sleep(self.retry.delay(attempt))
+            attempt += 1
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()